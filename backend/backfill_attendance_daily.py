@@ -0,0 +1,79 @@
+"""
+Backfill the daily attendance rollup from attendance history
+
+New check-ins update attendance_daily as they are recorded; this command
+builds the rows for history recorded before the table existed, or rebuilds
+a date range after attendance was edited directly in the database. Rollup
+rows in the range are replaced, so it can be re-run safely. Run it while no
+check-ins are being recorded for the rebuilt days.
+
+--late-only keeps the rows and only recomputes their late flag, e.g. after
+WORK_START_TIME or LATE_THRESHOLD_MINUTES changed, or for rows recorded
+before lateness was judged on the server's local time.
+
+Usage:
+    python backfill_attendance_daily.py                      # all history
+    python backfill_attendance_daily.py --since 2025-08-01
+    python backfill_attendance_daily.py --late-only
+"""
+import argparse
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import get_config
+from models import Base, upgrade_schema
+from utils.attendance_rollup import backfill_daily, late_cutoff, refresh_late_flags
+
+
+def backfill(database_url, since=None, batch_size=1000, late_only=False):
+    """Rebuild attendance_daily (or only its late flags) from `since` (all history if None)"""
+    config = get_config()
+    engine = create_engine(database_url)
+    SessionLocal = sessionmaker(bind=engine)
+    Base.metadata.create_all(engine)
+    upgrade_schema(engine)
+    
+    started = time.perf_counter()
+    cutoff = late_cutoff(config.WORK_START_TIME, config.LATE_THRESHOLD_MINUTES)
+    session = SessionLocal()
+    try:
+        if late_only:
+            print(f"🔄 Recomputing late flags {'from ' + since.isoformat() if since else 'for all history'}")
+            changed = refresh_late_flags(session, cutoff, since=since, batch_size=batch_size)
+            print(f"✅ {changed} daily rows updated in {time.perf_counter() - started:.1f}s")
+            return
+        
+        print(f"🔄 Backfilling attendance_daily {'from ' + since.isoformat() if since else 'for all history'}")
+        days, rows = backfill_daily(
+            session,
+            cutoff,
+            since=since,
+            batch_size=batch_size
+        )
+        print(f"✅ {rows} daily rows for {days} days written in {time.perf_counter() - started:.1f}s")
+    
+    except Exception as e:
+        session.rollback()
+        print(f"❌ Error during backfill: {str(e)}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    config = get_config()
+    
+    parser = argparse.ArgumentParser(description='Backfill the daily attendance rollup from attendance history')
+    parser.add_argument('--database-url', default=config.DATABASE_URL)
+    parser.add_argument('--since', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help='First day to rebuild (YYYY-MM-DD, default: all history)')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--late-only', action='store_true',
+                        help='Only recompute the late flag of existing rows')
+    args = parser.parse_args()
+    
+    backfill(args.database_url, args.since, args.batch_size, args.late_only)
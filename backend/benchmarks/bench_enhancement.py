@@ -0,0 +1,95 @@
+"""
+Enhancement benchmark: whole-frame vs face ROI enhance_image_for_recognition
+
+Compares the previous implementation (new CLAHE object and kernel per call,
+whole frame), the current whole-frame mode and the ROI mode that only
+enhances the padded face box, at 720p and 1080p.
+
+Usage (from backend/):
+    python benchmarks/bench_enhancement.py
+    python benchmarks/bench_enhancement.py --iterations 100 --padding 0.25
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.face_detection import enhance_image_for_recognition  # noqa: E402
+from utils.mask_detection_cv import get_mask_detector_cv  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESOLUTIONS = [(1280, 720), (1920, 1080)]
+
+
+def make_frames():
+    """RGB frames at 720p and 1080p with the face box found by the Haar cascade"""
+    source = cv2.cvtColor(cv2.imread(os.path.join(BACKEND_DIR, 'lycus_register.jpg')), cv2.COLOR_BGR2RGB)
+    detector = get_mask_detector_cv()
+    frames = {}
+    for width, height in RESOLUTIONS:
+        frame = cv2.resize(source, (width, height), interpolation=cv2.INTER_AREA)
+        faces = detector.detect_faces_cascade(frame) or []
+        if not faces:
+            # Fall back to a centred box the size of a typical webcam face
+            faces = [(int(height * 0.25), int(width * 0.6), int(height * 0.75), int(width * 0.4))]
+        frames[f'{width}x{height}'] = (frame, max(faces, key=lambda f: (f[2] - f[0]) * (f[1] - f[3])))
+    return frames
+
+
+def legacy_enhance(image):
+    """Previous enhance_image_for_recognition: whole frame, objects built per call"""
+    lab = cv2.cvtColor(image, cv2.COLOR_RGB2LAB)
+    l, a, b = cv2.split(lab)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    l = clahe.apply(l)
+    enhanced = cv2.cvtColor(cv2.merge([l, a, b]), cv2.COLOR_LAB2RGB)
+    enhanced = cv2.bilateralFilter(enhanced, 5, 50, 50)
+    kernel = np.array([[-0.5, -0.5, -0.5],
+                       [-0.5,  5,   -0.5],
+                       [-0.5, -0.5, -0.5]])
+    return cv2.filter2D(enhanced, -1, kernel)
+
+
+def measure(fn, iterations):
+    """Return (p50, p95) latency in milliseconds"""
+    fn()  # warm-up
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--padding', type=float, default=0.25, help='ROI padding (fraction of the face box)')
+    args = parser.parse_args()
+    
+    print(f"{'frame':<10} {'mode':<20} {'pixels':>10} {'p50 ms':>8} {'p95 ms':>8} {'saving':>7}")
+    for name, (frame, face_location) in make_frames().items():
+        top, right, bottom, left = face_location
+        roi_pixels = int((bottom - top) * (1 + 2 * args.padding) * (right - left) * (1 + 2 * args.padding))
+        
+        modes = [
+            ('whole frame (legacy)', frame.shape[0] * frame.shape[1], lambda: legacy_enhance(frame)),
+            ('whole frame', frame.shape[0] * frame.shape[1], lambda: enhance_image_for_recognition(frame)),
+            ('face ROI', min(roi_pixels, frame.shape[0] * frame.shape[1]),
+             lambda: enhance_image_for_recognition(frame, face_location, padding=args.padding)),
+        ]
+        
+        baseline = None
+        for label, pixels, fn in modes:
+            p50, p95 = measure(fn, args.iterations)
+            baseline = baseline or p50
+            print(f"{name:<10} {label:<20} {pixels:>10,} {p50:>8.2f} {p95:>8.2f} {1 - p50 / baseline:>7.0%}")
+
+
+if __name__ == '__main__':
+    main()
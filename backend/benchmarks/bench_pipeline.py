@@ -0,0 +1,241 @@
+"""
+Face pipeline benchmark: every stage and the full endpoint flows
+
+Stages (called directly on each fixture):
+    decode_base64_image, face_locations, detect_faces (endpoint settings),
+    analyze_face_quality, detect_mask_opencv, enhance_image_for_recognition
+    (whole frame and face ROI), face_encodings
+
+Flows (through the Flask app with a throwaway sqlite database):
+    /api/face/analyze, /api/recognize, /api/kiosk/identify, /api/register
+
+Fixtures are the bundled lycus_absensi.jpg, lycus_register.jpg and party.jpg
+plus lycus_register.jpg resized to 480p, 720p and 1080p. Reports p50/p95
+latency, throughput per core (operations per CPU-second, OpenCV limited to
+one thread) and peak RSS. Works offline: without dlib the
+MockFaceRecognition fallback is measured, and the output says which backend ran.
+Flow rows end with the last response, since the path taken (no face, blur
+rejection, match) depends on the fixture and backend.
+
+Usage (from backend/):
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --iterations 50 --stages-only
+    python benchmarks/bench_pipeline.py --fixtures party.jpg,1080p --json results.json
+"""
+import argparse
+import base64
+import itertools
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Config reads the environment at import time: use a throwaway database, run
+# the pipeline inline, measure the pipeline rather than the frame cache
+# (every iteration sends the same bytes) and keep benchmark registrations out
+# of the photo archive
+os.environ['DATABASE_URL'] = f"sqlite:///{tempfile.mkstemp(suffix='.db')[1]}"
+os.environ.setdefault('FACE_POOL_WORKERS', '0')
+os.environ['FRAME_CACHE_MAX_ENTRIES'] = '0'
+os.environ['FACE_PHOTO_ARCHIVE_ENABLED'] = 'False'
+
+from config import get_config  # noqa: E402
+from utils.face_detection import (  # noqa: E402
+    MockFaceRecognition, analyze_face_quality, detect_faces, enhance_image_for_recognition, face_recognition
+)
+from utils.image_decoding import base64_to_bytes, decode_image_bytes  # noqa: E402
+from utils.mask_detection_cv import detect_mask_opencv  # noqa: E402
+
+BUNDLED_FIXTURES = ['lycus_absensi.jpg', 'lycus_register.jpg', 'party.jpg']
+GENERATED_RESOLUTIONS = [('480p', 640, 480), ('720p', 1280, 720), ('1080p', 1920, 1080)]
+
+config = get_config()
+
+
+def load_fixtures(selected=None):
+    """JPEG bytes of the bundled photos and generated webcam resolutions"""
+    fixtures = {}
+    for name in BUNDLED_FIXTURES:
+        with open(os.path.join(BACKEND_DIR, name), 'rb') as f:
+            fixtures[name] = f.read()
+    
+    source = cv2.imread(os.path.join(BACKEND_DIR, 'lycus_register.jpg'))
+    for name, width, height in GENERATED_RESOLUTIONS:
+        # Centre-crop to the target aspect ratio, then resize, like a webcam frame
+        h, w = source.shape[:2]
+        crop_h = min(h, int(w * height / width))
+        top = (h - crop_h) // 2
+        frame = cv2.resize(source[top:top + crop_h], (width, height), interpolation=cv2.INTER_AREA)
+        fixtures[name] = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    
+    if selected:
+        fixtures = {name: data for name, data in fixtures.items() if name in selected}
+    return fixtures
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def measure(fn, iterations):
+    """Return (p50 ms, p95 ms, operations per CPU-second, peak RSS MB, last return value)"""
+    result = fn()  # warm-up
+    samples = []
+    cpu_start = time.process_time()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    cpu_seconds = time.process_time() - cpu_start
+    throughput = iterations / cpu_seconds if cpu_seconds > 0 else float('inf')
+    return np.percentile(samples, 50), np.percentile(samples, 95), throughput, peak_rss_mb(), result
+
+
+def find_face(image):
+    """Face box used by the per-stage benchmarks (largest face, or a centred box)"""
+    faces = detect_faces(image, detection_width=config.FACE_DETECTION_WIDTH['recognize'],
+                         model=config.FACE_DETECTION_MODEL)
+    if faces:
+        return max(faces, key=lambda f: (f[2] - f[0]) * (f[1] - f[3]))
+    h, w = image.shape[:2]
+    return (int(h * 0.25), int(w * 0.65), int(h * 0.75), int(w * 0.35))
+
+
+def stage_cases(jpeg):
+    """(stage name, callable) pairs for one fixture"""
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()
+    image = decode_image_bytes(jpeg, config.MAX_IMAGE_WIDTH)
+    face_location = find_face(image)
+    detection = {
+        'detection_width': config.FACE_DETECTION_WIDTH['recognize'],
+        'model': config.FACE_DETECTION_MODEL,
+        'prefilter': config.FACE_HAAR_PREFILTER,
+        'min_face_ratio': config.FACE_HAAR_MIN_FACE_RATIO,
+        'roi_padding': config.FACE_HAAR_ROI_PADDING
+    }
+    
+    return [
+        ('decode_base64_image', lambda: decode_image_bytes(base64_to_bytes(data_url), config.MAX_IMAGE_WIDTH)),
+        ('face_locations (full frame)', lambda: face_recognition.face_locations(image, model=config.FACE_DETECTION_MODEL)),
+        ('detect_faces (recognize)', lambda: detect_faces(image, **detection)),
+        ('analyze_face_quality', lambda: analyze_face_quality(
+            image, face_location, check_mask=True, mask_strategy=config.MASK_DETECTION_STRATEGY)),
+        ('detect_mask_opencv', lambda: detect_mask_opencv(image, face_location)),
+        ('enhance (whole frame)', lambda: enhance_image_for_recognition(image)),
+        ('enhance (face ROI)', lambda: enhance_image_for_recognition(image, face_location)),
+        ('face_encodings', lambda: face_recognition.face_encodings(image, [face_location])),
+    ]
+
+
+def setup_app():
+    """Import the server against the throwaway database; returns (client, admin, employee headers)"""
+    os.chdir(BACKEND_DIR)
+    
+    import server
+    from flask_jwt_extended import create_access_token
+    from passlib.hash import bcrypt
+    from models import Employee
+    
+    session = server.SessionLocal()
+    session.add(Employee(employee_id='EMP209912000', name='Benchmark Admin',
+                         password=bcrypt.using(rounds=4).hash('benchmark'), role='admin'))
+    session.commit()
+    session.close()
+    
+    with server.app.app_context():
+        admin = create_access_token(identity='EMP209912000', additional_claims={'role': 'admin', 'language': 'id'})
+        employee = create_access_token(identity='EMP209912001', additional_claims={'role': 'employee', 'language': 'id'})
+    
+    client = server.app.test_client()
+    # Registered employee for recognize; lycus_absensi.jpg passes the registration quality check
+    with open(os.path.join(BACKEND_DIR, 'lycus_absensi.jpg'), 'rb') as f:
+        photo = 'data:image/jpeg;base64,' + base64.b64encode(f.read()).decode()
+    client.post('/api/register', json={
+        'name': 'Benchmark Employee', 'employee_id': 'EMP209912001', 'images': [photo] * 3
+    }, headers={'Authorization': f'Bearer {admin}'})
+    
+    return client, {'Authorization': f'Bearer {admin}'}, {'Authorization': f'Bearer {employee}'}
+
+
+def flow_cases(client, admin, employee, jpeg, new_ids):
+    """(flow name, callable) pairs for one fixture; new_ids yields unused employee IDs"""
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()
+    
+    def register():
+        employee_id = next(new_ids)
+        return client.post('/api/register', json={
+            'name': 'Benchmark Employee', 'employee_id': employee_id, 'images': [data_url] * 3
+        }, headers=admin)
+    
+    return [
+        ('POST /api/face/analyze', lambda: client.post(
+            '/api/face/analyze', data=jpeg, content_type='image/jpeg', headers=employee)),
+        ('POST /api/recognize', lambda: client.post(
+            '/api/recognize', data=jpeg, content_type='image/jpeg', headers=employee)),
+        ('POST /api/kiosk/identify', lambda: client.post(
+            '/api/kiosk/identify?mark_attendance=false', data=jpeg, content_type='image/jpeg', headers=admin)),
+        ('POST /api/register (3 photos)', register),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--fixtures', help='Comma-separated fixture names (default: all)')
+    parser.add_argument('--stages-only', action='store_true', help='Skip the endpoint flows')
+    parser.add_argument('--flows-only', action='store_true', help='Skip the per-stage benchmarks')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+    
+    # One OpenCV thread, so throughput is per core
+    cv2.setNumThreads(1)
+    fixtures = load_fixtures(args.fixtures.split(',') if args.fixtures else None)
+    backend = 'MockFaceRecognition' if isinstance(face_recognition, MockFaceRecognition) else 'face_recognition (dlib)'
+    
+    print(f"Face backend: {backend} | detection model: {config.FACE_DETECTION_MODEL} | "
+          f"mask strategy: {config.MASK_DETECTION_STRATEGY} | iterations: {args.iterations}")
+    print(f"{'fixture':<20} {'stage':<30} {'p50 ms':>9} {'p95 ms':>9} {'ops/core-s':>11} {'peak RSS MB':>12}")
+    
+    results = []
+    
+    def report(fixture, stage, fn, flow=False):
+        p50, p95, throughput, rss, result = measure(fn, args.iterations)
+        # Which path a flow took depends on the fixture and backend (no face, blur, match...)
+        outcome = f"{result.status_code} {(result.get_json() or {}).get('message', '')}" if flow else ''
+        results.append({
+            'fixture': fixture, 'stage': stage, 'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3),
+            'ops_per_core_second': round(throughput, 2), 'peak_rss_mb': round(rss, 1), 'outcome': outcome
+        })
+        print(f"{fixture:<20} {stage:<30} {p50:>9.2f} {p95:>9.2f} {throughput:>11.1f} {rss:>12.1f}  {outcome[:60]}")
+    
+    if not args.flows_only:
+        for fixture, jpeg in fixtures.items():
+            for stage, fn in stage_cases(jpeg):
+                report(fixture, stage, fn)
+    
+    if not args.stages_only:
+        client, admin, employee = setup_app()
+        # NIP format is EMP + YYYYMM + NNN; months 01-11 are free for registrations
+        new_ids = (f'EMP2099{month:02d}{n:03d}' for month, n in itertools.product(range(1, 12), range(1000)))
+        for fixture, jpeg in fixtures.items():
+            for flow, fn in flow_cases(client, admin, employee, jpeg, new_ids):
+                report(fixture, flow, fn, flow=True)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'backend': backend, 'iterations': args.iterations, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Upload path benchmark: base64-in-JSON vs multipart/form-data vs raw image/jpeg
+
+Compares bytes on the wire and server-side decode time for the same frame
+sent through each upload format accepted by /api/recognize, /api/face/analyze
+and /api/register.
+
+Usage (from backend/):
+    python benchmarks/bench_upload.py
+    python benchmarks/bench_upload.py --iterations 200 --quality 90
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.image_decoding import base64_to_bytes, decode_image_bytes  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def make_frames(quality):
+    """JPEG frames at common webcam resolutions, like the frontend's canvas.toDataURL"""
+    source = cv2.imread(os.path.join(BACKEND_DIR, 'lycus_register.jpg'))
+    frames = {}
+    for width, height in RESOLUTIONS:
+        resized = cv2.resize(source, (width, height), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        frames[f'{width}x{height}'] = encoded.tobytes()
+    return frames
+
+
+def multipart_body(field, filename, payload, boundary='----unipresence-bench'):
+    """Encode a single-file multipart/form-data body"""
+    head = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode()
+    return head + payload + f'\r\n--{boundary}--\r\n'.encode()
+
+
+def legacy_decode(body):
+    """Previous decode_base64_image path: split, b64decode, PIL, convert, copy"""
+    base64_string = json.loads(body)['image']
+    if 'base64,' in base64_string:
+        base64_string = base64_string.split('base64,')[1]
+    img = Image.open(io.BytesIO(base64.b64decode(base64_string)))
+    return np.array(img.convert('RGB'))
+
+
+def json_decode(body):
+    """Current JSON path: base64 to bytes, then cv2.imdecode"""
+    return decode_image_bytes(base64_to_bytes(json.loads(body)['image']))
+
+
+def raw_decode(body):
+    """multipart / image/jpeg path: cv2.imdecode over the request bytes"""
+    return decode_image_bytes(body)
+
+
+def measure(fn, payload, iterations):
+    """Return (p50, p95) latency in milliseconds"""
+    fn(payload)  # warm-up
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(payload)
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--quality', type=int, default=90, help='JPEG quality of the test frames')
+    args = parser.parse_args()
+    
+    print(f"{'frame':<10} {'path':<22} {'wire bytes':>11} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, jpeg in make_frames(args.quality).items():
+        json_body = json.dumps({
+            'image': 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()
+        }).encode()
+        
+        paths = [
+            ('json base64 (legacy)', json_body, len(json_body), legacy_decode),
+            ('json base64', json_body, len(json_body), json_decode),
+            ('multipart', jpeg, len(multipart_body('image', 'frame.jpg', jpeg)), raw_decode),
+            ('image/jpeg', jpeg, len(jpeg), raw_decode),
+        ]
+        
+        for label, payload, wire_bytes, fn in paths:
+            p50, p95 = measure(fn, payload, args.iterations)
+            print(f"{name:<10} {label:<22} {wire_bytes:>11,} {p50:>8.2f} {p95:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
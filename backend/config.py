@@ -65,14 +65,110 @@ class Config:
     # Face detection model: 'hog' (fast, CPU) or 'cnn' (accurate, GPU)
     FACE_DETECTION_MODEL = os.environ.get('FACE_MODEL', 'hog')
     
+    # Width (px) of the downscaled copy face detection runs on, per endpoint.
+    # Boxes are scaled back to full resolution for quality scoring and encoding.
+    # Live preview (analyze) is the most aggressive; registration keeps more
+    # detail since its encodings are stored. 0 = detect on the full frame
+    FACE_DETECTION_WIDTH: Dict[str, int] = {
+        'analyze': int(os.environ.get('FACE_DETECTION_WIDTH_ANALYZE', 320)),
+        'recognize': int(os.environ.get('FACE_DETECTION_WIDTH_RECOGNIZE', 480)),
+        'kiosk': int(os.environ.get('FACE_DETECTION_WIDTH_KIOSK', 480)),
+        'register': int(os.environ.get('FACE_DETECTION_WIDTH_REGISTER', 640)),
+    }
+    
+    # Haar-cascade pre-filter for the polling endpoints (analyze, recognize,
+    # kiosk): frames without exactly one face are rejected before HOG and
+    # encoding run, and a single cascade hit narrows HOG to a padded ROI.
+    # Registration always runs the full detector
+    FACE_HAAR_PREFILTER = os.environ.get('FACE_HAAR_PREFILTER', 'True').lower() == 'true'
+    FACE_HAAR_MIN_FACE_RATIO = float(os.environ.get('FACE_HAAR_MIN_FACE_RATIO', 0.1))
+    FACE_HAAR_ROI_PADDING = 0.5
+    
     # Face recognition tolerance (lower = stricter)
     FACE_RECOGNITION_TOLERANCE = float(os.environ.get('FACE_TOLERANCE', 0.6))
     
+    # Face encoding storage format (see utils/encoding_format.py)
+    # 'float32' halves DB size and scan bandwidth versus legacy float64 blobs
+    FACE_ENCODING_DTYPE = os.environ.get('FACE_ENCODING_DTYPE', 'float32')
+    # Compare L2-normalised vectors (FACE_TOLERANCE must be re-tuned when enabled)
+    FACE_ENCODING_NORMALIZE = os.environ.get('FACE_ENCODING_NORMALIZE', 'False').lower() == 'true'
+    
+    # Kiosk (1:N) identification: number of candidates returned per frame
+    KIOSK_TOP_K = int(os.environ.get('KIOSK_TOP_K', 3))
+    # Upper bound for a client-supplied top_k
+    KIOSK_MAX_TOP_K = int(os.environ.get('KIOSK_MAX_TOP_K', 10))
+    
+    # Per-employee encoding cache for 1:1 recognition
+    ENCODING_CACHE_MAX_ENTRIES = int(os.environ.get('ENCODING_CACHE_MAX_ENTRIES', 10000))
+    ENCODING_CACHE_MAX_BYTES = int(os.environ.get('ENCODING_CACHE_MAX_MB', 64)) * 1024 * 1024
+    
+    # Mask detection strategy, run once per frame on every face endpoint:
+    # 'legacy' (MaskDetector), 'opencv' (MaskDetectorCV multi-method) or
+    # 'combined' (legacy, overridden by a confident OpenCV verdict)
+    MASK_DETECTION_STRATEGY = os.environ.get('MASK_DETECTION_STRATEGY', 'opencv')
+    
+    # Thumbnail gate before face detection (see prescreen_frame in
+    # utils/face_detection.py): hopeless frames skip detection entirely.
+    # Defaults match FaceQualityMetrics BRIGHTNESS_MIN/MAX and BLUR_THRESHOLD
+    FACE_PRESCREEN_ENABLED = os.environ.get('FACE_PRESCREEN_ENABLED', 'True').lower() == 'true'
+    FACE_PRESCREEN_THUMBNAIL_WIDTH = int(os.environ.get('FACE_PRESCREEN_THUMBNAIL_WIDTH', 160))
+    FACE_PRESCREEN_BRIGHTNESS_MIN = float(os.environ.get('FACE_PRESCREEN_BRIGHTNESS_MIN', 50))
+    FACE_PRESCREEN_BRIGHTNESS_MAX = float(os.environ.get('FACE_PRESCREEN_BRIGHTNESS_MAX', 200))
+    FACE_PRESCREEN_BLUR_THRESHOLD = float(os.environ.get('FACE_PRESCREEN_BLUR_THRESHOLD', 100))
+    
+    # Recent frame -> face pipeline result cache (see utils/frame_cache.py)
+    # for clients that resend identical frames; 0 entries disables it
+    FRAME_CACHE_MAX_ENTRIES = int(os.environ.get('FRAME_CACHE_MAX_ENTRIES', 256))
+    FRAME_CACHE_MAX_BYTES = int(os.environ.get('FRAME_CACHE_MAX_MB', 8)) * 1024 * 1024
+    FRAME_CACHE_TTL_SECONDS = float(os.environ.get('FRAME_CACHE_TTL_SECONDS', 10))
+    # Also match re-encoded but visually identical frames (dHash); applies
+    # to analyze only, recognize/kiosk results are matched by content
+    FRAME_CACHE_PERCEPTUAL = os.environ.get('FRAME_CACHE_PERCEPTUAL', 'False').lower() == 'true'
+    
+    # Process pool for CPU-bound face work (see utils/face_worker_pool.py)
+    # 0 workers = run inline in the request thread
+    FACE_POOL_WORKERS = int(os.environ.get('FACE_POOL_WORKERS', max((os.cpu_count() or 2) // 2, 1)))
+    # Tasks in flight (queued + running) before new frames get HTTP 503
+    FACE_POOL_MAX_PENDING = int(os.environ.get('FACE_POOL_MAX_PENDING', 16))
+    FACE_POOL_TASK_TIMEOUT = float(os.environ.get('FACE_POOL_TASK_TIMEOUT', 10))
+    
+    # Maximum frames per /api/face/analyze/batch request; batches are
+    # admitted whole and must leave FACE_POOL_BATCH_HEADROOM pool slots free
+    # for single-frame recognize/kiosk calls
+    FACE_ANALYZE_BATCH_MAX_FRAMES = int(os.environ.get('FACE_ANALYZE_BATCH_MAX_FRAMES', 8))
+    FACE_POOL_BATCH_HEADROOM = int(os.environ.get('FACE_POOL_BATCH_HEADROOM', 4))
+    
+    # Camera stream over WebSocket (/api/face/stream, see utils/face_tracker.py)
+    # Search window padding around the last face box, as a fraction of its size
+    FACE_STREAM_WINDOW_MARGIN = float(os.environ.get('FACE_STREAM_WINDOW_MARGIN', 0.5))
+    # Consecutive good frames before the face counts as stable (recognize mode)
+    FACE_STREAM_STABLE_FRAMES = int(os.environ.get('FACE_STREAM_STABLE_FRAMES', 3))
+    # Full-frame rescan every N frames while tracking
+    FACE_STREAM_REDETECT_INTERVAL = int(os.environ.get('FACE_STREAM_REDETECT_INTERVAL', 10))
+    # Close the session after this many seconds without a frame
+    FACE_STREAM_IDLE_TIMEOUT = float(os.environ.get('FACE_STREAM_IDLE_TIMEOUT', 60))
+    
+    # Content-addressed archive of accepted registration photos in
+    # UPLOAD_FOLDERS['faces'] (see utils/photo_archive.py), so encodings can
+    # be recomputed after a model change instead of re-registering everyone
+    FACE_PHOTO_ARCHIVE_ENABLED = os.environ.get('FACE_PHOTO_ARCHIVE_ENABLED', 'True').lower() == 'true'
+    # Encoder identity stored with every encoding; derived from the face backend
+    # and registration detector settings unless set (bump it after upgrading
+    # the dlib models to force re-encoding)
+    FACE_ENCODING_MODEL_VERSION = os.environ.get('FACE_ENCODING_MODEL_VERSION', '')
+    # Background re-encoding (POST /api/face/reencode, see reencode.py):
+    # employees per chunk, pool tasks in flight and pause between chunks,
+    # kept low so live recognition keeps priority
+    FACE_REENCODE_CHUNK_SIZE = int(os.environ.get('FACE_REENCODE_CHUNK_SIZE', 4))
+    FACE_REENCODE_MAX_IN_FLIGHT = int(os.environ.get('FACE_REENCODE_MAX_IN_FLIGHT', 2))
+    FACE_REENCODE_PAUSE_SECONDS = float(os.environ.get('FACE_REENCODE_PAUSE_SECONDS', 0.2))
+    
     # Minimum image dimensions for face detection
     MIN_IMAGE_WIDTH = 640
     MIN_IMAGE_HEIGHT = 480
     
     # Maximum image dimensions (resize if larger)
+    # JPEGs at least twice MAX_IMAGE_WIDTH are decoded at 1/2, 1/4 or 1/8 scale
     MAX_IMAGE_WIDTH = 1920
     MAX_IMAGE_HEIGHT = 1080
     
@@ -97,11 +193,25 @@ class Config:
     WORK_END_TIME = '17:00'
     LATE_THRESHOLD_MINUTES = 15  # Late if after 08:15
     EARLY_LEAVE_THRESHOLD_MINUTES = 30  # Early if before 16:30
+    WORK_DAYS = [0, 1, 2, 3, 4]  # Monday-Friday (date.weekday())
     
     # Attendance marking rules
     ALLOW_MULTIPLE_ATTENDANCE_PER_DAY = False
     ATTENDANCE_LOCATION_TRACKING = False
     
+    # /api/attendance page size (keyset pagination, see get_attendance)
+    ATTENDANCE_PAGE_SIZE = int(os.environ.get('ATTENDANCE_PAGE_SIZE', 100))
+    ATTENDANCE_MAX_PAGE_SIZE = int(os.environ.get('ATTENDANCE_MAX_PAGE_SIZE', 500))
+    # /api/attendance/export: rows fetched per server-side cursor batch,
+    # background XLSX workers and how long finished XLSX files are kept
+    ATTENDANCE_EXPORT_CHUNK_SIZE = int(os.environ.get('ATTENDANCE_EXPORT_CHUNK_SIZE', 1000))
+    ATTENDANCE_EXPORT_WORKERS = int(os.environ.get('ATTENDANCE_EXPORT_WORKERS', 1))
+    ATTENDANCE_EXPORT_TTL = int(os.environ.get('ATTENDANCE_EXPORT_TTL', 3600))
+    # /api/attendance/summary cache: check-ins invalidate their period's
+    # entries, the TTL covers employee edits (department, deactivation)
+    ATTENDANCE_SUMMARY_CACHE_MAX_ENTRIES = int(os.environ.get('ATTENDANCE_SUMMARY_CACHE_MAX_ENTRIES', 256))
+    ATTENDANCE_SUMMARY_CACHE_TTL = float(os.environ.get('ATTENDANCE_SUMMARY_CACHE_TTL', 60))
+    
     # ==================== INTERNATIONALIZATION ====================
     # Supported languages
     SUPPORTED_LANGUAGES = ['id', 'en']
@@ -222,6 +332,12 @@ class Config:
     LOG_MAX_BYTES = 10 * 1024 * 1024  # 10MB
     LOG_BACKUP_COUNT = 10
     
+    # Per-stage timing of the face endpoints (see utils/timing.py): a
+    # Server-Timing header per response and histograms in /api/metrics
+    STAGE_TIMING_ENABLED = os.environ.get('STAGE_TIMING_ENABLED', 'True').lower() == 'true'
+    # Also add a 'timings' object to JSON responses (debugging)
+    STAGE_TIMING_IN_RESPONSE = os.environ.get('STAGE_TIMING_IN_RESPONSE', os.environ.get('DEBUG', 'False')).lower() == 'true'
+    
     # ==================== DEVELOPMENT/PRODUCTION ====================
     DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
     TESTING = os.environ.get('TESTING', 'False').lower() == 'true'
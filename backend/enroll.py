@@ -0,0 +1,393 @@
+"""
+Bulk offline face enrollment
+
+Enrolls a whole site from a directory tree instead of clicking through the
+three-photo /api/register flow once per employee:
+
+    photos/
+        EMP202508001/
+            1.jpg  2.jpg  3.jpg
+        EMP202508002/
+            ...
+
+Each employee directory is processed in a worker process with the same
+pipeline as /api/register (detection, the analyze_face_quality gate with mask
+detection, encoding). The best accepted photos (up to --photos) are stored as
+EmployeeFaceEncoding rows, committed in batches of --batch-size employees.
+Existing employees keep their account and get their encodings replaced; new
+employees take their name (and optionally department, position, email, phone)
+from the --roster CSV and get their employee_id as default password, like
+/api/register.
+
+Rejected photos and employees go to a CSV report. An employee's report rows
+are written after its batch is committed, so with --resume a restarted run
+skips everyone who already has encodings or was rejected as a whole. A batch
+the database refuses (e.g. a roster email already in use) is retried one
+employee at a time and the refused employees are reported.
+
+The stored photos go to the registration photo archive (unless
+FACE_PHOTO_ARCHIVE_ENABLED is off), so reencode.py can recompute them after a
+model change.
+
+A running server keeps its kiosk face index in memory: restart it after
+enrolling.
+
+Usage:
+    python enroll.py photos/ --roster roster.csv
+    python enroll.py photos/ --roster roster.csv --resume --workers 8
+    python enroll.py photos/ --dry-run --report rejects.csv
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import time
+
+import cv2
+from passlib.hash import bcrypt
+from sqlalchemy import create_engine, delete, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from config import get_config
+from models import Base, Employee, EmployeeFaceEncoding, upgrade_schema
+from reencode import encoding_model_version
+from utils.encoding_format import encode_face_encoding
+from utils.face_pipeline import check_registration_photo, process_face
+from utils.image_decoding import decode_image_bytes
+from utils.photo_archive import PhotoArchive
+from utils.validators import validate_employee_id, validate_name
+
+REPORT_FIELDS = ['employee_id', 'photo', 'reason', 'quality_score']
+ROSTER_FIELDS = ['name', 'department', 'position', 'email', 'phone']
+
+config = get_config()
+
+# Worker settings, set once per process by _init_worker
+_worker_options = None
+
+
+def find_employee_dirs(root):
+    """
+    (employee_id, [photo paths]) for every subdirectory of root, sorted
+    """
+    extensions = {f'.{ext}' for ext in config.ALLOWED_IMAGE_EXTENSIONS}
+    employees = []
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if not entry.is_dir():
+            continue
+        photos = sorted(
+            os.path.join(entry.path, name) for name in os.listdir(entry.path)
+            if os.path.splitext(name)[1].lower() in extensions
+        )
+        employees.append((entry.name, photos))
+    return employees
+
+
+def load_roster(path):
+    """employee_id -> {name, department, position, email, phone} from a CSV file"""
+    if not path:
+        return {}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return {
+            row['employee_id'].strip(): {field: (row.get(field) or '').strip() or None for field in ROSTER_FIELDS}
+            for row in csv.DictReader(f)
+            if row.get('employee_id')
+        }
+
+
+def load_rejected_ids(path):
+    """Employee IDs a previous run's report rejected as a whole (no photo column)"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline='', encoding='utf-8') as f:
+        return {row['employee_id'] for row in csv.DictReader(f) if not row['photo']}
+
+
+def _init_worker(options):
+    global _worker_options
+    _worker_options = options
+    # One OpenCV thread per worker process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+
+def enroll_employee(task):
+    """
+    Run the registration pipeline on one employee's photos (in a worker)
+    
+    Args:
+        task: (employee_id, [photo paths], hash_password)
+    
+    Returns:
+        {
+            'employee_id': str,
+            'accepted': [{'photo', 'encoding', 'quality_score', 'photo_sha256'}], best first,
+            'rejected': [{'photo', 'reason', 'quality_score'}],
+            'password': bcrypt hash of the employee_id, or None
+        }
+    """
+    employee_id, photos, hash_password = task
+    options = _worker_options
+    accepted, rejected = [], []
+    
+    for photo_index, path in enumerate(photos, start=1):
+        photo = os.path.basename(path)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            image = decode_image_bytes(data, config.MAX_IMAGE_WIDTH)
+        except Exception as e:
+            rejected.append({'photo': photo, 'reason': f'Gagal memproses foto: {e}', 'quality_score': None})
+            continue
+        
+        face = process_face(
+            image,
+            detection=options['detection'],
+            check_mask=True,
+            mask_strategy=options['mask_strategy'],
+            encode=True,
+            require_acceptable=True
+        )
+        result = check_registration_photo(photo_index, face)
+        
+        if result['status'] == 'success':
+            accepted.append({'photo': photo, 'encoding': face['encoding'], 'quality_score': result['quality_score'],
+                             'data': data})
+        else:
+            rejected.append({'photo': photo, 'reason': result['message'], 'quality_score': result.get('quality_score')})
+    
+    accepted.sort(key=lambda photo: photo['quality_score'], reverse=True)
+    accepted = accepted[:options['photos']]
+    
+    # Archive only the photos that are stored, and send the hash back instead of the bytes
+    archive = PhotoArchive(options['archive_root']) if options['archive_root'] else None
+    for photo in accepted:
+        data = photo.pop('data')
+        photo['photo_sha256'] = archive.store(data) if archive else None
+    
+    return {
+        'employee_id': employee_id,
+        'accepted': accepted,
+        'rejected': rejected,
+        'password': bcrypt.using(rounds=options['password_rounds']).hash(employee_id)
+                    if hash_password and accepted else None
+    }
+
+
+def write_batch(session, results, existing_ids, roster, model_version):
+    """
+    Store one batch of enrolled employees in a single transaction
+    
+    New employees and all face encodings are inserted with one batched INSERT
+    each; existing employees' old encodings are deleted first.
+    """
+    new_employees = [
+        {
+            'employee_id': result['employee_id'],
+            'password': result['password'],
+            'role': 'employee',
+            **roster[result['employee_id']]
+        }
+        for result in results if result['employee_id'] not in existing_ids
+    ]
+    replaced_ids = [result['employee_id'] for result in results if result['employee_id'] in existing_ids]
+    
+    if new_employees:
+        session.execute(insert(Employee), new_employees)
+    if replaced_ids:
+        session.execute(delete(EmployeeFaceEncoding).where(EmployeeFaceEncoding.employee_id.in_(replaced_ids)))
+    
+    session.execute(insert(EmployeeFaceEncoding), [
+        {
+            'employee_id': result['employee_id'],
+            'face_encoding': encode_face_encoding(
+                photo['encoding'],
+                dtype=config.FACE_ENCODING_DTYPE,
+                normalize=config.FACE_ENCODING_NORMALIZE
+            ),
+            'photo_index': photo_index,
+            'quality_score': photo['quality_score'],
+            'model_version': model_version,
+            'photo_sha256': photo['photo_sha256']
+        }
+        for result in results
+        for photo_index, photo in enumerate(result['accepted'], start=1)
+    ])
+    session.commit()
+
+
+def enroll(root, database_url, roster_path=None, report_path='enroll_rejects.csv', workers=None,
+           photos=3, min_photos=1, batch_size=500, password_rounds=12, resume=False, dry_run=False):
+    """Enroll every employee directory under root"""
+    started = time.perf_counter()
+    engine = create_engine(database_url)
+    SessionLocal = sessionmaker(bind=engine)
+    Base.metadata.create_all(engine)
+    upgrade_schema(engine)
+    
+    roster = load_roster(roster_path)
+    employee_dirs = find_employee_dirs(root)
+    
+    session = SessionLocal()
+    existing_ids = {row[0] for row in session.query(Employee.employee_id)}
+    skip_ids = set()
+    if resume:
+        skip_ids = {row[0] for row in session.query(EmployeeFaceEncoding.employee_id).distinct()}
+        skip_ids |= load_rejected_ids(report_path)
+    
+    append = resume and os.path.exists(report_path)
+    report_file = open(report_path, 'a' if append else 'w', newline='', encoding='utf-8')
+    report = csv.DictWriter(report_file, fieldnames=REPORT_FIELDS)
+    if not append:
+        report.writeheader()
+    
+    enrolled = encodings = rejected_photos = rejected_employees = 0
+    pending_rows = []
+    
+    # Employees that cannot be enrolled whatever their photos look like
+    tasks = []
+    for employee_id, paths in employee_dirs:
+        if employee_id in skip_ids:
+            continue
+        
+        reason = None
+        is_valid, error_msg = validate_employee_id(employee_id)
+        if not is_valid:
+            reason = error_msg
+        elif not paths:
+            reason = 'Tidak ada foto'
+        elif employee_id not in existing_ids:
+            name = roster.get(employee_id, {}).get('name')
+            is_valid, error_msg = validate_name(name) if name else (False, 'Nama tidak ditemukan di roster')
+            if not is_valid:
+                reason = error_msg
+        
+        if reason:
+            pending_rows.append({'employee_id': employee_id, 'photo': '', 'reason': reason, 'quality_score': ''})
+            rejected_employees += 1
+        else:
+            tasks.append((employee_id, paths, employee_id not in existing_ids))
+    
+    report.writerows(pending_rows)
+    report_file.flush()
+    
+    print(f"🔄 Enrolling {len(tasks)} employees ({len(skip_ids)} skipped, {rejected_employees} rejected up front)"
+          f"{' [dry run]' if dry_run else ''}")
+    
+    # Same detection settings as /api/register: no Haar pre-filter
+    detection = {
+        'detection_width': config.FACE_DETECTION_WIDTH['register'],
+        'model': config.FACE_DETECTION_MODEL,
+        'prefilter': False,
+        'min_face_ratio': config.FACE_HAAR_MIN_FACE_RATIO,
+        'roi_padding': config.FACE_HAAR_ROI_PADDING
+    }
+    model_version = encoding_model_version(detection, config.FACE_ENCODING_MODEL_VERSION)
+    options = {
+        'detection': detection,
+        'mask_strategy': config.MASK_DETECTION_STRATEGY,
+        'photos': photos,
+        'password_rounds': password_rounds,
+        'archive_root': str(config.UPLOAD_FOLDERS['faces'])
+                        if config.FACE_PHOTO_ARCHIVE_ENABLED and not dry_run else None
+    }
+    
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(options,))
+    try:
+        batch, batch_rows = [], []
+        
+        def flush():
+            nonlocal enrolled, encodings, rejected_employees
+            if batch and not dry_run:
+                try:
+                    write_batch(session, batch, existing_ids, roster, model_version)
+                except IntegrityError:
+                    # A roster conflict (e.g. an email already in use) fails
+                    # the whole batch: store it one employee at a time and
+                    # report the ones that cannot be stored, so --resume
+                    # does not retry them forever
+                    session.rollback()
+                    for result in batch:
+                        try:
+                            write_batch(session, [result], existing_ids, roster, model_version)
+                        except IntegrityError as e:
+                            session.rollback()
+                            batch_rows.append({
+                                'employee_id': result['employee_id'],
+                                'photo': '',
+                                'reason': f'Gagal disimpan ke database: {e.orig}',
+                                'quality_score': ''
+                            })
+                            enrolled -= 1
+                            encodings -= len(result['accepted'])
+                            rejected_employees += 1
+            # Report rows only once their batch is committed, so --resume
+            # never skips an employee whose encodings were lost
+            report.writerows(batch_rows)
+            report_file.flush()
+            batch.clear()
+            batch_rows.clear()
+        
+        for done, result in enumerate(pool.imap_unordered(enroll_employee, tasks, chunksize=4), start=1):
+            employee_id = result['employee_id']
+            rejected_photos += len(result['rejected'])
+            batch_rows.extend({'employee_id': employee_id, **photo} for photo in result['rejected'])
+            
+            if len(result['accepted']) < min_photos:
+                batch_rows.append({
+                    'employee_id': employee_id,
+                    'photo': '',
+                    'reason': f"Hanya {len(result['accepted'])} foto yang lolos pemeriksaan (minimal {min_photos})",
+                    'quality_score': ''
+                })
+                rejected_employees += 1
+            else:
+                batch.append(result)
+                enrolled += 1
+                encodings += len(result['accepted'])
+            
+            if len(batch) >= batch_size:
+                flush()
+            if done % batch_size == 0:
+                elapsed = time.perf_counter() - started
+                print(f"  {done}/{len(tasks)} employees processed ({done / elapsed:.1f}/s)")
+        
+        flush()
+    
+    except Exception as e:
+        session.rollback()
+        print(f"❌ Error during enrollment: {str(e)}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        pool.terminate()
+        pool.join()
+        report_file.close()
+        session.close()
+    
+    elapsed = time.perf_counter() - started
+    print(f"✅ {enrolled} employees {'would be ' if dry_run else ''}enrolled with {encodings} face encodings in {elapsed:.1f}s")
+    print(f"   {rejected_photos} photos and {rejected_employees} employees rejected, see {report_path}")
+    if enrolled and not dry_run:
+        print("ℹ Restart the server to reload the kiosk face index")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk offline face enrollment from <employee_id>/<photo> directories')
+    parser.add_argument('root', help='Directory with one subdirectory of photos per employee_id')
+    parser.add_argument('--roster', help='CSV with employee_id,name[,department,position,email,phone] for new employees')
+    parser.add_argument('--report', default='enroll_rejects.csv', help='CSV report of rejected photos and employees')
+    parser.add_argument('--database-url', default=config.DATABASE_URL)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    parser.add_argument('--photos', type=int, default=3, help='Face encodings stored per employee (best first)')
+    parser.add_argument('--min-photos', type=int, default=1, help='Accepted photos required to enroll an employee')
+    parser.add_argument('--batch-size', type=int, default=500, help='Employees per database transaction')
+    parser.add_argument('--password-rounds', type=int, default=config.BCRYPT_LOG_ROUNDS,
+                        help='bcrypt rounds for default passwords of new employees')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip employees already enrolled or rejected in the report')
+    parser.add_argument('--dry-run', action='store_true', help='Run the quality gate and report only')
+    args = parser.parse_args()
+    
+    enroll(args.root, args.database_url, args.roster, args.report, args.workers, args.photos,
+           args.min_photos, args.batch_size, args.password_rounds, args.resume, args.dry_run)
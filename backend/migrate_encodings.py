@@ -0,0 +1,117 @@
+"""
+Migrate stored face encodings to the compact versioned format
+
+Rewrites `employees.face_encoding` and `employee_face_encodings.face_encoding`
+blobs in bulk (see utils/encoding_format.py). Legacy float64 blobs and blobs
+in another dtype are converted; rows already in the target format are skipped,
+so the command can be re-run safely.
+
+Usage:
+    python migrate_encodings.py                      # use Config defaults
+    python migrate_encodings.py --dtype float32 --normalize
+    python migrate_encodings.py --dry-run
+"""
+import argparse
+
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from config import get_config
+from models import Base, Employee, EmployeeFaceEncoding
+from utils.encoding_format import (
+    DTYPE_CODES,
+    decode_face_encoding,
+    encode_face_encoding,
+    needs_migration,
+    parse_header
+)
+
+
+def migrate_table(session, model, dtype, normalize, batch_size, dry_run):
+    """
+    Rewrite the face_encoding column of one table in primary-key batches
+    
+    Returns:
+        (scanned, converted, skipped) counts
+    """
+    scanned = converted = skipped = 0
+    last_id = 0
+    
+    while True:
+        rows = session.query(model.id, model.face_encoding).filter(
+            model.id > last_id,
+            model.face_encoding.isnot(None)
+        ).order_by(model.id).limit(batch_size).all()
+        
+        if not rows:
+            break
+        
+        updates = []
+        for row_id, blob in rows:
+            scanned += 1
+            if not needs_migration(blob, dtype, normalize):
+                continue
+            
+            header = parse_header(blob)
+            if header and header['normalized'] and not normalize:
+                # The original magnitude is gone, nothing to convert back to
+                skipped += 1
+                continue
+            
+            vector = decode_face_encoding(blob)
+            updates.append({
+                'id': row_id,
+                'face_encoding': encode_face_encoding(vector, dtype=dtype, normalize=normalize)
+            })
+        
+        if updates and not dry_run:
+            session.execute(update(model), updates)
+            session.commit()
+        
+        converted += len(updates)
+        last_id = rows[-1][0]
+        print(f"  {model.__tablename__}: {scanned} scanned, {converted} converted")
+    
+    return scanned, converted, skipped
+
+
+def migrate_encodings(database_url, dtype, normalize, batch_size=1000, dry_run=False):
+    """Migrate every stored face encoding to the target format"""
+    engine = create_engine(database_url)
+    SessionLocal = sessionmaker(bind=engine)
+    Base.metadata.create_all(engine)
+    
+    session = SessionLocal()
+    try:
+        print(f"🔄 Migrating face encodings to {dtype}"
+              f"{' (L2-normalised)' if normalize else ''}{' [dry run]' if dry_run else ''}")
+        
+        for model in (EmployeeFaceEncoding, Employee):
+            scanned, converted, skipped = migrate_table(
+                session, model, dtype, normalize, batch_size, dry_run
+            )
+            print(f"✅ {model.__tablename__}: {scanned} scanned, {converted} converted"
+                  + (f", {skipped} skipped (already normalised)" if skipped else ''))
+    
+    except Exception as e:
+        session.rollback()
+        print(f"❌ Error during migration: {str(e)}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    config = get_config()
+    
+    parser = argparse.ArgumentParser(description='Migrate stored face encodings to the compact format')
+    parser.add_argument('--database-url', default=config.DATABASE_URL)
+    parser.add_argument('--dtype', choices=sorted(DTYPE_CODES), default=config.FACE_ENCODING_DTYPE)
+    parser.add_argument('--normalize', action='store_true', default=config.FACE_ENCODING_NORMALIZE,
+                        help='Store L2-normalised vectors')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+    args = parser.parse_args()
+    
+    migrate_encodings(args.database_url, args.dtype, args.normalize, args.batch_size, args.dry_run)
@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, ForeignKey, Text, Boolean, Index
+from sqlalchemy import Column, Integer, String, Date, DateTime, LargeBinary, ForeignKey, Text, Boolean, Index, inspect, text, func, select, insert, update, delete, bindparam
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
+from utils.date_formatter import utc_to_local
+
 Base = declarative_base()
 
 class Employee(Base):
@@ -47,6 +50,7 @@ class Attendance(Base):
     employee_id = Column(String(50), ForeignKey('employees.employee_id'), nullable=False, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     location = Column(String(255), nullable=True)  # Optional: office location
+    work_date = Column(Date, nullable=True)  # Local calendar day of the check-in
     check_in_type = Column(String(50), default='face_recognition')  # 'face_recognition', 'manual', 'qr_code'
     confidence_score = Column(Integer, nullable=True)  # Face recognition confidence (0-100)
     notes = Column(Text, nullable=True)
@@ -55,6 +59,28 @@ class Attendance(Base):
 
 # Composite index for efficient date-range queries
 Index('idx_attendance_employee_date', Attendance.employee_id, Attendance.timestamp)
+# Keyset pagination of the attendance listing: ORDER BY timestamp DESC, id DESC
+Index('idx_attendance_timestamp_id', Attendance.timestamp, Attendance.id)
+
+class AttendanceDaily(Base):
+    """
+    Daily attendance rollup: one row per employee per day with the first
+    check-in, updated in the same transaction as each Attendance insert
+    (see utils/attendance_rollup.py)
+    """
+    __tablename__ = 'attendance_daily'
+    
+    work_date = Column(Date, primary_key=True)
+    employee_id = Column(String(50), ForeignKey('employees.employee_id'), primary_key=True)
+    first_check_in = Column(DateTime, nullable=False)
+    first_attendance_id = Column(Integer, ForeignKey('attendance.id'), nullable=True)
+    check_in_type = Column(String(50), nullable=True)  # Method of the first check-in
+    confidence_score = Column(Integer, nullable=True)  # Confidence of the first check-in
+    is_late = Column(Boolean, default=False, index=True)
+    check_in_count = Column(Integer, default=1)  # Attendance records that day
+
+# Per-employee date ranges (the primary key serves per-day queries)
+Index('idx_attendance_daily_employee_date', AttendanceDaily.employee_id, AttendanceDaily.work_date)
 
 class EmployeeFaceEncoding(Base):
     """Multiple face encodings per employee for better accuracy"""
@@ -65,6 +91,8 @@ class EmployeeFaceEncoding(Base):
     face_encoding = Column(LargeBinary, nullable=False)  # Face encoding bytes
     photo_index = Column(Integer, nullable=False)  # Photo number (1, 2, 3)
     quality_score = Column(Integer, nullable=True)  # Quality score (0-100)
+    model_version = Column(String(100), nullable=True, index=True)  # Encoder that produced face_encoding
+    photo_sha256 = Column(String(64), nullable=True)  # Source photo in the archive (utils/photo_archive.py)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     employee = relationship("Employee", back_populates="face_encodings")
@@ -124,3 +152,154 @@ class OnlineStatus(Base):
     is_online = Column(Boolean, default=False, index=True)
     last_seen = Column(DateTime, default=datetime.utcnow, index=True)
     socket_id = Column(String(100), nullable=True)  # Socket.IO session ID
+
+
+def upgrade_schema(engine):
+    """
+    Bring existing tables up to date with the models
+    
+    create_all() only creates missing tables. Nullable columns added to a
+    model later are added here with ALTER TABLE ... ADD COLUMN, and missing
+    indexes are created. Safe to run on every startup.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"✅ Added column {table.name}.{column.name}")
+            
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+class SchemaState(Base):
+    """Outcome of one-off startup migrations, so later starts can skip them"""
+    __tablename__ = 'schema_state'
+    
+    name = Column(String(100), primary_key=True)
+    value = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def get_schema_state(conn, name):
+    """Recorded value of a SchemaState entry, None if unset"""
+    return conn.execute(select(SchemaState.value).where(SchemaState.name == name)).scalar()
+
+
+def set_schema_state(engine, name, value=None):
+    """
+    Record (or clear, with None) a SchemaState entry in its own transaction
+    
+    Several server workers may start at once; losing the race to insert the
+    same entry is fine, they record the same outcome.
+    """
+    try:
+        with engine.begin() as conn:
+            conn.execute(delete(SchemaState).where(SchemaState.name == name))
+            if value is not None:
+                conn.execute(insert(SchemaState).values(name=name, value=value))
+    except IntegrityError:
+        pass
+
+
+# Unique (employee_id, work_date) index, see enforce_once_per_day()
+ATTENDANCE_ONCE_PER_DAY_INDEX = 'uq_attendance_employee_work_date'
+# SchemaState entries of enforce_once_per_day()
+WORK_DATE_BACKFILL_STATE = 'attendance_work_date_backfilled'
+DUPLICATE_CHECK_INS_STATE = 'attendance_duplicate_check_ins'
+
+
+def enforce_once_per_day(engine, once_per_day=True):
+    """
+    Create the unique (employee_id, work_date) index that makes the database
+    reject a second check-in on the same day, or drop it when several
+    check-ins per day are allowed
+    
+    Not declared on the model because it depends on
+    ALLOW_MULTIPLE_ATTENDANCE_PER_DAY. Rows recorded before work_date existed
+    get it filled in, once, for the first check-in of each employee and day,
+    using the server-local day as insert_check_in() does. If the table
+    already holds several check-ins for one employee and day, the index is
+    not created and a warning is printed; the outcome is recorded and later
+    starts skip the check until rows it saw are deleted.
+    
+    Returns:
+        True if the index is in place
+    """
+    existing = {index['name'] for index in inspect(engine).get_indexes(Attendance.__tablename__)}
+    
+    if not once_per_day:
+        if ATTENDANCE_ONCE_PER_DAY_INDEX in existing:
+            with engine.begin() as conn:
+                conn.execute(text(f'DROP INDEX IF EXISTS {ATTENDANCE_ONCE_PER_DAY_INDEX}'))
+        set_schema_state(engine, DUPLICATE_CHECK_INS_STATE)
+        return False
+    
+    if ATTENDANCE_ONCE_PER_DAY_INDEX in existing:
+        return True
+    
+    with engine.begin() as conn:
+        backfilled = get_schema_state(conn, WORK_DATE_BACKFILL_STATE) is not None
+        if not backfilled:
+            _backfill_work_date(conn)
+        
+        # Recorded as "<max id> <rows>": removing the duplicates deletes rows
+        # the check saw, anything else leaves the outcome unchanged
+        recorded = get_schema_state(conn, DUPLICATE_CHECK_INS_STATE)
+        if recorded:
+            max_id, rows = (int(part) for part in recorded.split())
+            if conn.execute(select(func.count(Attendance.id)).where(Attendance.id <= max_id)).scalar() == rows:
+                return False
+        
+        duplicate = conn.execute(
+            select(Attendance.employee_id, Attendance.work_date).where(
+                Attendance.work_date.isnot(None)
+            ).group_by(Attendance.employee_id, Attendance.work_date).having(func.count() > 1).limit(1)
+        ).first()
+        if duplicate:
+            max_id, rows = conn.execute(select(func.max(Attendance.id), func.count(Attendance.id))).one()
+        else:
+            # Workers starting together may both get here
+            conn.execute(text(
+                f'CREATE UNIQUE INDEX IF NOT EXISTS {ATTENDANCE_ONCE_PER_DAY_INDEX} '
+                f'ON {Attendance.__tablename__} (employee_id, work_date)'
+            ))
+    
+    if not backfilled:
+        set_schema_state(engine, WORK_DATE_BACKFILL_STATE, datetime.utcnow().isoformat())
+    
+    if duplicate:
+        print(f"⚠️ Several check-ins for {duplicate[0]} on {duplicate[1]}: "
+              f"once-per-day attendance is only checked on insert, not enforced by the database. "
+              f"Remove the duplicates to create index {ATTENDANCE_ONCE_PER_DAY_INDEX}")
+        set_schema_state(engine, DUPLICATE_CHECK_INS_STATE, f'{max_id} {rows}')
+        return False
+    
+    set_schema_state(engine, DUPLICATE_CHECK_INS_STATE)
+    print(f"✅ Created index {ATTENDANCE_ONCE_PER_DAY_INDEX}")
+    return True
+
+
+def _backfill_work_date(conn):
+    """Fill in work_date for the first check-in of each employee and day among rows without one"""
+    # The local day of a UTC timestamp is not portable SQL: group in Python
+    first_check_ins = {}
+    for row_id, employee_id, timestamp in conn.execute(
+            select(Attendance.id, Attendance.employee_id, Attendance.timestamp).where(
+                Attendance.work_date.is_(None),
+                Attendance.timestamp.isnot(None)
+            ).order_by(Attendance.timestamp, Attendance.id)):
+        first_check_ins.setdefault((employee_id, utc_to_local(timestamp).date()), row_id)
+    if first_check_ins:
+        conn.execute(
+            update(Attendance).where(Attendance.id == bindparam('row_id')).values(work_date=bindparam('day')),
+            [{'row_id': row_id, 'day': day} for (_, day), row_id in first_check_ins.items()]
+        )
@@ -0,0 +1,361 @@
+"""
+Re-encode archived registration photos after a model change
+
+Every stored encoding records the model_version of the encoder that produced
+it (see encoding_model_version). After a detector or model change, ReencodeJob
+recomputes every outdated employee's encodings from the photo archive:
+
+- Employees are processed in chunks. The photos of a chunk run in parallel on
+  the FaceWorkerPool, at most `max_in_flight` at a time, with a pause between
+  chunks so live recognition keeps priority.
+- An employee's rows are swapped in one transaction, and only once every one
+  of their photos re-encoded successfully; until then recognition keeps using
+  the old vectors.
+- Employees registered before the archive existed have no photos to work
+  from; they are counted and stay on their old vectors.
+
+Storage format changes (dtype, normalisation) do not need this job: every
+format stays readable, and migrate_encodings.py converts blobs in place.
+
+The server runs the job in the background (POST /api/face/reencode). It can
+also run offline; restart the server afterwards to reload its caches.
+
+Usage:
+    python reencode.py                          # use Config defaults
+    python reencode.py --workers 8 --max-in-flight 8 --pause 0
+"""
+import argparse
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, or_, update
+from sqlalchemy.orm import sessionmaker
+
+from config import get_config
+from models import Base, Employee, EmployeeFaceEncoding, upgrade_schema
+from utils.encoding_format import encode_face_encoding
+from utils.face_detection import MockFaceRecognition, face_recognition
+from utils.face_pipeline import process_face
+from utils.face_worker_pool import FacePoolBusy, FaceWorkerPool
+from utils.image_decoding import decode_image_bytes
+from utils.photo_archive import PhotoArchive
+
+
+def encoding_model_version(detection: Dict, override: str = '') -> str:
+    """
+    Identity of the encoder: face backend plus the registration detector
+    settings that decide which face box gets encoded
+    
+    Args:
+        detection: detect_faces() keyword arguments used for registration
+        override: Explicit version (config), wins when set
+    """
+    if override:
+        return override
+    backend = 'mock' if isinstance(face_recognition, MockFaceRecognition) else 'dlib'
+    width = detection.get('detection_width') or 'full'
+    return f"{backend}-{detection.get('model', 'hog')}-w{width}"
+
+
+class ReencodeJob:
+    """
+    Re-encodes outdated employees from the photo archive in a background thread
+    
+    Usage:
+        job = ReencodeJob(SessionLocal, archive, face_pool, detection,
+                          target_version, store_encoding, on_swapped=refresh)
+        job.start()
+        job.status()
+    """
+    
+    def __init__(self, session_factory: Callable, archive: PhotoArchive, face_pool: FaceWorkerPool,
+                 detection: Dict, target_version: str, store_encoding: Callable,
+                 on_swapped: Optional[Callable] = None, chunk_size: int = 4,
+                 max_in_flight: int = 2, pause_seconds: float = 0.2,
+                 max_image_width: Optional[int] = None):
+        """
+        Args:
+            session_factory: SQLAlchemy sessionmaker
+            archive: Archive holding the registration photos
+            face_pool: Pool the encoding runs on
+            detection: detect_faces() keyword arguments (registration settings)
+            target_version: model_version the encodings are brought to
+            store_encoding: Serializes an encoding for the face_encoding column
+            on_swapped: Called as on_swapped(employee_id, name, is_active,
+                        encodings) after an employee's rows were replaced
+            chunk_size: Employees per chunk
+            max_in_flight: Pool tasks submitted at once
+            pause_seconds: Sleep between chunks
+            max_image_width: Decode width limit for archived photos
+        """
+        self.session_factory = session_factory
+        self.archive = archive
+        self.face_pool = face_pool
+        self.detection = detection
+        self.target_version = target_version
+        self.store_encoding = store_encoding
+        self.on_swapped = on_swapped
+        self.chunk_size = max(int(chunk_size), 1)
+        self.max_in_flight = max(int(max_in_flight), 1)
+        self.pause_seconds = pause_seconds
+        self.max_image_width = max_image_width
+        
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread = None
+        self._status = {'state': 'idle', 'target_version': target_version}
+    
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self) -> bool:
+        """Start the job; False if it is already running"""
+        with self._lock:
+            if self.is_running:
+                return False
+            self._cancel.clear()
+            self._status = {
+                'state': 'running',
+                'target_version': self.target_version,
+                'employees_total': 0,
+                'employees_done': 0,
+                'employees_swapped': 0,
+                'employees_failed': 0,
+                'employees_without_photos': 0,
+                'encodings_updated': 0,
+                'started_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'error': None
+            }
+            self._thread = threading.Thread(target=self._run, name='face-reencode', daemon=True)
+            self._thread.start()
+            return True
+    
+    def wait(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+    
+    def cancel(self):
+        """Stop after the current chunk; finished employees stay swapped"""
+        self._cancel.set()
+    
+    def status(self) -> Dict:
+        with self._lock:
+            return dict(self._status)
+    
+    def _update(self, **counters):
+        with self._lock:
+            for key, value in counters.items():
+                self._status[key] += value
+    
+    def _outdated(self):
+        return or_(
+            EmployeeFaceEncoding.model_version.is_(None),
+            EmployeeFaceEncoding.model_version != self.target_version
+        )
+    
+    def _run(self):
+        try:
+            session = self.session_factory()
+            try:
+                employee_ids = [row[0] for row in session.query(EmployeeFaceEncoding.employee_id)
+                                .filter(self._outdated()).distinct().order_by(EmployeeFaceEncoding.employee_id)]
+            finally:
+                session.close()
+            
+            with self._lock:
+                self._status['employees_total'] = len(employee_ids)
+            
+            for start in range(0, len(employee_ids), self.chunk_size):
+                if self._cancel.is_set():
+                    break
+                self._reencode_chunk(employee_ids[start:start + self.chunk_size])
+                time.sleep(self.pause_seconds)
+            
+            state = 'cancelled' if self._cancel.is_set() else 'finished'
+        except Exception as e:
+            print(f"❌ Face re-encoding failed: {e}")
+            with self._lock:
+                self._status['error'] = str(e)
+            state = 'failed'
+        
+        with self._lock:
+            self._status['state'] = state
+            self._status['finished_at'] = datetime.now().isoformat()
+        print(f"✅ Face re-encoding {state}: {self.status()}")
+    
+    def _reencode_chunk(self, employee_ids: List[str]):
+        session = self.session_factory()
+        try:
+            rows = session.query(
+                EmployeeFaceEncoding.id,
+                EmployeeFaceEncoding.employee_id,
+                EmployeeFaceEncoding.photo_sha256
+            ).filter(
+                EmployeeFaceEncoding.employee_id.in_(employee_ids),
+                self._outdated()
+            ).order_by(EmployeeFaceEncoding.id).all()
+        finally:
+            session.close()
+        
+        by_employee = {}
+        for row_id, employee_id, sha256 in rows:
+            by_employee.setdefault(employee_id, []).append((row_id, sha256))
+        
+        photos = []
+        for employee_id, employee_rows in list(by_employee.items()):
+            if any(sha256 is None or sha256 not in self.archive for _, sha256 in employee_rows):
+                del by_employee[employee_id]
+                self._update(employees_without_photos=1, employees_done=1)
+                continue
+            photos.extend(employee_rows)
+        
+        encodings = self._encode_photos(photos)
+        
+        for employee_id, employee_rows in by_employee.items():
+            new_encodings = {row_id: encodings.get(row_id) for row_id, _ in employee_rows}
+            if any(encoding is None for encoding in new_encodings.values()):
+                self._update(employees_failed=1, employees_done=1)
+            elif self._swap(employee_id, new_encodings):
+                self._update(employees_swapped=1, employees_done=1, encodings_updated=len(new_encodings))
+            else:
+                # Re-registered meanwhile: the new rows are already current
+                self._update(employees_done=1)
+    
+    def _submit(self, image):
+        """Submit to the pool, backing off while live frames keep it full"""
+        while True:
+            try:
+                return self.face_pool.submit(
+                    process_face, image,
+                    detection=self.detection,
+                    check_mask=False,
+                    encode=True
+                )
+            except FacePoolBusy:
+                time.sleep(0.1)
+    
+    def _collect(self, future):
+        try:
+            face = self.face_pool.result(future)
+        except Exception as e:  # FacePoolTimeout or a worker error
+            print(f"⚠️ Face re-encoding task failed: {e}")
+            return None
+        return face['encoding'] if face['face_count'] == 1 else None
+    
+    def _encode_photos(self, photos) -> Dict:
+        """row id -> new encoding (None if the photo no longer yields one face)"""
+        encodings = {}
+        pending = deque()
+        
+        for row_id, sha256 in photos:
+            try:
+                image = decode_image_bytes(self.archive.read(sha256), self.max_image_width)
+            except Exception as e:
+                print(f"⚠️ Archived photo {sha256} unreadable: {e}")
+                encodings[row_id] = None
+                continue
+            
+            while len(pending) >= self.max_in_flight:
+                done_id, future = pending.popleft()
+                encodings[done_id] = self._collect(future)
+            pending.append((row_id, self._submit(image)))
+        
+        while pending:
+            done_id, future = pending.popleft()
+            encodings[done_id] = self._collect(future)
+        
+        return encodings
+    
+    def _swap(self, employee_id: str, encodings: Dict) -> bool:
+        """Replace all of an employee's outdated rows in one transaction"""
+        session = self.session_factory()
+        try:
+            current = {row[0] for row in session.query(EmployeeFaceEncoding.id).filter(
+                EmployeeFaceEncoding.employee_id == employee_id,
+                self._outdated()
+            )}
+            if current != set(encodings):
+                return False
+            
+            session.execute(update(EmployeeFaceEncoding), [
+                {
+                    'id': row_id,
+                    'face_encoding': self.store_encoding(encoding),
+                    'model_version': self.target_version
+                }
+                for row_id, encoding in encodings.items()
+            ])
+            name, is_active = session.query(Employee.name, Employee.is_active).filter(
+                Employee.employee_id == employee_id
+            ).one()
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        
+        if self.on_swapped:
+            self.on_swapped(employee_id, name, is_active, list(encodings.values()))
+        return True
+
+
+if __name__ == '__main__':
+    config = get_config()
+    
+    parser = argparse.ArgumentParser(description='Re-encode archived registration photos for the current model')
+    parser.add_argument('--database-url', default=config.DATABASE_URL)
+    parser.add_argument('--workers', type=int, default=config.FACE_POOL_WORKERS, help='Worker processes (0 = inline)')
+    parser.add_argument('--chunk-size', type=int, default=config.FACE_REENCODE_CHUNK_SIZE)
+    parser.add_argument('--max-in-flight', type=int, default=config.FACE_REENCODE_MAX_IN_FLIGHT)
+    parser.add_argument('--pause', type=float, default=config.FACE_REENCODE_PAUSE_SECONDS,
+                        help='Seconds between chunks')
+    args = parser.parse_args()
+    
+    engine = create_engine(args.database_url)
+    Base.metadata.create_all(engine)
+    upgrade_schema(engine)
+    
+    # Same detection settings as /api/register: no Haar pre-filter
+    detection = {
+        'detection_width': config.FACE_DETECTION_WIDTH['register'],
+        'model': config.FACE_DETECTION_MODEL,
+        'prefilter': False,
+        'min_face_ratio': config.FACE_HAAR_MIN_FACE_RATIO,
+        'roi_padding': config.FACE_HAAR_ROI_PADDING
+    }
+    face_pool = FaceWorkerPool(
+        workers=args.workers,
+        max_pending=max(args.max_in_flight, 1),
+        task_timeout=config.FACE_POOL_TASK_TIMEOUT
+    )
+    job = ReencodeJob(
+        sessionmaker(bind=engine),
+        PhotoArchive(config.UPLOAD_FOLDERS['faces']),
+        face_pool,
+        detection,
+        encoding_model_version(detection, config.FACE_ENCODING_MODEL_VERSION),
+        lambda encoding: encode_face_encoding(
+            encoding, dtype=config.FACE_ENCODING_DTYPE, normalize=config.FACE_ENCODING_NORMALIZE
+        ),
+        chunk_size=args.chunk_size,
+        max_in_flight=args.max_in_flight,
+        pause_seconds=args.pause,
+        max_image_width=config.MAX_IMAGE_WIDTH
+    )
+    
+    print(f"🔄 Re-encoding face encodings to model version {job.target_version}")
+    try:
+        job.start()
+        job.wait()
+    except KeyboardInterrupt:
+        job.cancel()
+        job.wait()
+    finally:
+        face_pool.shutdown()
+    print("ℹ Restart the server to reload its face index and encoding cache")
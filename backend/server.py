@@ -1,45 +1,39 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, stream_with_context, send_file
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
-# import face_recognition  # TODO: Fix dlib installation
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt, decode_token
 import numpy as np
-import base64
 import cv2
 from datetime import datetime, timedelta
-import io
-from PIL import Image
 import traceback
 from passlib.hash import bcrypt
 import os
-
-# Mock face_recognition until dlib is installed
-class MockFaceRecognition:
-    @staticmethod
-    def face_locations(img, model='hog'):
-        return [(50, 200, 150, 100)]  # Mock: one face detected
-    
-    @staticmethod
-    def face_encodings(img, face_locations):
-        return [np.random.rand(128)]  # Mock: random encoding
-    
-    @staticmethod
-    def compare_faces(known_encodings, unknown_encoding, tolerance=0.6):
-        return [True]  # Mock: always match
-    
-    @staticmethod
-    def face_distance(known_encodings, unknown_encoding):
-        return [0.3]  # Mock: good match
-
-face_recognition = MockFaceRecognition()
+import atexit
+import base64
+import json
+import time
 
 # Import config and utilities
 from config import Config, get_config
-from models import Base, Employee, Attendance, EmployeeFaceEncoding
+from models import Base, Employee, Attendance, AttendanceDaily, EmployeeFaceEncoding, upgrade_schema, enforce_once_per_day
 from utils.i18n import translate, get_user_language
-from utils.date_formatter import format_datetime
-from utils.validators import validate_employee_id, validate_email, validate_password, validate_name
-from utils.face_detection import analyze_face_quality, enhance_image_for_recognition
-from utils.mask_detection_cv import detect_mask_opencv  # NEW: Improved mask detection
+from utils.date_formatter import format_datetime, local_to_utc, utc_to_local
+from utils.validators import validate_employee_id, validate_email, validate_password, validate_name, sanitize_filename
+from utils.face_detection import face_recognition, enhance_image_for_recognition, MASK_STRATEGIES
+from utils.face_pipeline import process_face, encode_face, best_frame_index, check_registration_photo, QualityTierStats
+from utils.face_worker_pool import FaceWorkerPool, FacePoolBusy, FacePoolTimeout
+from utils.face_index import get_face_index
+from utils.frame_cache import FrameCache
+from utils.photo_archive import PhotoArchive
+from utils.attendance_export import ExportJobs, iter_csv
+from utils.attendance_rollup import (
+    SUMMARY_PERIODS, count_work_days, late_cutoff, period_bounds, record_check_in, summarize_daily
+)
+from utils.face_tracker import FaceTracker
+from utils.caching import LRUCache
+from utils.timing import StageTimer, StageHistogram, NULL_TIMER
+from utils.encoding_format import encode_face_encoding, decode_face_encoding, l2_normalize
+from utils.image_decoding import base64_to_bytes, decode_image_bytes
+from reencode import ReencodeJob, encoding_model_version
 from utils.qrcode_generator import (  # NEW: QR code system
     generate_employee_qr_code, 
     validate_qr_code, 
@@ -47,18 +41,33 @@ from utils.qrcode_generator import (  # NEW: QR code system
     cache_qr_code
 )
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, insert, select, literal, exists, and_, or_
+from sqlalchemy.orm import sessionmaker, contains_eager
+from sqlalchemy.dialects import postgresql, sqlite
+
+# WebSocket transport for the camera stream (optional)
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
 # Initialize Flask app
 app = Flask(__name__)
 
 # Load configuration
 config = get_config()
+# detect_mask() raises on an unknown strategy inside the quality check, which
+# would reject every frame as "not acceptable": refuse to start instead
+if config.MASK_DETECTION_STRATEGY not in MASK_STRATEGIES:
+    raise ValueError(
+        f"MASK_DETECTION_STRATEGY must be one of {', '.join(MASK_STRATEGIES)}, "
+        f"got {config.MASK_DETECTION_STRATEGY!r}"
+    )
 app.config['JWT_SECRET_KEY'] = config.JWT_SECRET_KEY
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=config.JWT_ACCESS_TOKEN_EXPIRES_HOURS)
 
 jwt = JWTManager(app)
+sock = Sock(app) if Sock else None
 
 # ==================== SMART CORS CONFIGURATION ====================
 # Dynamic CORS origins that support both localhost and ngrok
@@ -99,7 +108,7 @@ CORS(app,
          ],
          "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
          "allow_headers": ["Content-Type", "Authorization"],
-         "expose_headers": ["Content-Type", "Authorization"],
+         "expose_headers": ["Content-Type", "Authorization", "Server-Timing"],
          "supports_credentials": True,
          "max_age": 3600
      }})
@@ -108,12 +117,468 @@ print("🌐 CORS Configuration:")
 print(f"   Allowed Origins: {cors_origins}")
 print(f"   Ngrok Patterns: *.ngrok-free.app, *.ngrok.io, *.ngrok.app")
 
+# Process pool for detection, quality checks and encoding. Workers are forked
+# here, before the database engine and face index exist, so they stay small
+face_pool = FaceWorkerPool(
+    workers=config.FACE_POOL_WORKERS,
+    max_pending=config.FACE_POOL_MAX_PENDING,
+    task_timeout=config.FACE_POOL_TASK_TIMEOUT
+)
+atexit.register(face_pool.shutdown)
+# Slots batches leave to single frames; a batch larger than the rest could
+# never be admitted, so the batch size is capped to it
+analyze_batch_headroom = max(min(config.FACE_POOL_BATCH_HEADROOM, face_pool.max_pending - 1), 0)
+analyze_batch_max_frames = max(min(
+    config.FACE_ANALYZE_BATCH_MAX_FRAMES,
+    face_pool.max_pending - analyze_batch_headroom
+), 1)
+
 # Database setup using Config
 engine = create_engine(config.DATABASE_URL, echo=config.SQLALCHEMY_ECHO)
 SessionLocal = sessionmaker(bind=engine)
 
-# Create tables
+# Create tables, then add columns introduced since they were created
 Base.metadata.create_all(engine)
+upgrade_schema(engine)
+# One check-in per employee per day, enforced by a unique index
+# (insert_check_in() falls back to a guarded insert if it could not be created)
+once_per_day_indexed = enforce_once_per_day(engine, once_per_day=not config.ALLOW_MULTIPLE_ATTENDANCE_PER_DAY)
+
+# In-memory face index for kiosk (1:N) identification
+face_index = get_face_index()
+
+def load_face_index():
+    """Build the resident face index from every active employee's encodings"""
+    session = SessionLocal()
+    try:
+        rows = session.query(
+            EmployeeFaceEncoding.employee_id,
+            Employee.name,
+            EmployeeFaceEncoding.face_encoding
+        ).join(Employee).filter(Employee.is_active == True).all()
+        
+        # Employees registered through the old single-photo path before it
+        # wrote EmployeeFaceEncoding rows only have the legacy column
+        rows += session.query(
+            Employee.employee_id,
+            Employee.name,
+            Employee.face_encoding
+        ).filter(
+            Employee.is_active == True,
+            Employee.face_encoding.isnot(None),
+            ~session.query(EmployeeFaceEncoding.id).filter(
+                EmployeeFaceEncoding.employee_id == Employee.employee_id
+            ).exists()
+        ).all()
+        
+        face_index.rebuild(
+            (employee_id, name, decode_face_encoding(blob, normalize=config.FACE_ENCODING_NORMALIZE))
+            for employee_id, name, blob in rows
+        )
+        stats = face_index.stats()
+        print(f"✅ Face index loaded: {stats['encodings']} encodings for {stats['employees']} employees")
+    except Exception as e:
+        print(f"⚠️ Failed to load face index: {e}")
+    finally:
+        session.close()
+
+load_face_index()
+
+# Per-employee encoding cache for 1:1 recognition (invalidated on register)
+encoding_cache = LRUCache(
+    'employee_encodings',
+    max_entries=config.ENCODING_CACHE_MAX_ENTRIES,
+    max_bytes=config.ENCODING_CACHE_MAX_BYTES
+)
+
+# Recent frame -> process_face() result, for clients that resend frames
+frame_cache = FrameCache(
+    max_entries=config.FRAME_CACHE_MAX_ENTRIES,
+    max_bytes=config.FRAME_CACHE_MAX_BYTES,
+    ttl_seconds=config.FRAME_CACHE_TTL_SECONDS,
+    perceptual=config.FRAME_CACHE_PERCEPTUAL
+)
+
+# Which quality tier (thumbnail gate, detection, quality check) stopped each frame
+quality_tier_stats = QualityTierStats()
+
+# Accepted registration photos, kept for re-encoding after a model change
+photo_archive = PhotoArchive(config.UPLOAD_FOLDERS['faces'])
+reencode_job = None
+
+# Background XLSX attendance exports
+attendance_export_jobs = ExportJobs(
+    config.UPLOAD_FOLDERS['temp'],
+    workers=config.ATTENDANCE_EXPORT_WORKERS,
+    ttl_seconds=config.ATTENDANCE_EXPORT_TTL
+)
+atexit.register(attendance_export_jobs.shutdown)
+
+# Check-ins after this time are flagged late in the daily rollup
+attendance_late_cutoff = late_cutoff(config.WORK_START_TIME, config.LATE_THRESHOLD_MINUTES)
+
+# /api/attendance/summary results per (group_by, period, period start),
+# invalidated when a check-in lands in that period
+ATTENDANCE_SUMMARY_GROUPS = {
+    'department': Employee.department,
+    'position': Employee.position
+}
+summary_cache = LRUCache(
+    'attendance_summary',
+    max_entries=config.ATTENDANCE_SUMMARY_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.ATTENDANCE_SUMMARY_CACHE_TTL
+)
+
+# Per-stage latency of the face endpoints (decode, detection, quality, mask,
+# encoding, DB lookup, attendance insert), see utils/timing.py
+stage_histogram = StageHistogram()
+TIMED_ENDPOINTS = {'analyze_face', 'analyze_face_batch', 'register', 'recognize', 'kiosk_identify'}
+
+@app.before_request
+def start_stage_timer():
+    if config.STAGE_TIMING_ENABLED and request.endpoint in TIMED_ENDPOINTS:
+        g.stage_timer = StageTimer()
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def finish_stage_timer(response):
+    """Send the stage timings as a Server-Timing header and record them"""
+    timer = g.pop('stage_timer', None)
+    if timer is None:
+        return response
+    
+    timer.add('total', (time.perf_counter() - g.request_started) * 1000)
+    stage_histogram.observe(request.endpoint, timer.stages)
+    response.headers['Server-Timing'] = timer.server_timing()
+    
+    if config.STAGE_TIMING_IN_RESPONSE and response.is_json:
+        body = response.get_json()
+        if isinstance(body, dict):
+            body['timings'] = timer.as_dict()
+            response.set_data(app.json.dumps(body))
+    return response
+
+def stage_timer():
+    """StageTimer of the current request; a disabled one outside timed endpoints"""
+    return g.get('stage_timer', NULL_TIMER)
+
+def insert_check_in(session, employee_id, check_in_type, confidence_score, notes=None):
+    """
+    Record a check-in and its daily rollup update in the session's transaction
+    
+    Unless ALLOW_MULTIPLE_ATTENDANCE_PER_DAY, this is one INSERT ... ON
+    CONFLICT DO NOTHING: the unique (employee_id, work_date) index turns a
+    second check-in on the same day into a no-op, even when two requests race.
+    Without the index (older duplicates kept enforce_once_per_day() from
+    creating it) or ON CONFLICT support (MySQL/MariaDB) it is an INSERT ...
+    SELECT ... WHERE NOT EXISTS, which still refuses a second check-in but
+    leaves a narrow race on databases that run writers concurrently.
+    
+    Returns:
+        Values of the new Attendance row (with 'id'), or None if the employee
+        already checked in today. The caller commits.
+    """
+    timestamp = datetime.utcnow()  # Same as the column default
+    check_in = {
+        'employee_id': employee_id,
+        'timestamp': timestamp,
+        'work_date': utc_to_local(timestamp).date(),
+        'check_in_type': check_in_type,
+        'confidence_score': confidence_score,
+        'notes': notes
+    }
+    
+    dialect = engine.dialect.name
+    if config.ALLOW_MULTIPLE_ATTENDANCE_PER_DAY:
+        statement = insert(Attendance).values(**check_in)
+    elif once_per_day_indexed and dialect == 'postgresql':
+        statement = postgresql.insert(Attendance).values(**check_in).on_conflict_do_nothing()
+    elif once_per_day_indexed and dialect == 'sqlite':
+        statement = sqlite.insert(Attendance).values(**check_in).on_conflict_do_nothing()
+    else:
+        # No index, or a database without ON CONFLICT (e.g. MySQL/MariaDB)
+        columns = list(check_in)
+        already_checked_in = exists().where(
+            Attendance.employee_id == employee_id,
+            Attendance.work_date == check_in['work_date']
+        )
+        statement = insert(Attendance).from_select(
+            columns,
+            select(*[literal(check_in[column], Attendance.__table__.c[column].type) for column in columns]).where(
+                ~already_checked_in
+            )
+        )
+    
+    if engine.dialect.insert_returning:
+        attendance_id = session.execute(statement.returning(Attendance.id)).scalar()
+    else:
+        result = session.execute(statement)
+        attendance_id = result.lastrowid if result.rowcount else None
+    if attendance_id is None:
+        return None
+    
+    check_in['id'] = attendance_id
+    record_check_in(session, check_in, attendance_late_cutoff)
+    return check_in
+
+def invalidate_attendance_summary(work_date):
+    """Drop the cached summaries of every period containing a new check-in"""
+    for period in SUMMARY_PERIODS:
+        period_start, _ = period_bounds(period, work_date)
+        for group_by in ATTENDANCE_SUMMARY_GROUPS:
+            summary_cache.invalidate((group_by, period, period_start))
+
+def get_employee_encodings(employee_id):
+    """
+    Get an employee's name and ready-to-use face encodings
+    Served from the encoding cache, falls back to the database on a miss
+    
+    Returns:
+        {'name': str, 'encodings': ndarray (n, 128), 'multi_photo': bool}
+        or None if the employee does not exist
+    """
+    cached = encoding_cache.get(employee_id)
+    if cached is not None:
+        return cached
+    
+    # Taken before the read: a re-registration committing meanwhile
+    # invalidates it and the stale rows are not cached
+    generation = encoding_cache.generation(employee_id)
+    session = SessionLocal()
+    try:
+        employee = session.query(Employee).filter_by(employee_id=employee_id).first()
+        
+        if not employee:
+            return None
+        
+        # Try to load multiple face encodings first (NEW SYSTEM)
+        face_encodings_records = session.query(EmployeeFaceEncoding).filter_by(
+            employee_id=employee_id
+        ).all()
+        
+        if face_encodings_records:
+            encodings = np.vstack([
+                decode_face_encoding(rec.face_encoding, normalize=config.FACE_ENCODING_NORMALIZE)
+                for rec in face_encodings_records
+            ])
+        elif employee.face_encoding:
+            # OLD SYSTEM: Single encoding (backward compatibility)
+            encodings = decode_face_encoding(
+                employee.face_encoding, normalize=config.FACE_ENCODING_NORMALIZE
+            ).reshape(1, -1)
+        else:
+            encodings = np.empty((0, 128), dtype=np.float32)
+        
+        entry = {
+            'name': employee.name,
+            'encodings': encodings,
+            'multi_photo': bool(face_encodings_records)
+        }
+        encoding_cache.put(employee_id, entry, generation=generation)
+        return entry
+    finally:
+        session.close()
+
+def store_face_encoding(face_encoding):
+    """Serialize a face encoding in the configured storage format"""
+    return encode_face_encoding(
+        face_encoding,
+        dtype=config.FACE_ENCODING_DTYPE,
+        normalize=config.FACE_ENCODING_NORMALIZE
+    )
+
+def archive_photo(image_source):
+    """Archive an accepted registration photo; returns its SHA-256, None if archiving is off"""
+    if not config.FACE_PHOTO_ARCHIVE_ENABLED:
+        return None
+    if isinstance(image_source, str):
+        image_source = base64_to_bytes(image_source)
+    return photo_archive.store(image_source)
+
+def current_model_version():
+    """model_version stored with new encodings (see reencode.py)"""
+    return encoding_model_version(detection_options('register'), config.FACE_ENCODING_MODEL_VERSION)
+
+def query_face_encoding(face_encoding):
+    """Bring a freshly extracted encoding into the same space as stored ones"""
+    if config.FACE_ENCODING_NORMALIZE:
+        return l2_normalize(face_encoding)
+    return face_encoding
+
+def detection_options(endpoint):
+    """
+    detect_faces() keyword arguments for an endpoint, from Config
+    Polling endpoints run the Haar pre-filter first; registration never does
+    """
+    return {
+        'detection_width': config.FACE_DETECTION_WIDTH[endpoint],
+        'model': config.FACE_DETECTION_MODEL,
+        'prefilter': config.FACE_HAAR_PREFILTER and endpoint != 'register',
+        'min_face_ratio': config.FACE_HAAR_MIN_FACE_RATIO,
+        'roi_padding': config.FACE_HAAR_ROI_PADDING
+    }
+
+def prescreen_options():
+    """prescreen_frame() keyword arguments from Config, None if the gate is disabled"""
+    if not config.FACE_PRESCREEN_ENABLED:
+        return None
+    return {
+        'thumbnail_width': config.FACE_PRESCREEN_THUMBNAIL_WIDTH,
+        'brightness_min': config.FACE_PRESCREEN_BRIGHTNESS_MIN,
+        'brightness_max': config.FACE_PRESCREEN_BRIGHTNESS_MAX,
+        'blur_threshold': config.FACE_PRESCREEN_BLUR_THRESHOLD
+    }
+
+def no_face_message(face, lang):
+    """Why a frame has no face: the thumbnail gate's recommendation, or not detected"""
+    if face['prescreen'] is not None:
+        return face['prescreen']['recommendation']
+    return translate('face_not_detected', lang)
+
+def quality_payload(quality_result):
+    """Quality metrics and mask verdict in the /api/face/analyze response shape"""
+    return {
+        'quality_metrics': {
+            'overall_score': quality_result['quality_score'],
+            'blur_score': quality_result.get('blur_score', 0),
+            'brightness_score': quality_result.get('brightness_score', 0),
+            'size_score': quality_result.get('size_score', 0),
+            'angle_score': quality_result.get('angle_score', 0),
+            'face_dimensions': quality_result.get('face_dimensions')
+        },
+        'mask_detection': {
+            'detected': quality_result.get('mask_detected', False),
+            'confidence': quality_result.get('mask_confidence', 0.0),
+            'reason': quality_result.get('mask_reason', ''),
+            'method': quality_result.get('mask_method', 'none')
+        },
+        'is_acceptable': quality_result['is_acceptable'],
+        'recommendation': quality_result['recommendation']
+    }
+
+def face_pool_error(error):
+    """503 response when the face worker pool is saturated or a task timed out"""
+    print(f"⚠️ Face worker pool: {error}")
+    return jsonify({
+        'status': 'error',
+        'message': 'Server sedang sibuk memproses wajah. Silakan coba lagi sebentar.',
+        'detected': False
+    }), 503
+
+def verify_and_mark_attendance(employee_id, face_encoding, quality_result, lang):
+    """
+    1-to-1 match of a face encoding against the employee's stored encodings,
+    then mark today's attendance (shared by /api/recognize and the camera
+    stream session)
+    
+    Returns:
+        (response body dict, HTTP status code)
+    """
+    # Warn about low quality (but don't block)
+    quality_warnings = []
+    if quality_result['quality_score'] < 70:
+        quality_warnings.append(quality_result['recommendation'])
+    
+    timer = stage_timer()
+    unknown_encoding = query_face_encoding(face_encoding)
+    
+    # Get logged-in employee's encodings (1-to-1 matching, cached)
+    with timer.span('db_lookup'):
+        employee_entry = get_employee_encodings(employee_id)
+    
+    if employee_entry is None:
+        return {
+            'status': 'error',
+            'message': translate('employee_not_found', lang),
+            'detected': False
+        }, 404
+    
+    employee_name = employee_entry['name']
+    known_encodings = employee_entry['encodings']
+    
+    if len(known_encodings) == 0:
+        # No face encodings at all
+        return {
+            'status': 'error',
+            'message': f'Wajah untuk akun {employee_name} belum terdaftar. Silakan hubungi admin.',
+            'detected': False
+        }, 200
+    
+    # Compare with ALL stored encodings
+    with timer.span('matching'):
+        all_matches = face_recognition.compare_faces(
+            known_encodings, 
+            unknown_encoding, 
+            tolerance=config.FACE_RECOGNITION_TOLERANCE
+        )
+        all_distances = face_recognition.face_distance(known_encodings, unknown_encoding)
+    
+    # Use BEST match (minimum distance)
+    best_match_idx = np.argmin(all_distances)
+    best_distance = all_distances[best_match_idx]
+    is_match = all_matches[best_match_idx]
+    
+    if employee_entry['multi_photo']:
+        print(f"🔍 [Multi-Photo Recognition] Compared with {len(known_encodings)} photos")
+        print(f"✅ Best match: Photo {best_match_idx + 1}, Distance: {best_distance:.4f}")
+    else:
+        print(f"🔍 [Single-Photo Recognition] Using legacy single photo")
+    
+    # Check if face matches
+    if not is_match:
+        return {
+            'status': 'error',
+            'message': f'Wajah tidak cocok dengan akun {employee_name}. Silakan gunakan wajah Anda sendiri.',
+            'detected': False,
+            'confidence': float(1 - best_distance)
+        }, 200
+    
+    session = SessionLocal()
+    try:
+        # Face matches! Mark attendance, unless already marked today
+        confidence_score = int((1 - best_distance) * 100)
+        with timer.span('db_insert'):
+            check_in = insert_check_in(session, employee_id, 'face_recognition', confidence_score)
+            session.commit()
+        
+        if check_in is None:
+            return {
+                'status': 'success',
+                'message': translate('attendance_already_marked', lang),
+                'name': employee_name,
+                'employee_id': employee_id,
+                'already_marked': True,
+                'detected': True,
+                'confidence': float(1 - best_distance)
+            }, 200
+        
+        invalidate_attendance_summary(check_in['work_date'])
+        
+        response_message = translate('attendance_marked', lang) + f' Selamat datang, {employee_name}!'
+        if quality_warnings:
+            response_message += f' | ⚠️ {quality_warnings[0]}'
+        
+        return {
+            'status': 'success',
+            'message': response_message,
+            'name': employee_name,
+            'employee_id': employee_id,
+            'already_marked': False,
+            'detected': True,
+            'confidence': float(1 - best_distance),
+            'quality_score': quality_result['quality_score'],
+            'timestamp': datetime.now().isoformat()
+        }, 200
+    
+    except Exception as e:
+        session.rollback()
+        return {
+            'status': 'error',
+            'message': f'Error: {str(e)}',
+            'detected': False
+        }, 500
+    finally:
+        session.close()
 
 def decode_base64_image(base64_string):
     """
@@ -121,14 +586,7 @@ def decode_base64_image(base64_string):
     Returns: (numpy_array, error_string) - error_string is None if successful
     """
     try:
-        if 'base64,' in base64_string:
-            base64_string = base64_string.split('base64,')[1]
-        
-        img_data = base64.b64decode(base64_string)
-        img = Image.open(io.BytesIO(img_data))
-        img_rgb = img.convert('RGB')
-        img_array = np.array(img_rgb)
-        
+        img_array = decode_image_bytes(base64_to_bytes(base64_string), config.MAX_IMAGE_WIDTH)
         return img_array, None
     except Exception as e:
         error_msg = f"Error decoding image: {str(e)}"
@@ -136,6 +594,157 @@ def decode_base64_image(base64_string):
         traceback.print_exc()
         return None, error_msg
 
+def decode_image_source(source):
+    """
+    Decode an image from read_image_payload(): a base64 string (JSON API)
+    or raw encoded bytes (multipart/form-data or image/* body)
+    Returns: (numpy_array, error_string) - error_string is None if successful
+    """
+    if isinstance(source, str):
+        return decode_base64_image(source)
+    
+    try:
+        return decode_image_bytes(source, config.MAX_IMAGE_WIDTH), None
+    except Exception as e:
+        error_msg = f"Error decoding image: {str(e)}"
+        print(error_msg)
+        return None, error_msg
+
+def process_frame(image_source, endpoint, **options):
+    """
+    Decode a frame and run process_face() on it in the face worker pool,
+    reusing the result of a recent identical frame from frame_cache
+    
+    Args:
+        image_source: base64 string or raw bytes from read_image_payload()
+        endpoint: detection_options() key, also namespaces the cache
+        options: process_face() keyword arguments (check_mask, encode...)
+    
+    Returns: (process_face result, error_string) - error_string is None if successful
+    """
+    timer = stage_timer()
+    if isinstance(image_source, str):
+        try:
+            with timer.span('decode'):
+                image_source = base64_to_bytes(image_source)
+        except ValueError as e:
+            return None, f"Error decoding image: {str(e)}"
+    
+    namespace = (endpoint,) + tuple(sorted(options.items()))
+    content_key = frame_cache.content_key(image_source, namespace)
+    face = frame_cache.get(content_key)
+    if face is not None:
+        return face, None
+    
+    with timer.span('decode'):
+        img_array, decode_error = decode_image_source(image_source)
+    if img_array is None:
+        return None, decode_error
+    
+    # A dHash of the whole frame cannot tell two people apart in the same
+    # framing, so results carrying a face encoding are only reused for
+    # byte-identical frames
+    perceptual_key = None if options.get('encode') else frame_cache.perceptual_key(img_array, namespace)
+    face = frame_cache.get(perceptual_key)
+    if face is None:
+        # 'face_pool' keeps only the queueing/transfer overhead once the
+        # worker's own stage timings are merged
+        with timer.span('face_pool'):
+            face = face_pool.run(
+                process_face, img_array,
+                detection=detection_options(endpoint),
+                prescreen=prescreen_options(),
+                mask_strategy=config.MASK_DETECTION_STRATEGY,
+                timings=timer.enabled,
+                **options
+            )
+        timer.merge(face['timings'], within='face_pool')
+        quality_tier_stats.record(face)
+    
+    frame_cache.put(face, content_key, perceptual_key)
+    return face, None
+
+def read_image_payload():
+    """
+    Read request fields and images from any supported upload format
+    
+    - application/json: base64 data URLs in 'image' / 'images' (legacy)
+    - multipart/form-data: files named 'image' / 'images', other fields as form data
+    - image/jpeg (any image/*): raw body is 'image', other fields from the query string
+    
+    Returns:
+        dict shaped like the JSON body; image fields hold base64 strings
+        or raw bytes, both accepted by decode_image_source()
+    """
+    if request.mimetype.startswith('image/'):
+        data = request.args.to_dict()
+        data['image'] = request.get_data(cache=False)
+        return data
+    
+    if request.mimetype == 'multipart/form-data':
+        data = request.form.to_dict()
+        for field in request.files:
+            files = [f.read() for f in request.files.getlist(field)]
+            data[field] = files if field == 'images' else files[0]
+        return data
+    
+    return request.get_json(silent=True)
+
+def parse_bool(value, default=True):
+    """Parse a boolean that may come from JSON or a form/query string"""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD query parameter; None if absent, ValueError if malformed"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def parse_attendance_filters(args):
+    """Date range, department and check-in type filters from query parameters; ValueError if malformed"""
+    return {
+        'start_date': parse_date(args.get('start_date')),
+        'end_date': parse_date(args.get('end_date')),
+        'department': args.get('department'),
+        'check_in_type': args.get('check_in_type')
+    }
+
+def filter_attendance(query, filters):
+    """
+    Apply parse_attendance_filters() filters to a query joined with Employee
+    
+    Dates are server-local days, like work_date and the summary; timestamps
+    are stored in UTC, so the day boundaries are converted.
+    """
+    if filters['start_date']:
+        start = local_to_utc(datetime.combine(filters['start_date'], datetime.min.time()))
+        query = query.filter(Attendance.timestamp >= start)
+    if filters['end_date']:
+        end = local_to_utc(datetime.combine(filters['end_date'] + timedelta(days=1), datetime.min.time()))
+        query = query.filter(Attendance.timestamp < end)
+    if filters['department']:
+        query = query.filter(Employee.department == filters['department'])
+    if filters['check_in_type']:
+        query = query.filter(Attendance.check_in_type == filters['check_in_type'])
+    return query
+
+def encode_attendance_cursor(attendance):
+    """Opaque keyset cursor pointing just after this attendance row"""
+    key = f'{attendance.timestamp.isoformat()}|{attendance.id}'
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_attendance_cursor(cursor):
+    """(timestamp, id) of a cursor from encode_attendance_cursor; ValueError if malformed"""
+    try:
+        timestamp, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(record_id)
+    except Exception:
+        raise ValueError(f'Invalid cursor: {cursor}')
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -291,7 +900,7 @@ def analyze_face():
         claims = get_jwt()
         lang = claims.get('language', 'id')
         
-        data = request.get_json()
+        data = read_image_payload()
         
         if not data or 'image' not in data:
             return jsonify({
@@ -299,29 +908,30 @@ def analyze_face():
                 'message': translate('invalid_input', lang)
             }), 400
         
-        image_base64 = data['image']
-        check_mask = data.get('check_mask', True)
+        image_source = data['image']
+        check_mask = parse_bool(data.get('check_mask'), default=True)
         
-        # Decode image
-        img_array, decode_error = decode_base64_image(image_base64)
-        if img_array is None:
+        # Decode, detect face and analyze quality including mask detection
+        # in the face worker pool, or reuse a repeated frame's result
+        face, decode_error = process_frame(
+            image_source, 'analyze',
+            check_mask=check_mask
+        )
+        if face is None:
             return jsonify({
                 'status': 'error',
                 'message': f'Gagal memproses gambar: {decode_error}'
             }), 400
         
-        # Detect face
-        face_locations = face_recognition.face_locations(img_array, model=config.FACE_DETECTION_MODEL)
-        
-        if len(face_locations) == 0:
+        if face['face_count'] == 0:
             return jsonify({
                 'status': 'error',
-                'message': translate('face_not_detected', lang),
+                'message': no_face_message(face, lang),
                 'quality_score': 0,
                 'is_acceptable': False
             }), 200
         
-        if len(face_locations) > 1:
+        if face['face_count'] > 1:
             return jsonify({
                 'status': 'error',
                 'message': translate('multiple_faces', lang),
@@ -329,38 +939,16 @@ def analyze_face():
                 'is_acceptable': False
             }), 200
         
-        # Analyze face quality (using improved mask detection)
-        quality_result = analyze_face_quality(img_array, face_locations[0], check_mask=check_mask)
-        
-        # PHASE 3: Use improved OpenCV mask detection
-        if check_mask:
-            mask_result_cv = detect_mask_opencv(img_array, face_locations[0])
-            # Override with more accurate OpenCV detection
-            if mask_result_cv['mask_detected'] and mask_result_cv['confidence'] > 70:
-                quality_result['mask_detected'] = True
-                quality_result['mask_confidence'] = mask_result_cv['confidence']
-                quality_result['mask_reason'] = mask_result_cv['reason']
+        quality_result = face['quality']
         
         return jsonify({
             'status': 'success' if quality_result['is_acceptable'] else 'warning',
             'message': quality_result['recommendation'],
-            'quality_metrics': {
-                'overall_score': quality_result['quality_score'],
-                'blur_score': quality_result['blur_score'],
-                'brightness_score': quality_result['brightness_score'],
-                'size_score': quality_result['size_score'],
-                'angle_score': quality_result['angle_score'],
-                'face_dimensions': quality_result['face_dimensions']
-            },
-            'mask_detection': {
-                'detected': quality_result['mask_detected'],
-                'confidence': quality_result['mask_confidence'],
-                'reason': quality_result['mask_reason']
-            },
-            'is_acceptable': quality_result['is_acceptable'],
-            'recommendation': quality_result['recommendation']
+            **quality_payload(quality_result)
         }), 200
     
+    except (FacePoolBusy, FacePoolTimeout) as e:
+        return face_pool_error(e)
     except Exception as e:
         print(f"Error in /api/face/analyze: {str(e)}")
         traceback.print_exc()
@@ -369,6 +957,121 @@ def analyze_face():
             'message': translate('server_error', lang)
         }), 500
 
+@app.route('/api/face/analyze/batch', methods=['POST'])
+@jwt_required()
+def analyze_face_batch():
+    """
+    Analyze a short burst of frames in one request and pick the best one
+    Accepts 'images' (array, JSON base64 or multipart files) and returns
+    per-frame quality plus best_index, so the client can register or
+    recognize with the sharpest frame without several round-trips
+    """
+    try:
+        claims = get_jwt()
+        lang = claims.get('language', 'id')
+        
+        data = read_image_payload()
+        
+        if not data or not isinstance(data.get('images'), list) or len(data['images']) == 0:
+            return jsonify({
+                'status': 'error',
+                'message': translate('invalid_input', lang)
+            }), 400
+        
+        images_sources = data['images']
+        if len(images_sources) > analyze_batch_max_frames:
+            return jsonify({
+                'status': 'error',
+                'message': f'Maksimal {analyze_batch_max_frames} frame per permintaan'
+            }), 400
+        
+        check_mask = parse_bool(data.get('check_mask'), default=True)
+        detection = detection_options('analyze')
+        timer = stage_timer()
+        
+        # Decode every frame, then analyze them concurrently in the face
+        # worker pool; the batch is admitted whole or rejected as busy
+        decode_errors = {}
+        decoded = {}
+        for index, image_source in enumerate(images_sources):
+            with timer.span('decode'):
+                img_array, decode_error = decode_image_source(image_source)
+            if img_array is None:
+                decode_errors[index] = f'Gagal memproses gambar: {decode_error}'
+            else:
+                decoded[index] = img_array
+        
+        futures = face_pool.submit_batch(
+            process_face, list(decoded.values()),
+            headroom=analyze_batch_headroom,
+            detection=detection,
+            check_mask=check_mask,
+            mask_strategy=config.MASK_DETECTION_STRATEGY,
+            prescreen=prescreen_options(),
+            timings=timer.enabled
+        )
+        pending = dict(zip(decoded, futures))
+        
+        faces = [None] * len(images_sources)
+        for index, future in pending.items():
+            with timer.span('face_pool'):
+                faces[index] = face_pool.result(future)
+            timer.merge(faces[index]['timings'], within='face_pool')
+            quality_tier_stats.record(faces[index])
+        
+        frames = []
+        for index, face in enumerate(faces):
+            if face is None:
+                frames.append({
+                    'index': index,
+                    'status': 'error',
+                    'message': decode_errors[index],
+                    'is_acceptable': False
+                })
+            elif face['face_count'] != 1:
+                frames.append({
+                    'index': index,
+                    'status': 'error',
+                    'message': no_face_message(face, lang) if face['face_count'] == 0 else translate('multiple_faces', lang),
+                    'quality_score': 0,
+                    'is_acceptable': False
+                })
+            else:
+                quality_result = face['quality']
+                frames.append({
+                    'index': index,
+                    'status': 'success' if quality_result['is_acceptable'] else 'warning',
+                    'message': quality_result['recommendation'],
+                    **quality_payload(quality_result)
+                })
+        
+        best_index = best_frame_index(faces)
+        
+        if best_index is None:
+            return jsonify({
+                'status': 'error',
+                'message': translate('face_not_detected', lang),
+                'best_index': None,
+                'frames': frames
+            }), 200
+        
+        return jsonify({
+            'status': frames[best_index]['status'],
+            'message': frames[best_index]['message'],
+            'best_index': best_index,
+            'frames': frames
+        }), 200
+    
+    except (FacePoolBusy, FacePoolTimeout) as e:
+        return face_pool_error(e)
+    except Exception as e:
+        print(f"Error in /api/face/analyze/batch: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'status': 'error',
+            'message': translate('server_error', 'id')
+        }), 500
+
 @app.route('/api/register', methods=['POST'])
 @jwt_required()
 def register():
@@ -413,7 +1116,7 @@ def register():
             session.close()
         
         # Continue with registration
-        data = request.get_json()
+        data = read_image_payload() or {}
         
         # Check for MULTIPLE IMAGES (new format)
         if 'images' in data:
@@ -426,9 +1129,9 @@ def register():
             
             name = data['name']
             employee_id = data['employee_id']
-            images_base64 = data['images']  # Array of 3 images
+            images_sources = data['images']  # Array of 3 images
             
-            if not isinstance(images_base64, list) or len(images_base64) != 3:
+            if not isinstance(images_sources, list) or len(images_sources) != 3:
                 return jsonify({
                     'status': 'error',
                     'message': 'Diperlukan tepat 3 foto untuk registrasi'
@@ -450,73 +1153,64 @@ def register():
                     'message': error_msg
                 }), 400
             
-            # Process all 3 images
-            encodings_data = []
+            # Decode every photo, then detect, check quality and encode all of
+            # them concurrently in the face worker pool
+            timer = stage_timer()
+            photo_results = {}
+            pending = {}
             
-            for idx, image_base64 in enumerate(images_base64, start=1):
-                # Decode image
-                img_array, decode_error = decode_base64_image(image_base64)
+            for idx, image_source in enumerate(images_sources, start=1):
+                with timer.span('decode'):
+                    img_array, decode_error = decode_image_source(image_source)
                 if img_array is None:
-                    return jsonify({
+                    photo_results[idx] = {
+                        'photo_index': idx,
                         'status': 'error',
                         'message': f'Gagal memproses foto ke-{idx}: {decode_error}'
-                    }), 400
-                
-                # Detect face
-                face_locations = face_recognition.face_locations(img_array, model=config.FACE_DETECTION_MODEL)
-                
-                if len(face_locations) == 0:
-                    return jsonify({
-                        'status': 'error',
-                        'message': f'Wajah tidak terdeteksi pada foto ke-{idx}'
-                    }), 400
-                
-                if len(face_locations) > 1:
-                    return jsonify({
-                        'status': 'error',
-                        'message': f'Lebih dari 1 wajah terdeteksi pada foto ke-{idx}'
-                    }), 400
-                
-                # Analyze face quality including mask detection
-                quality_result = analyze_face_quality(img_array, face_locations[0], check_mask=True)
+                    }
+                    continue
                 
-                # Check if quality is acceptable
-                if not quality_result['is_acceptable']:
-                    return jsonify({
-                        'status': 'error',
-                        'message': f'Foto ke-{idx}: {quality_result["recommendation"]}',
-                        'photo_index': idx,
-                        'quality_score': quality_result['quality_score'],
-                        'mask_detected': quality_result['mask_detected']
-                    }), 400
+                pending[idx] = face_pool.submit(
+                    process_face, img_array,
+                    detection=detection_options('register'),
+                    check_mask=True,
+                    mask_strategy=config.MASK_DETECTION_STRATEGY,
+                    encode=True,
+                    require_acceptable=True,
+                    timings=timer.enabled
+                )
+            
+            encodings_data = []
+            for idx, future in pending.items():
+                with timer.span('face_pool'):
+                    face = face_pool.result(future)
+                timer.merge(face['timings'], within='face_pool')
+                photo_results[idx] = check_registration_photo(idx, face)
                 
-                # Warn if mask is detected
-                if quality_result['mask_detected']:
-                    return jsonify({
-                        'status': 'error',
-                        'message': f'⚠️ Masker terdeteksi pada foto ke-{idx}! Harap lepas masker untuk registrasi wajah.',
+                if photo_results[idx]['status'] == 'success':
+                    encodings_data.append({
+                        'encoding': face['encoding'],
                         'photo_index': idx,
-                        'mask_detected': True,
-                        'mask_confidence': quality_result['mask_confidence']
-                    }), 400
-                
-                # Extract face encoding
-                face_encodings = face_recognition.face_encodings(img_array, face_locations)
-                
-                if len(face_encodings) == 0:
-                    return jsonify({
-                        'status': 'error',
-                        'message': f'Gagal mengekstrak fitur wajah dari foto ke-{idx}'
-                    }), 400
-                
-                face_encoding = face_encodings[0]
-                
-                # Store encoding data with metadata
-                encodings_data.append({
-                    'encoding': face_encoding,
-                    'photo_index': idx,
-                    'quality_score': int(quality_result['quality_score'])
-                })
+                        'quality_score': photo_results[idx]['quality_score']
+                    })
+            
+            photos = [photo_results[idx] for idx in sorted(photo_results)]
+            failed = [photo for photo in photos if photo['status'] != 'success']
+            
+            # Report every rejected photo at once instead of one per attempt
+            if failed:
+                return jsonify({
+                    'status': 'error',
+                    'message': ' | '.join(photo['message'] for photo in failed),
+                    'photo_index': failed[0]['photo_index'],
+                    'photos': photos
+                }), 400
+            
+            for enc_data in encodings_data:
+                enc_data['stored_encoding'] = store_face_encoding(enc_data['encoding'])
+                # Keep the accepted photos so they can be re-encoded after a model change
+                enc_data['photo_sha256'] = archive_photo(images_sources[enc_data['photo_index'] - 1])
+            model_version = current_model_version()
             
             # Save to database
             session = SessionLocal()
@@ -547,23 +1241,41 @@ def register():
                     session.add(new_employee)
                     message = f'✅ Karyawan {name} berhasil didaftarkan dengan 3 foto! Password default: {employee_id}'
                 
-                # Save all 3 face encodings
-                for enc_data in encodings_data:
-                    face_enc = EmployeeFaceEncoding(
-                        employee_id=employee_id,
-                        face_encoding=enc_data['encoding'].tobytes(),
-                        photo_index=enc_data['photo_index'],
-                        quality_score=enc_data['quality_score']
-                    )
-                    session.add(face_enc)
+                # Employee row first, then all 3 face encodings in one batched INSERT
+                with timer.span('db_insert'):
+                    session.flush()
+                    session.execute(insert(EmployeeFaceEncoding), [
+                        {
+                            'employee_id': employee_id,
+                            'face_encoding': enc_data['stored_encoding'],
+                            'photo_index': enc_data['photo_index'],
+                            'quality_score': enc_data['quality_score'],
+                            'model_version': model_version,
+                            'photo_sha256': enc_data['photo_sha256']
+                        }
+                        for enc_data in encodings_data
+                    ])
+                    
+                    session.commit()
                 
-                session.commit()
+                # Old encodings were replaced: drop the cached copy
+                encoding_cache.invalidate(employee_id)
+                
+                # Refresh kiosk index with the new encodings, decoded like
+                # load_face_index() does so the index holds one vector space
+                face_index.set_employee(
+                    employee_id, name, [
+                        decode_face_encoding(enc['stored_encoding'], normalize=config.FACE_ENCODING_NORMALIZE)
+                        for enc in encodings_data
+                    ]
+                )
                 
                 return jsonify({
                     'status': 'success',
                     'message': message,
                     'photos_registered': 3,
-                    'quality_scores': [enc['quality_score'] for enc in encodings_data]
+                    'quality_scores': [enc['quality_score'] for enc in encodings_data],
+                    'photos': photos
                 }), 200
             
             except Exception as e:
@@ -585,7 +1297,7 @@ def register():
             
             name = data['name']
             employee_id = data['employee_id']
-            image_base64 = data['image']
+            image_source = data['image']
             
             # Validate employee_id format
             is_valid, error_msg = validate_employee_id(employee_id)
@@ -604,30 +1316,42 @@ def register():
                 }), 400
             
             # Decode image
-            img_array, decode_error = decode_base64_image(image_base64)
+            timer = stage_timer()
+            with timer.span('decode'):
+                img_array, decode_error = decode_image_source(image_source)
             if img_array is None:
                 return jsonify({
                     'status': 'error',
                     'message': f'Gagal memproses gambar: {decode_error}'
                 }), 400
             
-            # Detect face
-            face_locations = face_recognition.face_locations(img_array, model=config.FACE_DETECTION_MODEL)
+            # Detect face, analyze quality including mask detection and
+            # extract the encoding in the face worker pool
+            with timer.span('face_pool'):
+                face = face_pool.run(
+                    process_face, img_array,
+                    detection=detection_options('register'),
+                    check_mask=True,
+                    mask_strategy=config.MASK_DETECTION_STRATEGY,
+                    encode=True,
+                    require_acceptable=True,
+                    timings=timer.enabled
+                )
+            timer.merge(face['timings'], within='face_pool')
             
-            if len(face_locations) == 0:
+            if face['face_count'] == 0:
                 return jsonify({
                     'status': 'error',
                     'message': translate('face_not_detected', lang)
                 }), 400
             
-            if len(face_locations) > 1:
+            if face['face_count'] > 1:
                 return jsonify({
                     'status': 'error',
                     'message': translate('multiple_faces', lang)
                 }), 400
             
-            # Analyze face quality including mask detection
-            quality_result = analyze_face_quality(img_array, face_locations[0], check_mask=True)
+            quality_result = face['quality']
             
             # Check if quality is acceptable
             if not quality_result['is_acceptable']:
@@ -647,30 +1371,34 @@ def register():
                     'mask_confidence': quality_result['mask_confidence']
                 }), 400
             
-            # Extract face encoding
-            face_encodings = face_recognition.face_encodings(img_array, face_locations)
-            
-            if len(face_encodings) == 0:
+            if face['encoding'] is None:
                 return jsonify({
                     'status': 'error',
                     'message': 'Gagal mengekstrak fitur wajah'
                 }), 400
             
-            face_encoding = face_encodings[0]
+            stored_encoding = store_face_encoding(face['encoding'])
+            photo_sha256 = archive_photo(image_source)
             
-            # Save to database (OLD SINGLE PHOTO METHOD)
+            # Save to database (OLD SINGLE PHOTO METHOD). The legacy field is
+            # kept, and the encoding is also stored as the employee's only
+            # EmployeeFaceEncoding row, which the kiosk index and re-encoding read
             session = SessionLocal()
             try:
                 existing_employee = session.query(Employee).filter_by(employee_id=employee_id).first()
                 
                 if existing_employee:
                     # Update existing employee's face (legacy field)
-                    existing_employee.face_encoding = face_encoding.tobytes()
+                    existing_employee.face_encoding = stored_encoding
                     existing_employee.name = name
                     
                     if not existing_employee.password:
                         existing_employee.password = bcrypt.hash(employee_id)
                     
+                    session.query(EmployeeFaceEncoding).filter_by(
+                        employee_id=employee_id
+                    ).delete()
+                    
                     message = translate('face_updated', lang) + f' ({name})'
                 else:
                     # Create new employee
@@ -679,12 +1407,26 @@ def register():
                         employee_id=employee_id,
                         password=bcrypt.hash(employee_id),
                         role='employee',
-                        face_encoding=face_encoding.tobytes()
+                        face_encoding=stored_encoding
                     )
                     session.add(new_employee)
                     message = translate('face_registered', lang) + f' ({name}). Password default: {employee_id}'
-
-                session.commit()
+                
+                with timer.span('db_insert'):
+                    session.flush()
+                    session.add(EmployeeFaceEncoding(
+                        employee_id=employee_id,
+                        face_encoding=stored_encoding,
+                        photo_index=1,
+                        quality_score=quality_result['quality_score'],
+                        model_version=current_model_version(),
+                        photo_sha256=photo_sha256
+                    ))
+                    session.commit()
+                encoding_cache.invalidate(employee_id)
+                face_index.set_employee(employee_id, name, [
+                    decode_face_encoding(stored_encoding, normalize=config.FACE_ENCODING_NORMALIZE)
+                ])
                 
                 return jsonify({
                     'status': 'success',
@@ -695,34 +1437,442 @@ def register():
                 session.rollback()
                 return jsonify({
                     'status': 'error',
-                    'message': f'Gagal menyimpan data: {str(e)}'
-                }), 500
-            finally:
-                session.close()
-    
-    except Exception as e:
-        print(f"Error in /api/register: {str(e)}")
-        traceback.print_exc()
-        return jsonify({
-            'status': 'error',
-            'message': translate('server_error', lang)
-        }), 500
+                    'message': f'Gagal menyimpan data: {str(e)}'
+                }), 500
+            finally:
+                session.close()
+    
+    except (FacePoolBusy, FacePoolTimeout) as e:
+        return face_pool_error(e)
+    except Exception as e:
+        print(f"Error in /api/register: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'status': 'error',
+            'message': translate('server_error', lang)
+        }), 500
+
+def get_reencode_job():
+    """The server's ReencodeJob, created on first use"""
+    global reencode_job
+    if reencode_job is None:
+        reencode_job = ReencodeJob(
+            SessionLocal,
+            photo_archive,
+            face_pool,
+            detection_options('register'),
+            current_model_version(),
+            store_face_encoding,
+            on_swapped=refresh_reencoded_employee,
+            chunk_size=config.FACE_REENCODE_CHUNK_SIZE,
+            max_in_flight=config.FACE_REENCODE_MAX_IN_FLIGHT,
+            pause_seconds=config.FACE_REENCODE_PAUSE_SECONDS,
+            max_image_width=config.MAX_IMAGE_WIDTH
+        )
+    return reencode_job
+
+def refresh_reencoded_employee(employee_id, name, is_active, encodings):
+    """
+    An employee's encodings were swapped by the re-encode job: drop stale copies
+    
+    encodings only holds the rows that were outdated, so the index entry is
+    rebuilt from every stored row, decoded like load_face_index() does.
+    """
+    encoding_cache.invalidate(employee_id)
+    if not is_active:
+        face_index.remove_employee(employee_id)
+        return
+    
+    session = SessionLocal()
+    try:
+        blobs = session.query(EmployeeFaceEncoding.face_encoding).filter(
+            EmployeeFaceEncoding.employee_id == employee_id
+        ).all()
+    finally:
+        session.close()
+    
+    face_index.set_employee(employee_id, name, [
+        decode_face_encoding(blob, normalize=config.FACE_ENCODING_NORMALIZE)
+        for blob, in blobs
+    ])
+
+@app.route('/api/face/reencode', methods=['GET', 'POST', 'DELETE'])
+@jwt_required()
+def face_reencode():
+    """
+    Re-encode archived registration photos for the current model version
+    POST starts the background job, GET reports progress, DELETE cancels it
+    Protected endpoint - admin only
+    """
+    try:
+        claims = get_jwt()
+        lang = claims.get('language', 'id')
+        
+        if claims.get('role') != 'admin':
+            return jsonify({
+                'status': 'error',
+                'message': translate('access_denied', lang)
+            }), 403
+        
+        job = get_reencode_job()
+        
+        if request.method == 'POST':
+            if not job.start():
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Proses encoding ulang sedang berjalan',
+                    'job': job.status()
+                }), 409
+            return jsonify({
+                'status': 'success',
+                'message': f'Encoding ulang wajah ke versi model {job.target_version} dimulai',
+                'job': job.status()
+            }), 202
+        
+        if request.method == 'DELETE':
+            job.cancel()
+            return jsonify({
+                'status': 'success',
+                'message': 'Proses encoding ulang akan dihentikan setelah batch saat ini',
+                'job': job.status()
+            }), 200
+        
+        session = SessionLocal()
+        try:
+            outdated = session.query(EmployeeFaceEncoding).filter(
+                (EmployeeFaceEncoding.model_version.is_(None)) |
+                (EmployeeFaceEncoding.model_version != job.target_version)
+            ).count()
+        finally:
+            session.close()
+        
+        return jsonify({
+            'status': 'success',
+            'model_version': job.target_version,
+            'outdated_encodings': outdated,
+            'job': job.status()
+        }), 200
+    
+    except Exception as e:
+        print(f"Error in /api/face/reencode: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'status': 'error',
+            'message': translate('server_error', 'id')
+        }), 500
+
+# ==================== FACE RECOGNITION & ATTENDANCE ====================
+
+@app.route('/api/recognize', methods=['POST'])
+@jwt_required()
+def recognize():
+    """
+    Recognize face and mark attendance
+    1-to-1 matching: Only match against logged-in employee's face
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        claims = get_jwt()
+        lang = claims.get('language', 'id')
+        
+        data = read_image_payload()
+        
+        if not data or 'image' not in data:
+            return jsonify({
+                'status': 'error',
+                'message': translate('invalid_input', lang),
+                'detected': False
+            }), 400
+        
+        image_source = data['image']
+        
+        # Decode, detect faces, check quality and mask, extract the encoding
+        # in the face worker pool, or reuse a repeated frame's result
+        face, decode_error = process_frame(
+            image_source, 'recognize',
+            check_mask=True,
+            encode=True
+        )
+        if face is None:
+            return jsonify({
+                'status': 'error',
+                'message': f'Gagal memproses gambar: {decode_error}',
+                'detected': False
+            }), 400
+        
+        if face['face_count'] == 0:
+            return jsonify({
+                'status': 'error',
+                'message': no_face_message(face, lang),
+                'detected': False
+            }), 200
+        
+        if face['face_count'] > 1:
+            return jsonify({
+                'status': 'error',
+                'message': translate('multiple_faces', lang),
+                'detected': False
+            }), 200
+        
+        quality_result = face['quality']
+        
+        # If mask detected, reject immediately
+        if quality_result['mask_detected']:
+            return jsonify({
+                'status': 'error',
+                'message': '⚠️ Masker terdeteksi! Harap lepas masker untuk verifikasi absensi.',
+                'detected': False,
+                'mask_detected': True,
+                'mask_confidence': quality_result['mask_confidence']
+            }), 200
+        
+        if face['encoding'] is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Gagal mengekstrak fitur wajah',
+                'detected': False
+            }), 200
+        
+        body, status = verify_and_mark_attendance(current_user_id, face['encoding'], quality_result, lang)
+        return jsonify(body), status
+    
+    except (FacePoolBusy, FacePoolTimeout) as e:
+        return face_pool_error(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Error: {str(e)}',
+            'detected': False
+        }), 500
+
+# ==================== CAMERA STREAM (WebSocket) ====================
+
+def read_stream_message(message):
+    """
+    Parse a camera stream message
+    
+    - bytes: an encoded frame (JPEG/PNG)
+    - text: JSON {"image": "<base64>"} or a control message {"type": "reset"}
+    
+    Returns: (image_source, control) - one of them is None
+    """
+    if isinstance(message, bytes):
+        return message, None
+    
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return None, None
+    
+    if not isinstance(data, dict):
+        return None, None
+    if 'image' in data:
+        return data['image'], None
+    return None, data.get('type')
+
+def face_stream(ws):
+    """
+    Streaming camera session (WebSocket /api/face/stream)
+    
+    Query params:
+        token: JWT access token (browsers cannot set headers on WebSockets)
+        mode: 'analyze' (quality feedback only) or 'recognize' (also mark
+              attendance once the face has been stable for a few frames)
+        check_mask: Run mask detection (default true)
+    
+    The face box of the previous frame is tracked, so detection only scans a
+    small window around it; a full-frame scan runs when the face is lost and
+    every FACE_STREAM_REDETECT_INTERVAL frames. Frames that queued up while
+    the previous one was processed are dropped. A 'quality' message is sent
+    only when the verdict changes, a 'recognition' message once per stable face.
+    """
+    try:
+        claims = decode_token(request.args.get('token', ''))
+    except Exception:
+        ws.send(json.dumps({
+            'type': 'error',
+            'status': 'error',
+            'message': 'Token tidak valid atau sudah kedaluwarsa'
+        }))
+        return
+    
+    current_user_id = claims['sub']
+    lang = claims.get('language', 'id')
+    mode = request.args.get('mode', 'analyze')
+    check_mask = parse_bool(request.args.get('check_mask'), default=True)
+    
+    if mode not in ('analyze', 'recognize'):
+        ws.send(json.dumps({
+            'type': 'error',
+            'status': 'error',
+            'message': translate('invalid_input', lang)
+        }))
+        return
+    
+    tracker = FaceTracker(
+        window_margin=config.FACE_STREAM_WINDOW_MARGIN,
+        stable_frames=config.FACE_STREAM_STABLE_FRAMES,
+        redetect_interval=config.FACE_STREAM_REDETECT_INTERVAL
+    )
+    detection = detection_options(mode)
+    last_verdict = None
+    recognized = False
+    
+    ws.send(json.dumps({'type': 'ready', 'mode': mode}))
+    
+    while True:
+        message = ws.receive(timeout=config.FACE_STREAM_IDLE_TIMEOUT)
+        if message is None:
+            break
+        
+        # Only the newest frame matters; control messages are never dropped
+        image_source, control = read_stream_message(message)
+        while True:
+            newer = ws.receive(timeout=0)
+            if newer is None:
+                break
+            newer_source, newer_control = read_stream_message(newer)
+            if newer_source is not None:
+                image_source = newer_source
+            control = newer_control or control
+        
+        if control == 'reset':
+            tracker.reset()
+            last_verdict = None
+            recognized = False
+        
+        if image_source is None:
+            continue
+        
+        img_array, decode_error = decode_image_source(image_source)
+        if img_array is None:
+            ws.send(json.dumps({
+                'type': 'error',
+                'status': 'error',
+                'message': f'Gagal memproses gambar: {decode_error}'
+            }))
+            continue
+        
+        try:
+            window = tracker.search_window(img_array.shape)
+            face = face_pool.run(
+                process_face, img_array,
+                detection=detection,
+                check_mask=check_mask,
+                mask_strategy=config.MASK_DETECTION_STRATEGY,
+                search_window=window,
+                prescreen=prescreen_options()
+            )
+            
+            # Face left the search window: rescan the whole frame
+            if window is not None and face['face_count'] == 0 and face['prescreen'] is None:
+                window = None
+                face = face_pool.run(
+                    process_face, img_array,
+                    detection=detection,
+                    check_mask=check_mask,
+                    mask_strategy=config.MASK_DETECTION_STRATEGY
+                )
+            quality_tier_stats.record(face)
+            
+            quality_result = face['quality']
+            is_good = quality_result is not None and quality_result['is_acceptable'] and \
+                not quality_result.get('mask_detected', False)
+            stable = tracker.update(face['face_location'], is_good, full_frame=window is None)
+            
+            if face['face_count'] == 0:
+                verdict = {
+                    'status': 'error',
+                    'message': no_face_message(face, lang),
+                    'quality_score': 0,
+                    'is_acceptable': False
+                }
+            elif face['face_count'] > 1:
+                verdict = {
+                    'status': 'error',
+                    'message': translate('multiple_faces', lang),
+                    'quality_score': 0,
+                    'is_acceptable': False
+                }
+            else:
+                verdict = {
+                    'status': 'success' if quality_result['is_acceptable'] else 'warning',
+                    'message': quality_result['recommendation'],
+                    **quality_payload(quality_result)
+                }
+            
+            # Scores jitter from frame to frame; push only when the verdict
+            # (or stability) changes
+            verdict_key = (
+                stable,
+                verdict['status'],
+                verdict['message'],
+                verdict['is_acceptable'],
+                verdict.get('mask_detection', {}).get('detected', False)
+            )
+            if verdict_key != last_verdict:
+                last_verdict = verdict_key
+                ws.send(json.dumps({
+                    'type': 'quality',
+                    'stable': stable,
+                    'face_location': [int(v) for v in face['face_location']] if face['face_location'] else None,
+                    **verdict
+                }))
+            
+            if mode != 'recognize' or recognized or not stable:
+                continue
+            
+            face_encoding = face_pool.run(encode_face, img_array, face_location=face['face_location'])
+            if face_encoding is None:
+                body = {
+                    'status': 'error',
+                    'message': 'Gagal mengekstrak fitur wajah',
+                    'detected': False
+                }
+            else:
+                body, _ = verify_and_mark_attendance(current_user_id, face_encoding, quality_result, lang)
+            
+            ws.send(json.dumps({'type': 'recognition', **body}))
+            
+            if body['status'] == 'success':
+                recognized = True
+            else:
+                # Require a fresh stable run before the next attempt
+                tracker.reset()
+                last_verdict = None
+        
+        except (FacePoolBusy, FacePoolTimeout) as e:
+            print(f"⚠️ Face worker pool: {e}")
+            ws.send(json.dumps({
+                'type': 'error',
+                'status': 'error',
+                'message': 'Server sedang sibuk memproses wajah. Silakan coba lagi sebentar.'
+            }))
 
-# ==================== FACE RECOGNITION & ATTENDANCE ====================
+if sock is not None:
+    sock.route('/api/face/stream')(face_stream)
 
-@app.route('/api/recognize', methods=['POST'])
+@app.route('/api/kiosk/identify', methods=['POST'])
 @jwt_required()
-def recognize():
+def kiosk_identify():
     """
-    Recognize face and mark attendance
-    1-to-1 matching: Only match against logged-in employee's face
+    Identify whoever stands in front of a shared kiosk and mark attendance
+    1-to-N matching against the resident face index (no DB lookup per frame)
+    Protected endpoint - kiosk terminals log in with a manager/admin account
     """
     try:
-        current_user_id = get_jwt_identity()
         claims = get_jwt()
+        user_role = claims.get('role')
         lang = claims.get('language', 'id')
         
-        data = request.get_json()
+        if user_role not in ['admin', 'manager']:
+            return jsonify({
+                'status': 'error',
+                'message': translate('access_denied', lang),
+                'detected': False
+            }), 403
+        
+        data = read_image_payload()
         
         if not data or 'image' not in data:
             return jsonify({
@@ -731,38 +1881,47 @@ def recognize():
                 'detected': False
             }), 400
         
-        image_base64 = data['image']
-        
-        # Decode image
-        img_array, decode_error = decode_base64_image(image_base64)
-        if img_array is None:
+        try:
+            top_k = int(data.get('top_k', config.KIOSK_TOP_K))
+        except (TypeError, ValueError):
+            return jsonify({
+                'status': 'error',
+                'message': translate('invalid_input', lang),
+                'detected': False
+            }), 400
+        top_k = min(max(top_k, 1), config.KIOSK_MAX_TOP_K)
+        mark_attendance = parse_bool(data.get('mark_attendance'), default=True)
+        
+        # Decode, detect faces, check quality and mask, extract the encoding
+        # in the face worker pool, or reuse a repeated frame's result
+        face, decode_error = process_frame(
+            data['image'], 'kiosk',
+            check_mask=True,
+            encode=True
+        )
+        if face is None:
             return jsonify({
                 'status': 'error',
                 'message': f'Gagal memproses gambar: {decode_error}',
                 'detected': False
             }), 400
         
-        # Detect faces
-        face_locations = face_recognition.face_locations(img_array, model=config.FACE_DETECTION_MODEL)
-        
-        if len(face_locations) == 0:
+        if face['face_count'] == 0:
             return jsonify({
                 'status': 'error',
-                'message': translate('face_not_detected', lang),
+                'message': no_face_message(face, lang),
                 'detected': False
             }), 200
         
-        if len(face_locations) > 1:
+        if face['face_count'] > 1:
             return jsonify({
                 'status': 'error',
                 'message': translate('multiple_faces', lang),
                 'detected': False
             }), 200
         
-        # Check face quality and mask detection
-        quality_result = analyze_face_quality(img_array, face_locations[0], check_mask=True)
+        quality_result = face['quality']
         
-        # If mask detected, reject immediately
         if quality_result['mask_detected']:
             return jsonify({
                 'status': 'error',
@@ -772,137 +1931,81 @@ def recognize():
                 'mask_confidence': quality_result['mask_confidence']
             }), 200
         
-        # Warn about low quality (but don't block)
-        quality_warnings = []
-        if quality_result['quality_score'] < 70:
-            quality_warnings.append(quality_result['recommendation'])
-        
-        # Extract face encoding
-        face_encodings = face_recognition.face_encodings(img_array, face_locations)
-        
-        if len(face_encodings) == 0:
+        if face['encoding'] is None:
             return jsonify({
                 'status': 'error',
                 'message': 'Gagal mengekstrak fitur wajah',
                 'detected': False
             }), 200
         
-        unknown_encoding = face_encodings[0]
+        # Vectorized 1:N search over the resident index
+        timer = stage_timer()
+        with timer.span('matching'):
+            candidates = face_index.search(
+                query_face_encoding(face['encoding']),
+                k=top_k,
+                tolerance=config.FACE_RECOGNITION_TOLERANCE
+            )
+        
+        if not candidates or not candidates[0]['is_match']:
+            return jsonify({
+                'status': 'error',
+                'message': 'Wajah tidak dikenali. Silakan hubungi admin untuk registrasi.',
+                'detected': False,
+                'candidates': candidates
+            }), 200
+        
+        best = candidates[0]
+        confidence = float(1 - best['distance'])
+        
+        if not mark_attendance:
+            return jsonify({
+                'status': 'success',
+                'message': f"Teridentifikasi: {best['name']}",
+                'name': best['name'],
+                'employee_id': best['employee_id'],
+                'detected': True,
+                'confidence': confidence,
+                'candidates': candidates
+            }), 200
         
-        # Get logged-in employee from database (1-to-1 matching)
         session = SessionLocal()
         try:
-            current_employee = session.query(Employee).filter_by(employee_id=current_user_id).first()
-            
-            if not current_employee:
-                return jsonify({
-                    'status': 'error',
-                    'message': translate('employee_not_found', lang),
-                    'detected': False
-                }), 404
-            
-            # Try to load multiple face encodings first (NEW SYSTEM)
-            face_encodings_records = session.query(EmployeeFaceEncoding).filter_by(
-                employee_id=current_user_id
-            ).all()
-            
-            if face_encodings_records:
-                # NEW SYSTEM: Multiple encodings (better accuracy!)
-                known_encodings = [
-                    np.frombuffer(rec.face_encoding, dtype=np.float64) 
-                    for rec in face_encodings_records
-                ]
-                
-                # Compare with ALL stored encodings
-                all_matches = face_recognition.compare_faces(
-                    known_encodings, 
-                    unknown_encoding, 
-                    tolerance=config.FACE_RECOGNITION_TOLERANCE
-                )
-                all_distances = face_recognition.face_distance(known_encodings, unknown_encoding)
-                
-                # Use BEST match (minimum distance)
-                best_match_idx = np.argmin(all_distances)
-                best_distance = all_distances[best_match_idx]
-                is_match = all_matches[best_match_idx]
-                
-                print(f"🔍 [Multi-Photo Recognition] Compared with {len(known_encodings)} photos")
-                print(f"✅ Best match: Photo {best_match_idx + 1}, Distance: {best_distance:.4f}")
-                
-            elif current_employee.face_encoding:
-                # OLD SYSTEM: Single encoding (backward compatibility)
-                known_encoding = np.frombuffer(current_employee.face_encoding, dtype=np.float64)
-                
-                matches = face_recognition.compare_faces(
-                    [known_encoding], 
-                    unknown_encoding, 
-                    tolerance=config.FACE_RECOGNITION_TOLERANCE
+            # Mark attendance, unless already marked today
+            with timer.span('db_insert'):
+                check_in = insert_check_in(
+                    session,
+                    best['employee_id'],
+                    'face_recognition',
+                    int(confidence * 100),
+                    notes='Absensi melalui kiosk'
                 )
-                distances = face_recognition.face_distance([known_encoding], unknown_encoding)
-                
-                is_match = matches[0]
-                best_distance = distances[0]
-                
-                print(f"🔍 [Single-Photo Recognition] Using legacy single photo")
-                
-            else:
-                # No face encodings at all
-                return jsonify({
-                    'status': 'error',
-                    'message': f'Wajah untuk akun {current_employee.name} belum terdaftar. Silakan hubungi admin.',
-                    'detected': False
-                }), 200
-            
-            # Check if face matches
-            if not is_match:
-                return jsonify({
-                    'status': 'error',
-                    'message': f'Wajah tidak cocok dengan akun {current_employee.name}. Silakan gunakan wajah Anda sendiri.',
-                    'detected': False,
-                    'confidence': float(1 - best_distance)
-                }), 200
-            
-            # Face matches! Check if already marked attendance today
-            today = datetime.now().date()
-            existing_attendance = session.query(Attendance).filter(
-                Attendance.employee_id == current_employee.employee_id,
-                Attendance.timestamp >= datetime.combine(today, datetime.min.time())
-            ).first()
+                session.commit()
             
-            if existing_attendance:
+            if check_in is None:
                 return jsonify({
                     'status': 'success',
                     'message': translate('attendance_already_marked', lang),
-                    'name': current_employee.name,
-                    'employee_id': current_employee.employee_id,
+                    'name': best['name'],
+                    'employee_id': best['employee_id'],
                     'already_marked': True,
                     'detected': True,
-                    'confidence': float(1 - best_distance)
+                    'confidence': confidence,
+                    'candidates': candidates
                 }), 200
             
-            # Mark attendance
-            confidence_score = int((1 - best_distance) * 100)
-            new_attendance = Attendance(
-                employee_id=current_employee.employee_id,
-                check_in_type='face_recognition',
-                confidence_score=confidence_score
-            )
-            session.add(new_attendance)
-            session.commit()
-            
-            response_message = translate('attendance_marked', lang) + f' Selamat datang, {current_employee.name}!'
-            if quality_warnings:
-                response_message += f' | ⚠️ {quality_warnings[0]}'
+            invalidate_attendance_summary(check_in['work_date'])
             
             return jsonify({
                 'status': 'success',
-                'message': response_message,
-                'name': current_employee.name,
-                'employee_id': current_employee.employee_id,
+                'message': translate('attendance_marked', lang) + f" Selamat datang, {best['name']}!",
+                'name': best['name'],
+                'employee_id': best['employee_id'],
                 'already_marked': False,
                 'detected': True,
-                'confidence': float(1 - best_distance),
+                'confidence': confidence,
                 'quality_score': quality_result['quality_score'],
+                'candidates': candidates,
                 'timestamp': datetime.now().isoformat()
             }), 200
         
@@ -916,10 +2019,14 @@ def recognize():
         finally:
             session.close()
     
+    except (FacePoolBusy, FacePoolTimeout) as e:
+        return face_pool_error(e)
     except Exception as e:
+        print(f"Error in /api/kiosk/identify: {str(e)}")
+        traceback.print_exc()
         return jsonify({
             'status': 'error',
-            'message': f'Error: {str(e)}',
+            'message': translate('server_error', 'id'),
             'detected': False
         }), 500
 
@@ -928,34 +2035,78 @@ def recognize():
 @app.route('/api/attendance', methods=['GET'])
 @jwt_required()
 def get_attendance():
-    """Get all attendance records"""
+    """
+    Get attendance records, newest first, one page at a time
+    
+    Query parameters (all optional):
+        cursor: next_cursor of the previous page
+        limit: Page size (default ATTENDANCE_PAGE_SIZE, max ATTENDANCE_MAX_PAGE_SIZE)
+        start_date, end_date: YYYY-MM-DD, inclusive
+        department: Employee department
+        check_in_type: 'face_recognition', 'qr_code', 'manual', ...
+    
+    Pages are keyset-paginated on (timestamp, id), so every page costs the
+    same however deep it is. next_cursor is null on the last page.
+    """
     try:
         claims = get_jwt()
         lang = claims.get('language', 'id')
         user_role = claims.get('role')
         current_user_id = get_jwt_identity()
         
+        try:
+            limit = int(request.args.get('limit', config.ATTENDANCE_PAGE_SIZE))
+            filters = parse_attendance_filters(request.args)
+            cursor = request.args.get('cursor')
+            after = decode_attendance_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'message': translate('invalid_input', lang)
+            }), 400
+        limit = min(max(limit, 1), config.ATTENDANCE_MAX_PAGE_SIZE)
+        
         session = SessionLocal()
         try:
+            # Employees are loaded by the same JOIN, not one query per row
+            query = session.query(Attendance).join(Attendance.employee).options(
+                contains_eager(Attendance.employee)
+            )
+            
             # If employee role, show only their own attendance
             if user_role == 'employee':
-                attendances = session.query(Attendance).filter_by(
-                    employee_id=current_user_id
-                ).join(Employee).order_by(Attendance.timestamp.desc()).all()
-            else:
-                # Manager/admin can see all
-                attendances = session.query(Attendance).join(Employee).order_by(
-                    Attendance.timestamp.desc()
-                ).all()
+                query = query.filter(Attendance.employee_id == current_user_id)
+            
+            query = filter_attendance(query, filters)
+            
+            if after:
+                # Rows strictly after the cursor in (timestamp desc, id desc) order;
+                # the timestamp bound keeps it a range scan on idx_attendance_timestamp_id
+                after_timestamp, after_id = after
+                query = query.filter(
+                    Attendance.timestamp <= after_timestamp,
+                    or_(
+                        Attendance.timestamp < after_timestamp,
+                        and_(Attendance.timestamp == after_timestamp, Attendance.id < after_id)
+                    )
+                )
+            
+            # One extra row tells whether there is a next page
+            attendances = query.order_by(
+                Attendance.timestamp.desc(),
+                Attendance.id.desc()
+            ).limit(limit + 1).all()
+            has_more = len(attendances) > limit
+            attendances = attendances[:limit]
+            
+            # Times are formatted in the viewer's preferred date format
+            viewer = session.query(Employee.date_format_preference).filter_by(
+                employee_id=current_user_id
+            ).first()
+            date_format = viewer[0] if viewer and viewer[0] else 'indonesian'
             
             result = []
             for attendance in attendances:
-                # Get employee's date format preference
-                employee = session.query(Employee).filter_by(
-                    employee_id=attendance.employee_id
-                ).first()
-                date_format = employee.date_format_preference if employee else 'indonesian'
-                
                 result.append({
                     'id': attendance.id,
                     'name': attendance.employee.name,
@@ -972,7 +2123,9 @@ def get_attendance():
             
             return jsonify({
                 'status': 'success',
-                'data': result
+                'data': result,
+                'next_cursor': encode_attendance_cursor(attendances[-1]) if has_more else None,
+                'limit': limit
             }), 200
         finally:
             session.close()
@@ -984,6 +2137,243 @@ def get_attendance():
             'message': translate('server_error', 'id')
         }), 500
 
+def iter_attendance_export(filters):
+    """
+    Export rows (utils.attendance_export.EXPORT_COLUMNS) in chronological order
+    Read through a server-side cursor; the session closes when the iteration ends
+    """
+    session = SessionLocal()
+    try:
+        query = session.query(
+            Attendance.id,
+            Attendance.employee_id,
+            Employee.name,
+            Employee.department,
+            Employee.position,
+            Attendance.timestamp,
+            Attendance.check_in_type,
+            Attendance.confidence_score,
+            Attendance.location,
+            Attendance.notes
+        ).join(Employee, Attendance.employee_id == Employee.employee_id)
+        query = filter_attendance(query, filters).order_by(Attendance.timestamp, Attendance.id)
+        
+        for row in query.yield_per(config.ATTENDANCE_EXPORT_CHUNK_SIZE):
+            yield tuple(row)
+    finally:
+        session.close()
+
+def attendance_export_filename(filters, extension):
+    """absensi_<start>_<end>[_<department>].<extension>"""
+    parts = ['absensi']
+    parts.append(filters['start_date'].isoformat() if filters['start_date'] else 'awal')
+    parts.append(filters['end_date'].isoformat() if filters['end_date'] else datetime.now().date().isoformat())
+    if filters['department']:
+        parts.append(sanitize_filename(filters['department']))
+    return '_'.join(parts) + f'.{extension}'
+
+@app.route('/api/attendance/export', methods=['GET'])
+@jwt_required()
+def export_attendance():
+    """
+    Export attendance records as CSV, streamed row chunk by row chunk
+    Same filters as /api/attendance (start_date, end_date, department, check_in_type)
+    Protected endpoint - manager/admin only
+    """
+    claims = get_jwt()
+    lang = claims.get('language', 'id')
+    
+    if claims.get('role') not in ['admin', 'manager']:
+        return jsonify({
+            'status': 'error',
+            'message': translate('access_denied', lang)
+        }), 403
+    
+    try:
+        filters = parse_attendance_filters(request.args)
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'message': translate('invalid_input', lang)
+        }), 400
+    
+    return Response(
+        stream_with_context(iter_csv(iter_attendance_export(filters))),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{attendance_export_filename(filters, "csv")}"'}
+    )
+
+@app.route('/api/attendance/export/xlsx', methods=['POST'])
+@jwt_required()
+def start_attendance_export_xlsx():
+    """
+    Start building an XLSX export in the background
+    Filters as query parameters, like /api/attendance/export
+    Poll GET /api/attendance/export/xlsx/<job_id>, then download the file
+    Protected endpoint - manager/admin only
+    """
+    claims = get_jwt()
+    lang = claims.get('language', 'id')
+    
+    if claims.get('role') not in ['admin', 'manager']:
+        return jsonify({
+            'status': 'error',
+            'message': translate('access_denied', lang)
+        }), 403
+    
+    try:
+        filters = parse_attendance_filters(request.args)
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'message': translate('invalid_input', lang)
+        }), 400
+    
+    job = attendance_export_jobs.submit(
+        owner=get_jwt_identity(),
+        rows=lambda: iter_attendance_export(filters),
+        filename=attendance_export_filename(filters, 'xlsx')
+    )
+    return jsonify({
+        'status': 'success',
+        'message': 'Ekspor Excel sedang diproses',
+        'job': job
+    }), 202
+
+@app.route('/api/attendance/export/xlsx/<job_id>', methods=['GET'])
+@jwt_required()
+def get_attendance_export_xlsx(job_id):
+    """Status of an XLSX export started by the current user"""
+    job = attendance_export_jobs.get(job_id, get_jwt_identity())
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Ekspor tidak ditemukan atau sudah kedaluwarsa'
+        }), 404
+    
+    return jsonify({
+        'status': 'success',
+        'job': job
+    }), 200
+
+@app.route('/api/attendance/export/xlsx/<job_id>/download', methods=['GET'])
+@jwt_required()
+def download_attendance_export_xlsx(job_id):
+    """Download a finished XLSX export"""
+    current_user_id = get_jwt_identity()
+    job = attendance_export_jobs.get(job_id, current_user_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Ekspor tidak ditemukan atau sudah kedaluwarsa'
+        }), 404
+    
+    path = attendance_export_jobs.file_path(job_id, current_user_id)
+    if path is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Ekspor gagal' if job['state'] == 'failed' else 'Ekspor belum selesai',
+            'job': job
+        }), 409
+    
+    return send_file(
+        path,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name=job['filename']
+    )
+
+@app.route('/api/attendance/summary', methods=['GET'])
+@jwt_required()
+def get_attendance_summary():
+    """
+    Present, late and absent counts per department or position
+    
+    Query parameters:
+        group_by: 'department' (default) or 'position'
+        period: 'day' (default), 'week' or 'month'
+        date: YYYY-MM-DD inside the period (default today)
+    
+    Counts are employee-days from the daily rollup; absences are counted on
+    work days (WORK_DAYS) up to today. Results are cached per period.
+    Protected endpoint - manager/admin only
+    """
+    try:
+        claims = get_jwt()
+        lang = claims.get('language', 'id')
+        
+        if claims.get('role') not in ['admin', 'manager']:
+            return jsonify({
+                'status': 'error',
+                'message': translate('access_denied', lang)
+            }), 403
+        
+        group_by = request.args.get('group_by', 'department')
+        period = request.args.get('period', 'day')
+        try:
+            day = parse_date(request.args.get('date')) or datetime.now().date()
+        except ValueError:
+            day = None
+        if group_by not in ATTENDANCE_SUMMARY_GROUPS or period not in SUMMARY_PERIODS or day is None:
+            return jsonify({
+                'status': 'error',
+                'message': translate('invalid_input', lang)
+            }), 400
+        
+        period_start, period_end = period_bounds(period, day)
+        cache_key = (group_by, period, period_start)
+        summary = summary_cache.get(cache_key)
+        cached = summary is not None
+        
+        if summary is None:
+            # Nobody can be absent on days that have not happened yet
+            counted_end = min(period_end, datetime.now().date())
+            work_days = count_work_days(period_start, counted_end, config.WORK_DAYS) if counted_end >= period_start else 0
+            
+            session = SessionLocal()
+            try:
+                groups = summarize_daily(
+                    session,
+                    ATTENDANCE_SUMMARY_GROUPS[group_by],
+                    period_start,
+                    period_end,
+                    work_days
+                )
+            finally:
+                session.close()
+            
+            totals = {
+                key: sum(group[key] for group in groups)
+                for key in ('employees', 'present', 'late', 'absent')
+            }
+            expected = totals['employees'] * work_days
+            totals['attendance_rate'] = round(min(totals['present'] / expected, 1.0) * 100, 1) if expected else None
+            
+            summary = {
+                'group_by': group_by,
+                'period': period,
+                'start_date': period_start.isoformat(),
+                'end_date': period_end.isoformat(),
+                'work_days': work_days,
+                'groups': groups,
+                'totals': totals
+            }
+            summary_cache.put(cache_key, summary)
+        
+        return jsonify({
+            'status': 'success',
+            'cached': cached,
+            **summary
+        }), 200
+    
+    except Exception as e:
+        print(f"Error in /api/attendance/summary: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'status': 'error',
+            'message': translate('server_error', 'id')
+        }), 500
+
 @app.route('/api/attendance/today', methods=['GET'])
 @jwt_required()
 def check_attendance_today():
@@ -995,10 +2385,10 @@ def check_attendance_today():
         
         session = SessionLocal()
         try:
-            today = datetime.now().date()
+            # Same day boundary insert_check_in() enforces
             attendance = session.query(Attendance).filter(
                 Attendance.employee_id == current_user_id,
-                Attendance.timestamp >= datetime.combine(today, datetime.min.time())
+                Attendance.work_date == datetime.now().date()
             ).first()
             
             if attendance:
@@ -1047,37 +2437,31 @@ def get_attendance_stats():
             this_week_start = today - timedelta(days=today.weekday())
             this_month_start = today.replace(day=1)
             
-            # Check if attended today
-            today_attendance = session.query(Attendance).filter(
-                Attendance.employee_id == current_user_id,
-                Attendance.timestamp >= datetime.combine(today, datetime.min.time())
-            ).first()
-            
-            # Count this week
-            week_count = session.query(Attendance).filter(
-                Attendance.employee_id == current_user_id,
-                Attendance.timestamp >= datetime.combine(this_week_start, datetime.min.time())
-            ).count()
+            # One read of the daily rollup covers today, this week and this month
+            days = session.query(
+                AttendanceDaily.work_date,
+                AttendanceDaily.first_check_in
+            ).filter(
+                AttendanceDaily.employee_id == current_user_id,
+                AttendanceDaily.work_date >= min(this_week_start, this_month_start),
+                AttendanceDaily.work_date <= today
+            ).all()
             
-            # Count this month
-            month_count = session.query(Attendance).filter(
-                Attendance.employee_id == current_user_id,
-                Attendance.timestamp >= datetime.combine(this_month_start, datetime.min.time())
-            ).count()
+            today_check_in = next((first_check_in for work_date, first_check_in in days if work_date == today), None)
             
             stats = {
-                'today': today_attendance is not None,
-                'this_week': week_count,
-                'this_month': month_count
+                'today': today_check_in is not None,
+                'this_week': sum(1 for work_date, _ in days if work_date >= this_week_start),
+                'this_month': sum(1 for work_date, _ in days if work_date >= this_month_start)
             }
             
-            if today_attendance:
+            if today_check_in:
                 employee = session.query(Employee).filter_by(
                     employee_id=current_user_id
                 ).first()
                 date_format = employee.date_format_preference if employee else 'indonesian'
-                stats['attendance_time'] = today_attendance.timestamp.isoformat()
-                stats['formatted_time'] = format_datetime(today_attendance.timestamp, date_format)
+                stats['attendance_time'] = today_check_in.isoformat()
+                stats['formatted_time'] = format_datetime(today_check_in, date_format)
             
             return jsonify({
                 'status': 'success',
@@ -1146,6 +2530,41 @@ def get_employees():
             'message': translate('server_error', 'id')
         }), 500
 
+@app.route('/api/metrics', methods=['GET'])
+@jwt_required()
+def get_metrics():
+    """Face pipeline cache, index and worker pool metrics (manager/admin only)"""
+    try:
+        claims = get_jwt()
+        user_role = claims.get('role')
+        lang = claims.get('language', 'id')
+        
+        if user_role not in ['manager', 'admin']:
+            return jsonify({
+                'status': 'error',
+                'message': translate('access_denied', lang)
+            }), 403
+        
+        return jsonify({
+            'status': 'success',
+            'metrics': {
+                'encoding_cache': encoding_cache.stats(),
+                'frame_cache': frame_cache.stats(),
+                'summary_cache': summary_cache.stats(),
+                'quality_tiers': quality_tier_stats.stats(),
+                'stage_timings': stage_histogram.stats(),
+                'face_index': face_index.stats(),
+                'face_pool': face_pool.stats()
+            }
+        }), 200
+    except Exception as e:
+        print(f"Error in /api/metrics: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'status': 'error',
+            'message': translate('server_error', 'id')
+        }), 500
+
 # ==================== PROFILE & SETTINGS ====================
 
 @app.route('/api/profile', methods=['PUT'])
@@ -1206,6 +2625,9 @@ def update_profile():
             
             session.commit()
             
+            # Cached name may have changed
+            encoding_cache.invalidate(current_user_id)
+            
             return jsonify({
                 'status': 'success',
                 'message': translate('settings_updated', lang),
@@ -1489,14 +2911,17 @@ def mark_attendance_qr():
                     'detected': False
                 }), 404
             
-            # Check if already marked attendance today
-            today = datetime.now().date()
-            existing_attendance = session.query(Attendance).filter(
-                Attendance.employee_id == current_user_id,
-                Attendance.timestamp >= datetime.combine(today, datetime.min.time())
-            ).first()
+            # Mark attendance via QR code (100% confidence), unless already marked today
+            check_in = insert_check_in(
+                session,
+                current_user_id,
+                'qr_code',
+                100,
+                notes='Absensi menggunakan QR Code'
+            )
+            session.commit()
             
-            if existing_attendance:
+            if check_in is None:
                 return jsonify({
                     'status': 'success',
                     'message': translate('attendance_already_marked', lang),
@@ -1507,15 +2932,7 @@ def mark_attendance_qr():
                     'method': 'qr_code'
                 }), 200
             
-            # Mark attendance via QR code
-            new_attendance = Attendance(
-                employee_id=current_user_id,
-                check_in_type='qr_code',  # NEW: QR code method
-                confidence_score=100,  # QR code has 100% confidence
-                notes='Absensi menggunakan QR Code'
-            )
-            session.add(new_attendance)
-            session.commit()
+            invalidate_attendance_summary(check_in['work_date'])
             
             return jsonify({
                 'status': 'success',
@@ -0,0 +1,192 @@
+"""
+Attendance Export
+
+Month-end exports for managers: a CSV streamed straight into the response,
+and XLSX files built with openpyxl on a background worker.
+
+Both take their rows from an iterator over a server-side cursor
+(Query.yield_per), so the database side never holds more than one chunk.
+The CSV is written out chunk by chunk as the response streams; the XLSX
+uses a write-only workbook, which streams each appended row to a temporary
+file instead of keeping the sheet in memory, and continues on a new sheet
+when Excel's row limit is reached.
+"""
+
+import csv
+import io
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional, Union
+
+from openpyxl import Workbook
+
+# Row layout produced by the export query
+EXPORT_COLUMNS = [
+    'id', 'employee_id', 'name', 'department', 'position',
+    'timestamp', 'check_in_type', 'confidence_score', 'location', 'notes'
+]
+
+# Excel sheets hold 1,048,576 rows, one of them the header
+XLSX_MAX_ROWS_PER_SHEET = 1048575
+
+
+def iter_csv(rows: Iterable, chunk_rows: int = 1000) -> Iterator[str]:
+    """
+    Render rows as CSV text, yielded every chunk_rows rows
+    
+    Starts with a UTF-8 BOM so Excel shows names with non-ASCII characters
+    correctly, then the header row.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_COLUMNS)
+    
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    yield buffer.getvalue()
+
+
+def write_xlsx(path: Union[str, Path], rows: Iterable, sheet_name: str = 'Absensi',
+               max_rows_per_sheet: int = XLSX_MAX_ROWS_PER_SHEET) -> int:
+    """
+    Write rows to an XLSX file through a write-only workbook
+    
+    Returns:
+        Number of data rows written
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(EXPORT_COLUMNS)
+    written = 0
+    sheet_index, sheet_rows = 1, 0
+    
+    for row in rows:
+        if sheet_rows == max_rows_per_sheet:
+            sheet_index, sheet_rows = sheet_index + 1, 0
+            sheet = workbook.create_sheet(f'{sheet_name} {sheet_index}')
+            sheet.append(EXPORT_COLUMNS)
+        sheet.append(row)
+        sheet_rows += 1
+        written += 1
+    
+    workbook.save(path)
+    return written
+
+
+class ExportJobs:
+    """
+    Background XLSX exports
+    
+    Jobs run on a small thread pool and write to export_dir; a finished file
+    can be downloaded by the user who requested it until it expires.
+    
+    Usage:
+        jobs = ExportJobs(config.UPLOAD_FOLDERS['temp'])
+        job = jobs.submit(owner=employee_id, rows=lambda: iter_rows(filters))
+        jobs.get(job['job_id'], employee_id)
+    """
+    
+    def __init__(self, export_dir: Union[str, Path], workers: int = 1, ttl_seconds: int = 3600):
+        self.export_dir = Path(export_dir)
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='attendance-export')
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+    
+    def submit(self, owner: str, rows: Callable[[], Iterable], filename: str = 'absensi.xlsx') -> Dict:
+        """
+        Queue an export
+        
+        Args:
+            owner: employee_id of the requesting user
+            rows: Called on the worker; returns the rows to write
+            filename: Download name of the finished file
+        """
+        self._expire()
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'owner': owner,
+            'filename': filename,
+            'path': self.export_dir / f'attendance_export_{job_id}.xlsx',
+            'state': 'queued',
+            'rows': 0,
+            'created_at': datetime.now(),
+            'finished_at': None,
+            'error': None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        self._executor.submit(self._run, job, rows)
+        return self._public(job)
+    
+    def get(self, job_id: str, owner: str) -> Optional[Dict]:
+        """Job status, None if unknown, expired or requested by someone else"""
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['owner'] != owner:
+                return None
+            return self._public(job)
+    
+    def file_path(self, job_id: str, owner: str) -> Optional[Path]:
+        """Path of a finished export, None if it is not ready or has expired"""
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['owner'] != owner or job['state'] != 'finished':
+                return None
+            return job['path']
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _run(self, job: Dict, rows: Callable[[], Iterable]):
+        with self._lock:
+            job['state'] = 'running'
+        try:
+            count = write_xlsx(job['path'], rows())
+            state, error = 'finished', None
+        except Exception as e:
+            print(f"❌ Attendance export {job['job_id']} failed: {e}")
+            if job['path'].exists():
+                job['path'].unlink()
+            count, state, error = 0, 'failed', str(e)
+        
+        with self._lock:
+            job.update(state=state, rows=count, error=error, finished_at=datetime.now())
+    
+    def _expire(self):
+        """Forget jobs finished more than ttl_seconds ago and delete their files"""
+        now = datetime.now()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job['finished_at'] and (now - job['finished_at']).total_seconds() > self.ttl_seconds
+            ]
+            jobs = [self._jobs.pop(job_id) for job_id in expired]
+        for job in jobs:
+            if job['path'].exists():
+                os.unlink(job['path'])
+    
+    @staticmethod
+    def _public(job: Dict) -> Dict:
+        return {
+            'job_id': job['job_id'],
+            'state': job['state'],
+            'rows': job['rows'],
+            'filename': job['filename'],
+            'created_at': job['created_at'].isoformat(),
+            'finished_at': job['finished_at'].isoformat() if job['finished_at'] else None,
+            'error': job['error']
+        }
@@ -0,0 +1,297 @@
+"""
+Daily Attendance Rollup
+
+Keeps the attendance_daily table (models.AttendanceDaily) in step with the
+raw attendance table, so stats endpoints and dashboards read one row per
+employee per day instead of scanning check-in events.
+
+record_check_in() runs inside the transaction that inserts an Attendance
+row; backfill_daily() rebuilds the table from history
+(backfill_attendance_daily.py); summarize_daily() aggregates it per
+department or position for the dashboard summary.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Attendance, AttendanceDaily, Employee
+from .date_formatter import local_to_utc, utc_to_local
+
+SUMMARY_PERIODS = ('day', 'week', 'month')
+
+# Dialects whose insert() supports ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {'postgresql': postgresql, 'sqlite': sqlite}
+
+
+def late_cutoff(work_start: str = '08:00', late_threshold_minutes: int = 15) -> time:
+    """
+    Latest on-time check-in
+    
+    Args:
+        work_start: Config.WORK_START_TIME ('HH:MM')
+        late_threshold_minutes: Config.LATE_THRESHOLD_MINUTES
+    """
+    start = datetime.strptime(work_start, '%H:%M')
+    return (start + timedelta(minutes=late_threshold_minutes)).time()
+
+
+def checked_in_late(timestamp: datetime, cutoff: time) -> bool:
+    """Whether a check-in (naive UTC timestamp) was after the local cutoff"""
+    return utc_to_local(timestamp).time() > cutoff
+
+
+def record_check_in(session, check_in: Dict, cutoff: time):
+    """
+    Fold a new check-in into its day's rollup row
+    
+    Call in the transaction that inserted the Attendance row, before commit.
+    On sqlite and PostgreSQL this is one INSERT ... ON CONFLICT DO UPDATE,
+    so concurrent check-ins of one employee (ALLOW_MULTIPLE_ATTENDANCE_PER_DAY)
+    cannot both create the row.
+    
+    Args:
+        session: SQLAlchemy session
+        check_in: Values of the inserted row: id, employee_id, timestamp,
+                  work_date, check_in_type, confidence_score
+        cutoff: late_cutoff() of the work schedule
+    """
+    timestamp = check_in['timestamp']
+    values = {
+        'work_date': check_in['work_date'],
+        'employee_id': check_in['employee_id'],
+        'first_check_in': timestamp,
+        'first_attendance_id': check_in['id'],
+        'check_in_type': check_in['check_in_type'],
+        'confidence_score': check_in['confidence_score'],
+        'is_late': checked_in_late(timestamp, cutoff),
+        'check_in_count': 1
+    }
+    
+    dialect = session.get_bind().dialect.name
+    if dialect in UPSERT_DIALECTS:
+        statement = UPSERT_DIALECTS[dialect].insert(AttendanceDaily).values(**values)
+        new = statement.excluded
+        earlier = new.first_check_in < AttendanceDaily.first_check_in
+        # Every SET expression sees the row as it was, so the first
+        # check-in's columns are all swapped together
+        statement = statement.on_conflict_do_update(
+            index_elements=[AttendanceDaily.work_date, AttendanceDaily.employee_id],
+            set_={
+                'check_in_count': AttendanceDaily.check_in_count + 1,
+                **{
+                    column: case((earlier, getattr(new, column)), else_=getattr(AttendanceDaily, column))
+                    for column in ('first_check_in', 'first_attendance_id', 'check_in_type',
+                                   'confidence_score', 'is_late')
+                }
+            }
+        )
+        session.execute(statement)
+        return
+    
+    daily = session.get(AttendanceDaily, (values['work_date'], values['employee_id']))
+    if daily is None:
+        session.add(AttendanceDaily(**values))
+        return
+    
+    daily.check_in_count += 1
+    if timestamp < daily.first_check_in:
+        daily.first_check_in = timestamp
+        daily.first_attendance_id = values['first_attendance_id']
+        daily.check_in_type = values['check_in_type']
+        daily.confidence_score = values['confidence_score']
+        daily.is_late = values['is_late']
+
+
+def backfill_daily(session, cutoff: time, since: Optional[date] = None, batch_size: int = 1000) -> Tuple[int, int]:
+    """
+    Rebuild attendance_daily from the attendance table
+    
+    Attendance is read in timestamp order through a server-side cursor and
+    the rollup rows are inserted one day at a time, so memory holds a single
+    day. Existing rollup rows from `since` on are replaced; everything is
+    committed in one transaction.
+    
+    Args:
+        session: SQLAlchemy session
+        cutoff: late_cutoff() of the work schedule
+        since: First day to rebuild (None = all history)
+        batch_size: Attendance rows fetched per round trip
+    
+    Returns:
+        (days, rows) written
+    """
+    query = session.query(
+        Attendance.id,
+        Attendance.employee_id,
+        Attendance.timestamp,
+        Attendance.work_date,
+        Attendance.check_in_type,
+        Attendance.confidence_score
+    ).filter(Attendance.timestamp.isnot(None))
+    existing = session.query(AttendanceDaily)
+    if since:
+        query = query.filter(Attendance.timestamp >= local_to_utc(datetime.combine(since, time.min)))
+        existing = existing.filter(AttendanceDaily.work_date >= since)
+    
+    existing.delete(synchronize_session=False)
+    
+    days = rows = 0
+    current_day, day_rows = None, {}
+    
+    def write_day():
+        session.execute(insert(AttendanceDaily), list(day_rows.values()))
+        return len(day_rows)
+    
+    for attendance_id, employee_id, timestamp, work_date, check_in_type, confidence_score in query.order_by(
+            Attendance.timestamp, Attendance.id).yield_per(batch_size):
+        # Rows recorded before the work_date column existed fall back to the
+        # timestamp's local day, as insert_check_in() derives work_date
+        work_date = work_date or utc_to_local(timestamp).date()
+        if work_date != current_day:
+            if day_rows:
+                rows += write_day()
+                days += 1
+            current_day, day_rows = work_date, {}
+        
+        daily = day_rows.get(employee_id)
+        if daily is None:
+            # Rows arrive in timestamp order: the first one is the check-in
+            day_rows[employee_id] = {
+                'work_date': current_day,
+                'employee_id': employee_id,
+                'first_check_in': timestamp,
+                'first_attendance_id': attendance_id,
+                'check_in_type': check_in_type,
+                'confidence_score': confidence_score,
+                'is_late': checked_in_late(timestamp, cutoff),
+                'check_in_count': 1
+            }
+        else:
+            daily['check_in_count'] += 1
+    
+    if day_rows:
+        rows += write_day()
+        days += 1
+    
+    session.commit()
+    return days, rows
+
+
+def refresh_late_flags(session, cutoff: time, since: Optional[date] = None, batch_size: int = 1000) -> int:
+    """
+    Recompute is_late on existing rollup rows
+    
+    For rows written under another cutoff (WORK_START_TIME or
+    LATE_THRESHOLD_MINUTES changed) or before lateness was judged on local
+    time. Reads only attendance_daily, so it is much cheaper than
+    backfill_daily().
+    
+    Args:
+        session: SQLAlchemy session
+        cutoff: late_cutoff() of the work schedule
+        since: First day to refresh (None = all history)
+        batch_size: Rows fetched per round trip
+    
+    Returns:
+        Number of rows whose flag changed
+    """
+    query = session.query(
+        AttendanceDaily.work_date,
+        AttendanceDaily.employee_id,
+        AttendanceDaily.first_check_in,
+        AttendanceDaily.is_late
+    )
+    if since:
+        query = query.filter(AttendanceDaily.work_date >= since)
+    
+    changed = []
+    for work_date, employee_id, first_check_in, was_late in query.yield_per(batch_size):
+        late = checked_in_late(first_check_in, cutoff)
+        if late != was_late:
+            changed.append({'work_date': work_date, 'employee_id': employee_id, 'is_late': late})
+    
+    for offset in range(0, len(changed), batch_size):
+        session.execute(update(AttendanceDaily), changed[offset:offset + batch_size])
+    
+    session.commit()
+    return len(changed)
+
+
+def period_bounds(period: str, day: date) -> Tuple[date, date]:
+    """First and last day of the day/week (Monday-Sunday)/month containing day"""
+    if period == 'day':
+        return day, day
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if period == 'month':
+        start = day.replace(day=1)
+        next_month = (start + timedelta(days=32)).replace(day=1)
+        return start, next_month - timedelta(days=1)
+    raise ValueError(f'Unknown period: {period}')
+
+
+def count_work_days(start: date, end: date, work_days: Sequence[int]) -> int:
+    """Days from start to end (inclusive) whose weekday() is in work_days"""
+    return sum(
+        1 for offset in range((end - start).days + 1)
+        if (start + timedelta(days=offset)).weekday() in work_days
+    )
+
+
+def summarize_daily(session, group_column, start: date, end: date, expected_days: int) -> List[Dict]:
+    """
+    Present, late and absent counts per group of active employees
+    
+    Two grouped queries (headcount and rollup rows in the range), so the
+    work is proportional to the rollup rows, and the result to the groups.
+    Counts are employee-days: for a single day, present is the number of
+    employees who checked in.
+    
+    Args:
+        session: SQLAlchemy session
+        group_column: Employee.department or Employee.position
+        start, end: Date range (inclusive)
+        expected_days: Work days each employee is expected in the range
+    
+    Returns:
+        [{'group', 'employees', 'present', 'late', 'absent', 'attendance_rate'}]
+        sorted by group
+    """
+    headcount = dict(session.query(group_column, func.count(Employee.id)).filter(
+        Employee.is_active.is_(True)
+    ).group_by(group_column).all())
+    
+    attended = {
+        group: (present, late or 0)
+        for group, present, late in session.query(
+            group_column,
+            func.count(AttendanceDaily.employee_id),
+            func.sum(case((AttendanceDaily.is_late.is_(True), 1), else_=0))
+        ).join(
+            Employee, AttendanceDaily.employee_id == Employee.employee_id
+        ).filter(
+            Employee.is_active.is_(True),
+            AttendanceDaily.work_date >= start,
+            AttendanceDaily.work_date <= end
+        ).group_by(group_column).all()
+    }
+    
+    summary = []
+    for group in sorted(set(headcount) | set(attended), key=lambda group: (group is None, group or '')):
+        employees = headcount.get(group, 0)
+        present, late = attended.get(group, (0, 0))
+        expected = employees * expected_days
+        summary.append({
+            'group': group,
+            'employees': employees,
+            'present': present,
+            'late': late,
+            # Check-ins on days off can push present past the expected days
+            'absent': max(expected - present, 0),
+            'attendance_rate': round(min(present / expected, 1.0) * 100, 1) if expected else None
+        })
+    return summary
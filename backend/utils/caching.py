@@ -0,0 +1,177 @@
+"""
+In-process caching utilities
+
+Thread-safe LRU cache with an entry limit, an approximate memory cap,
+optional TTL expiry and hit/miss counters for the metrics endpoint.
+
+Readers that fill the cache from the database take generation(key) before
+the read and pass it to put(): a put whose key was invalidated in between
+is dropped, so a reader racing a writer never stores pre-commit data.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Approximate memory footprint of a cached value in bytes
+    
+    NumPy arrays are counted by their buffer size, containers recursively.
+    """
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by entry count and memory
+    
+    Args:
+        name: Cache name (used in stats output)
+        max_entries: Maximum number of entries
+        max_bytes: Approximate memory cap in bytes (None = unlimited)
+        ttl_seconds: Entry lifetime in seconds (None = never expires)
+        sizeof: Function returning the size of a value in bytes
+    """
+    
+    def __init__(self, name: str, max_entries: int = 1024,
+                 max_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None,
+                 sizeof: Callable[[Any], int] = estimate_size):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizeof = sizeof
+        
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._current_bytes = 0
+        # Bumped by invalidate()/clear(); one counter per invalidated key
+        self._epoch = 0
+        self._generations: Dict[Hashable, int] = {}
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a value and mark it as recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def generation(self, key: Hashable) -> tuple:
+        """Token that changes whenever key is invalidated (see put())"""
+        with self._lock:
+            return self._epoch, self._generations.get(key, 0)
+    
+    def put(self, key: Hashable, value: Any, generation: Optional[tuple] = None):
+        """
+        Insert or replace a value, evicting least-recently-used entries
+        
+        Args:
+            key: Cache key
+            value: Value to cache
+            generation: generation(key) taken before the value was loaded;
+                        the put is dropped if the key was invalidated since
+        """
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Never cache something bigger than the whole budget
+            return
+        
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key, 0)):
+                return
+            
+            if key in self._entries:
+                self._remove(key)
+            
+            self._entries[key] = (value, size, expires_at)
+            self._current_bytes += size
+            
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._current_bytes > self.max_bytes
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+    
+    def invalidate(self, key: Hashable) -> bool:
+        """Remove one entry, returns True if it was cached"""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            self.invalidations += 1
+            return True
+    
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._epoch += 1
+            self._generations.clear()
+            self._entries.clear()
+            self._current_bytes = 0
+    
+    def _remove(self, key: Hashable):
+        """Remove an entry (caller must hold the lock)"""
+        _, size, _ = self._entries.pop(key)
+        self._current_bytes -= size
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict:
+        """Cache counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -2,7 +2,7 @@
 Date and time formatting utilities
 Supports Indonesian and standard formats
 """
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 from typing import Optional
 
 # Indonesian month names
@@ -175,3 +175,22 @@ def get_relative_time(dt: datetime, lang: str = 'id') -> str:
         else:
             y = int(days / 365)
             return f'{y} year{"s" if y != 1 else ""} ago'
+
+
+def utc_to_local(dt: datetime) -> datetime:
+    """
+    Convert a naive UTC datetime (the models' utcnow defaults) to naive
+    server-local time, the clock WORK_START_TIME and "today" are read on
+    
+    Args:
+        dt: Naive UTC datetime
+    
+    Returns:
+        Naive local datetime
+    """
+    return dt.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def local_to_utc(dt: datetime) -> datetime:
+    """Inverse of utc_to_local(): naive local datetime to naive UTC"""
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
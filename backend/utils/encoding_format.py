@@ -0,0 +1,124 @@
+"""
+Face Encoding Storage Format
+
+Versioned binary layout for face encodings stored in LargeBinary columns:
+
+    byte 0      magic (0xFE)
+    byte 1      format version (1)
+    byte 2      dtype code (low 4 bits) | L2-normalised flag (0x80)
+    bytes 3-4   dimension (uint16, little endian)
+    bytes 5..   vector payload (little endian)
+
+Blobs without a valid header are legacy raw float64 vectors written by
+`ndarray.tobytes()` and are still decoded transparently.
+"""
+
+import struct
+import numpy as np
+from typing import Dict, Union
+
+MAGIC = 0xFE
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<BBBH')
+NORMALIZED_FLAG = 0x80
+
+DTYPE_CODES = {
+    'float16': 1,
+    'float32': 2,
+    'float64': 3,
+}
+CODE_DTYPES = {code: np.dtype(name).newbyteorder('<') for name, code in DTYPE_CODES.items()}
+
+
+def l2_normalize(encoding: np.ndarray) -> np.ndarray:
+    """Scale an encoding (or each row of a matrix) to unit length"""
+    encoding = np.asarray(encoding)
+    norms = np.linalg.norm(encoding, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return encoding / norms
+
+
+def encode_face_encoding(encoding: np.ndarray, dtype: str = 'float32',
+                         normalize: bool = False) -> bytes:
+    """
+    Serialize a face encoding with a version header
+    
+    Args:
+        encoding: 1-D face encoding vector
+        dtype: Storage dtype ('float16', 'float32' or 'float64')
+        normalize: Store the L2-normalised vector
+    
+    Returns:
+        Encoded bytes
+    """
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Unsupported encoding dtype: {dtype}")
+    
+    vector = np.asarray(encoding, dtype=np.float64).reshape(-1)
+    if normalize:
+        vector = l2_normalize(vector)
+    
+    flags = DTYPE_CODES[dtype] | (NORMALIZED_FLAG if normalize else 0)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, flags, vector.shape[0])
+    return header + vector.astype(CODE_DTYPES[DTYPE_CODES[dtype]]).tobytes()
+
+
+def parse_header(blob: bytes) -> Union[Dict, None]:
+    """
+    Parse the format header of a stored encoding
+    
+    Returns:
+        {'version', 'dtype', 'normalized', 'dimension'} or None for legacy blobs
+    """
+    if len(blob) < HEADER.size or blob[0] != MAGIC:
+        return None
+    
+    _, version, flags, dimension = HEADER.unpack_from(blob)
+    dtype = CODE_DTYPES.get(flags & 0x0F)
+    
+    # Length check guards against a legacy float64 vector that happens to
+    # start with the magic byte
+    if version != FORMAT_VERSION or dtype is None or \
+            len(blob) != HEADER.size + dimension * dtype.itemsize:
+        return None
+    
+    return {
+        'version': version,
+        'dtype': dtype.name,
+        'normalized': bool(flags & NORMALIZED_FLAG),
+        'dimension': dimension
+    }
+
+
+def decode_face_encoding(blob: bytes, normalize: bool = False) -> np.ndarray:
+    """
+    Deserialize a stored face encoding (new or legacy format)
+    
+    Args:
+        blob: Bytes from a face_encoding column
+        normalize: Return the L2-normalised vector even if stored raw
+    
+    Returns:
+        1-D encoding array (float32 for compact blobs, float64 for legacy)
+    """
+    header = parse_header(blob)
+    
+    if header is None:
+        vector = np.frombuffer(blob, dtype=np.float64)
+    else:
+        vector = np.frombuffer(blob, dtype=CODE_DTYPES[DTYPE_CODES[header['dtype']]],
+                               offset=HEADER.size)
+        if header['dtype'] == 'float16':
+            vector = vector.astype(np.float32)
+        if header['normalized']:
+            return vector
+    
+    return l2_normalize(vector) if normalize else vector
+
+
+def needs_migration(blob: bytes, dtype: str = 'float32', normalize: bool = False) -> bool:
+    """Check whether a stored blob differs from the target format"""
+    header = parse_header(blob)
+    if header is None:
+        return True
+    return header['dtype'] != dtype or header['normalized'] != normalize
@@ -11,6 +11,9 @@ import numpy as np
 import cv2
 from typing import Tuple, Dict, Optional, List
 import math
+import threading
+
+from .timing import NULL_TIMER, StageTimer
 
 # Mock face_recognition until dlib is installed
 class MockFaceRecognition:
@@ -54,6 +57,227 @@ except ImportError:
     face_recognition = MockFaceRecognition()
 
 
+def _variance(array: np.ndarray) -> float:
+    """Population variance in one pass (same result as ndarray.var())"""
+    return float(cv2.meanStdDev(array)[1][0, 0] ** 2)
+
+
+def scale_face_location(face_location: Tuple[int, int, int, int], scale: float,
+                        image_shape: Tuple[int, ...]) -> Tuple[int, int, int, int]:
+    """
+    Map a (top, right, bottom, left) box from a resized copy back to the source frame
+    
+    Args:
+        face_location: Box in resized-image coordinates
+        scale: Factor the source was multiplied by to get the resized copy
+        image_shape: Shape of the source frame
+    
+    Returns:
+        Box in source-frame coordinates, clamped to the frame
+    """
+    h, w = image_shape[:2]
+    top, right, bottom, left = face_location
+    return (
+        min(max(int(round(top / scale)), 0), h),
+        min(max(int(round(right / scale)), 0), w),
+        min(max(int(round(bottom / scale)), 0), h),
+        min(max(int(round(left / scale)), 0), w)
+    )
+
+
+def _prefiltered_face_locations(image: np.ndarray, model: str, min_face_ratio: float,
+                                roi_padding: float) -> List[Tuple[int, int, int, int]]:
+    """
+    Haar-cascade first stage for detect_faces
+    
+    Frames where the cascade finds zero or several faces are answered with the
+    cascade boxes directly (callers reject them on count), so HOG and the
+    encoder never run. A single cascade box seeds a padded ROI for HOG.
+    """
+    # Imported here: mask_detection_cv imports this module
+    from .mask_detection_cv import get_mask_detector_cv
+    
+    cascade_boxes = get_mask_detector_cv().detect_faces_cascade(image, min_face_ratio=min_face_ratio)
+    if cascade_boxes is None:
+        return face_recognition.face_locations(image, model=model)
+    
+    if len(cascade_boxes) != 1:
+        return cascade_boxes
+    
+    h, w = image.shape[:2]
+    top, right, bottom, left = cascade_boxes[0]
+    pad = int(max(right - left, bottom - top) * roi_padding)
+    roi_top, roi_left = max(top - pad, 0), max(left - pad, 0)
+    roi = image[roi_top:min(bottom + pad, h), roi_left:min(right + pad, w)]
+    
+    return [(t + roi_top, r + roi_left, b + roi_top, l + roi_left)
+            for t, r, b, l in face_recognition.face_locations(roi, model=model)]
+
+
+def detect_faces(image: np.ndarray, detection_width: Optional[int] = None,
+                 model: str = 'hog', prefilter: bool = False,
+                 min_face_ratio: float = 0.1,
+                 roi_padding: float = 0.5) -> List[Tuple[int, int, int, int]]:
+    """
+    Detect faces on a downscaled copy of the frame
+    
+    HOG detection cost grows with pixel count, so the detector runs on a copy
+    at most `detection_width` pixels wide and the boxes are projected back to
+    full resolution for quality scoring and encoding.
+    
+    Args:
+        image: RGB image array
+        detection_width: Maximum width for detection (None = full resolution)
+        model: 'hog' or 'cnn'
+        prefilter: Run the Haar cascade first; frames without exactly one
+                   face skip HOG entirely and one face narrows HOG to its ROI
+        min_face_ratio: Prefilter ignores faces narrower than this fraction
+                        of the frame width
+        roi_padding: Padding around the cascade box, as a fraction of its size
+    
+    Returns:
+        List of (top, right, bottom, left) boxes in full-resolution coordinates
+    """
+    w = image.shape[1]
+    scale = 1.0
+    small = image
+    
+    if detection_width and w > detection_width:
+        scale = detection_width / w
+        small = cv2.resize(image, (detection_width, max(int(round(image.shape[0] * scale)), 1)),
+                           interpolation=cv2.INTER_AREA)
+    
+    if prefilter:
+        locations = _prefiltered_face_locations(small, model, min_face_ratio, roi_padding)
+    else:
+        locations = face_recognition.face_locations(small, model=model)
+    
+    if scale == 1.0:
+        return locations
+    
+    return [scale_face_location(location, scale, image.shape) for location in locations]
+
+
+class FaceFrame:
+    """
+    Single-pass analysis context for one frame and one face
+    
+    Colour-space conversions, regions of interest and derived statistics are
+    computed lazily on first access and memoized, so quality scoring and both
+    mask detectors share one grayscale/HSV/YCrCb conversion per frame.
+    """
+    
+    LOWER_FACE_RATIO = 0.4  # Mask region starts 40% down the face box
+    
+    def __init__(self, image: np.ndarray, face_location: Tuple[int, int, int, int]):
+        """
+        Args:
+            image: RGB image array
+            face_location: (top, right, bottom, left) face coordinates
+        """
+        self.image = image
+        self.face_location = face_location
+        self._memo = {}
+    
+    def _cached(self, key: str, compute):
+        """Return a memoized value, computing it on first access"""
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+    
+    @property
+    def face_width(self) -> int:
+        top, right, bottom, left = self.face_location
+        return right - left
+    
+    @property
+    def face_height(self) -> int:
+        top, right, bottom, left = self.face_location
+        return bottom - top
+    
+    @property
+    def lower_face_offset(self) -> int:
+        """Row offset of the lower face inside the face ROI"""
+        return int(self.face_height * self.LOWER_FACE_RATIO)
+    
+    @property
+    def face_roi(self) -> np.ndarray:
+        """Face region (view into the frame, no copy)"""
+        top, right, bottom, left = self.face_location
+        return self.image[top:bottom, left:right]
+    
+    @property
+    def lower_face(self) -> np.ndarray:
+        """Lower face region where a mask would be (view, no copy)"""
+        top, right, bottom, left = self.face_location
+        return self.image[top + self.lower_face_offset:bottom, left:right]
+    
+    @property
+    def face_gray(self) -> np.ndarray:
+        return self._cached('face_gray', lambda: cv2.cvtColor(self.face_roi, cv2.COLOR_RGB2GRAY))
+    
+    @property
+    def lower_gray(self) -> np.ndarray:
+        """Grayscale lower face, sliced from the face conversion when possible"""
+        def compute():
+            if self.face_location[0] >= 0:
+                return self.face_gray[self.lower_face_offset:]
+            return cv2.cvtColor(self.lower_face, cv2.COLOR_RGB2GRAY)
+        return self._cached('lower_gray', compute)
+    
+    @property
+    def lower_hsv(self) -> np.ndarray:
+        return self._cached('lower_hsv', lambda: cv2.cvtColor(self.lower_face, cv2.COLOR_RGB2HSV))
+    
+    @property
+    def lower_hsv_stats(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-channel (mean, std) of the lower face HSV in one pass"""
+        def compute():
+            mean, std = cv2.meanStdDev(self.lower_hsv)
+            return mean.reshape(-1), std.reshape(-1)
+        return self._cached('lower_hsv_stats', compute)
+    
+    @property
+    def lower_ycrcb(self) -> np.ndarray:
+        return self._cached('lower_ycrcb', lambda: cv2.cvtColor(self.lower_face, cv2.COLOR_RGB2YCrCb))
+    
+    @property
+    def face_laplacian(self) -> np.ndarray:
+        """Laplacian of the face grayscale (CV_16S is exact for 8-bit input)"""
+        return self._cached('face_laplacian', lambda: cv2.Laplacian(self.face_gray, cv2.CV_16S))
+    
+    @property
+    def face_laplacian_var(self) -> float:
+        """Laplacian variance of the face (sharpness)"""
+        return self._cached('face_laplacian_var', lambda: _variance(self.face_laplacian))
+    
+    @property
+    def lower_laplacian_var(self) -> float:
+        """Laplacian variance of the lower face (texture)"""
+        def compute():
+            if self.face_location[0] >= 0:
+                return _variance(self.face_laplacian[self.lower_face_offset:])
+            return _variance(cv2.Laplacian(self.lower_gray, cv2.CV_16S))
+        return self._cached('lower_laplacian_var', compute)
+    
+    @property
+    def landmarks(self) -> Dict:
+        """Face landmarks of the analysed face ({} if unavailable)"""
+        def compute():
+            landmarks = face_recognition.face_landmarks(self.image, [self.face_location])
+            return landmarks[0] if landmarks else {}
+        return self._cached('landmarks', compute)
+
+
+# Recommendation messages, shared by the pre-detection gate and analyze_face_quality
+RECOMMENDATION_BLUR = 'Gambar terlalu blur. Pegang kamera dengan stabil.'
+RECOMMENDATION_LIGHTING = 'Pencahayaan kurang baik. Cari tempat dengan cahaya yang cukup.'
+RECOMMENDATION_FACE_SIZE = 'Wajah terlalu kecil atau jauh. Dekatkan wajah ke kamera.'
+RECOMMENDATION_ANGLE = 'Wajah tidak menghadap kamera. Hadapkan wajah ke depan.'
+RECOMMENDATION_MASK = '⚠️ MASKER TERDETEKSI. Harap lepas masker untuk verifikasi.'
+RECOMMENDATION_GOOD = 'Kualitas wajah bagus!'
+
+
 class FaceQualityMetrics:
     """Face quality scoring metrics"""
     
@@ -67,31 +291,42 @@ class FaceQualityMetrics:
     IDEAL_BRIGHTNESS = 128
     
     @staticmethod
-    def calculate_blur_score(image: np.ndarray) -> float:
+    def calculate_blur_score(image: np.ndarray, frame: Optional[FaceFrame] = None) -> float:
         """
         Calculate blur score using Laplacian variance
         Higher score = sharper image
         
+        Args:
+            image: RGB face image
+            frame: Shared FaceFrame (reuses its face grayscale and Laplacian)
+        
         Returns:
             Score 0-100 (100 = very sharp, 0 = very blurry)
         """
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+        if frame is not None:
+            laplacian_var = frame.face_laplacian_var
+        else:
+            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
         
         # Normalize to 0-100 scale
         score = min(100, (laplacian_var / 500) * 100)
         return round(score, 2)
     
     @staticmethod
-    def calculate_brightness_score(image: np.ndarray) -> float:
+    def calculate_brightness_score(image: np.ndarray, frame: Optional[FaceFrame] = None) -> float:
         """
         Calculate lighting quality score
         
+        Args:
+            image: RGB face image
+            frame: Shared FaceFrame (reuses its face grayscale)
+        
         Returns:
             Score 0-100 (100 = ideal lighting)
         """
-        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        avg_brightness = np.mean(gray)
+        gray = frame.face_gray if frame is not None else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        avg_brightness = cv2.mean(gray)[0]
         
         # Calculate deviation from ideal
         deviation = abs(avg_brightness - FaceQualityMetrics.IDEAL_BRIGHTNESS)
@@ -168,7 +403,8 @@ class MaskDetector:
     
     @staticmethod
     def detect_mask(image: np.ndarray, face_location: Tuple[int, int, int, int], 
-                   landmarks: Optional[Dict] = None) -> Dict:
+                   landmarks: Optional[Dict] = None,
+                   frame: Optional[FaceFrame] = None) -> Dict:
         """
         Detect if person is wearing a face mask
         
@@ -181,6 +417,7 @@ class MaskDetector:
             image: RGB image array
             face_location: (top, right, bottom, left) face coordinates
             landmarks: Face landmarks dictionary (optional)
+            frame: Shared FaceFrame (reuses its conversions)
         
         Returns:
             {
@@ -190,13 +427,11 @@ class MaskDetector:
             }
         """
         try:
-            top, right, bottom, left = face_location
-            face_height = bottom - top
-            face_width = right - left
+            if frame is None:
+                frame = FaceFrame(image, face_location)
             
             # Extract lower face region (where mask would be)
-            lower_face_top = top + int(face_height * 0.4)
-            lower_face = image[lower_face_top:bottom, left:right]
+            lower_face = frame.lower_face
             
             if lower_face.size == 0:
                 return {
@@ -212,12 +447,12 @@ class MaskDetector:
                     return mask_by_landmarks
             
             # Method 2: Color uniformity check
-            mask_by_color = MaskDetector._check_color_uniformity(lower_face)
+            mask_by_color = MaskDetector._check_color_uniformity(lower_face, frame.lower_hsv_stats[1])
             if mask_by_color['mask_detected']:
                 return mask_by_color
             
             # Method 3: Edge density (mask has more defined edges)
-            mask_by_edges = MaskDetector._check_edge_density(lower_face)
+            mask_by_edges = MaskDetector._check_edge_density(lower_face, frame.lower_gray)
             
             return mask_by_edges
         
@@ -254,17 +489,17 @@ class MaskDetector:
         }
     
     @staticmethod
-    def _check_color_uniformity(lower_face: np.ndarray) -> Dict:
+    def _check_color_uniformity(lower_face: np.ndarray, hsv_std: Optional[np.ndarray] = None) -> Dict:
         """
         Check if lower face has uniform color (mask) vs varied skin texture
         """
-        # Convert to HSV for better color analysis
-        hsv = cv2.cvtColor(lower_face, cv2.COLOR_RGB2HSV)
+        if hsv_std is None:
+            # Convert to HSV for better color analysis
+            hsv = cv2.cvtColor(lower_face, cv2.COLOR_RGB2HSV)
+            hsv_std = cv2.meanStdDev(hsv)[1].reshape(-1)
         
         # Calculate color variance
-        h_std = np.std(hsv[:, :, 0])
-        s_std = np.std(hsv[:, :, 1])
-        v_std = np.std(hsv[:, :, 2])
+        h_std, s_std, v_std = hsv_std
         
         avg_std = (h_std + s_std + v_std) / 3
         
@@ -283,13 +518,14 @@ class MaskDetector:
         }
     
     @staticmethod
-    def _check_edge_density(lower_face: np.ndarray) -> Dict:
+    def _check_edge_density(lower_face: np.ndarray, gray: Optional[np.ndarray] = None) -> Dict:
         """
         Check edge density - masks typically have more defined edges
         """
-        gray = cv2.cvtColor(lower_face, cv2.COLOR_RGB2GRAY)
+        if gray is None:
+            gray = cv2.cvtColor(lower_face, cv2.COLOR_RGB2GRAY)
         edges = cv2.Canny(gray, 50, 150)
-        edge_density = np.sum(edges > 0) / edges.size
+        edge_density = cv2.countNonZero(edges) / edges.size
         
         # High edge density might indicate mask edges
         if edge_density > 0.15:
@@ -306,8 +542,108 @@ class MaskDetector:
         }
 
 
+MASK_STRATEGIES = ('legacy', 'opencv', 'combined')
+
+
+def detect_mask(image: np.ndarray, face_location: Tuple[int, int, int, int],
+                strategy: str = 'legacy', landmarks: Optional[Dict] = None,
+                frame: Optional[FaceFrame] = None) -> Dict:
+    """
+    Single entry point for mask detection, run once per frame
+    
+    Strategies:
+    - 'legacy': MaskDetector (landmarks, colour uniformity, edges)
+    - 'opencv': MaskDetectorCV multi-method cascade (utils/mask_detection_cv.py)
+    - 'combined': legacy verdict, overridden by a confident (>70%) OpenCV
+      mask; OpenCV is skipped when legacy already found a mask
+    
+    Args:
+        image: RGB image array
+        face_location: (top, right, bottom, left) face coordinates
+        strategy: One of MASK_STRATEGIES
+        landmarks: Face landmarks dictionary (legacy/combined, optional)
+        frame: Shared FaceFrame, so both detectors reuse one set of conversions
+    
+    Returns:
+        {
+            'mask_detected': bool,
+            'confidence': float (0-100),
+            'reason': str,
+            'method': str
+        }
+    """
+    if strategy not in MASK_STRATEGIES:
+        raise ValueError(f"Unknown mask detection strategy: {strategy}")
+    
+    if frame is None:
+        frame = FaceFrame(image, face_location)
+    
+    if strategy != 'opencv':
+        legacy_result = {'method': 'legacy', **MaskDetector.detect_mask(image, face_location, landmarks, frame=frame)}
+        if strategy == 'legacy' or legacy_result['mask_detected']:
+            return legacy_result
+    
+    # Imported here: mask_detection_cv depends on this module
+    from .mask_detection_cv import detect_mask_opencv
+    opencv_result = detect_mask_opencv(image, face_location, frame=frame)
+    
+    if strategy == 'opencv' or (opencv_result['mask_detected'] and opencv_result['confidence'] > 70):
+        return opencv_result
+    return legacy_result
+
+
+def prescreen_frame(image: np.ndarray, thumbnail_width: int = 160,
+                    brightness_min: float = FaceQualityMetrics.BRIGHTNESS_MIN,
+                    brightness_max: float = FaceQualityMetrics.BRIGHTNESS_MAX,
+                    blur_threshold: float = FaceQualityMetrics.BLUR_THRESHOLD) -> Optional[Dict]:
+    """
+    Cheap whole-frame checks on a small thumbnail, run before face detection
+    
+    Rejects hopeless frames (far too dark, overexposed or blurred) so they
+    don't pay for HOG detection. Checks run cheapest first: mean brightness,
+    then Laplacian variance.
+    
+    Args:
+        image: RGB image array
+        thumbnail_width: Width of the grayscale thumbnail the checks run on
+        brightness_min: Minimum mean brightness (0-255)
+        brightness_max: Maximum mean brightness (0-255)
+        blur_threshold: Minimum Laplacian variance of the thumbnail
+    
+    Returns:
+        None if the frame passes, otherwise
+        {'tier': 'brightness' | 'blur', 'value': float, 'recommendation': str}
+    """
+    h, w = image.shape[:2]
+    if w > thumbnail_width:
+        thumb = cv2.resize(image, (thumbnail_width, max(int(h * thumbnail_width / w), 1)),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        thumb = image
+    gray = cv2.cvtColor(thumb, cv2.COLOR_RGB2GRAY)
+    
+    brightness = cv2.mean(gray)[0]
+    if brightness < brightness_min or brightness > brightness_max:
+        return {
+            'tier': 'brightness',
+            'value': round(brightness, 2),
+            'recommendation': RECOMMENDATION_LIGHTING
+        }
+    
+    blur_variance = _variance(cv2.Laplacian(gray, cv2.CV_64F))
+    if blur_variance < blur_threshold:
+        return {
+            'tier': 'blur',
+            'value': round(blur_variance, 2),
+            'recommendation': RECOMMENDATION_BLUR
+        }
+    
+    return None
+
+
 def analyze_face_quality(image: np.ndarray, face_location: Tuple[int, int, int, int],
-                        check_mask: bool = True) -> Dict:
+                        check_mask: bool = True, frame: Optional[FaceFrame] = None,
+                        mask_strategy: str = 'legacy', timer: Optional[StageTimer] = None) -> Dict:
     """
     Comprehensive face quality analysis
     
@@ -315,6 +651,9 @@ def analyze_face_quality(image: np.ndarray, face_location: Tuple[int, int, int,
         image: RGB image array
         face_location: (top, right, bottom, left) face coordinates
         check_mask: Whether to check for face mask
+        frame: Shared FaceFrame, so conversions are computed once per frame
+        mask_strategy: detect_mask() strategy ('legacy', 'opencv', 'combined')
+        timer: StageTimer for the 'quality' and 'mask' stages
     
     Returns:
         {
@@ -325,65 +664,69 @@ def analyze_face_quality(image: np.ndarray, face_location: Tuple[int, int, int,
             'angle_score': float,
             'mask_detected': bool,
             'mask_confidence': float,
+            'mask_method': str,
             'recommendation': str,
             'is_acceptable': bool
         }
     """
+    timer = timer or NULL_TIMER
     try:
-        top, right, bottom, left = face_location
-        face_width = right - left
-        face_height = bottom - top
-        
-        # Extract face region
-        face_img = image[top:bottom, left:right]
+        if frame is None:
+            frame = FaceFrame(image, face_location)
         
-        if face_img.size == 0:
-            return {
-                'quality_score': 0.0,
-                'is_acceptable': False,
-                'recommendation': 'Wajah tidak terdeteksi dengan benar'
-            }
+        face_width = frame.face_width
+        face_height = frame.face_height
         
-        # Calculate quality metrics
-        blur_score = FaceQualityMetrics.calculate_blur_score(face_img)
-        brightness_score = FaceQualityMetrics.calculate_brightness_score(face_img)
-        size_score = FaceQualityMetrics.calculate_size_score(face_width, face_height)
-        
-        # Get face landmarks for angle detection
-        landmarks = face_recognition.face_landmarks(image, [face_location])
-        angle_score = FaceQualityMetrics.calculate_angle_score(
-            landmarks[0] if landmarks else {}
-        )
-        
-        # Overall quality score (weighted average)
-        quality_score = (
-            blur_score * 0.3 +
-            brightness_score * 0.25 +
-            size_score * 0.25 +
-            angle_score * 0.2
-        )
+        with timer.span('quality'):
+            # Extract face region
+            face_img = frame.face_roi
+            
+            if face_img.size == 0:
+                return {
+                    'quality_score': 0.0,
+                    'is_acceptable': False,
+                    'recommendation': 'Wajah tidak terdeteksi dengan benar'
+                }
+            
+            # Calculate quality metrics
+            blur_score = FaceQualityMetrics.calculate_blur_score(face_img, frame)
+            brightness_score = FaceQualityMetrics.calculate_brightness_score(face_img, frame)
+            size_score = FaceQualityMetrics.calculate_size_score(face_width, face_height)
+            
+            # Get face landmarks for angle detection
+            landmarks = frame.landmarks
+            angle_score = FaceQualityMetrics.calculate_angle_score(landmarks)
+            
+            # Overall quality score (weighted average)
+            quality_score = (
+                blur_score * 0.3 +
+                brightness_score * 0.25 +
+                size_score * 0.25 +
+                angle_score * 0.2
+            )
         
         # Mask detection
-        mask_result = {'mask_detected': False, 'confidence': 0.0, 'reason': ''}
+        mask_result = {'mask_detected': False, 'confidence': 0.0, 'reason': '', 'method': 'none'}
         if check_mask:
-            mask_result = MaskDetector.detect_mask(
-                image, face_location, landmarks[0] if landmarks else None
-            )
+            with timer.span('mask'):
+                mask_result = detect_mask(
+                    image, face_location, mask_strategy, landmarks or None, frame=frame
+                )
         
         # Generate recommendation
         recommendations = []
         if blur_score < 60:
-            recommendations.append('Gambar terlalu blur. Pegang kamera dengan stabil.')
+            recommendations.append(RECOMMENDATION_BLUR)
         if brightness_score < 60:
-            recommendations.append('Pencahayaan kurang baik. Cari tempat dengan cahaya yang cukup.')
+            recommendations.append(RECOMMENDATION_LIGHTING)
         if size_score < 60:
-            recommendations.append('Wajah terlalu kecil atau jauh. Dekatkan wajah ke kamera.')
+            recommendations.append(RECOMMENDATION_FACE_SIZE)
         if angle_score < 70:
-            recommendations.append('Wajah tidak menghadap kamera. Hadapkan wajah ke depan.')
+            recommendations.append(RECOMMENDATION_ANGLE)
         if mask_result['mask_detected']:
-            recommendations.append('⚠️ MASKER TERDETEKSI. Harap lepas masker untuk verifikasi.')
+            recommendations.append(RECOMMENDATION_MASK)
         
-        recommendation = ' | '.join(recommendations) if recommendations else 'Kualitas wajah bagus!'
+        recommendation = ' | '.join(recommendations) if recommendations else RECOMMENDATION_GOOD
         
         # Acceptable if quality > 70 and no mask
         is_acceptable = quality_score >= 70 and not mask_result['mask_detected']
@@ -397,6 +740,7 @@ def analyze_face_quality(image: np.ndarray, face_location: Tuple[int, int, int,
             'mask_detected': mask_result['mask_detected'],
             'mask_confidence': mask_result['confidence'],
             'mask_reason': mask_result['reason'],
+            'mask_method': mask_result['method'],
             'recommendation': recommendation,
             'is_acceptable': is_acceptable,
             'face_dimensions': {
@@ -414,23 +758,80 @@ def analyze_face_quality(image: np.ndarray, face_location: Tuple[int, int, int,
         }
 
 
-def enhance_image_for_recognition(image: np.ndarray) -> np.ndarray:
+# Enhancement pipeline objects, created once instead of per call.
+# cv2.CLAHE keeps internal buffers, so each thread gets its own instance.
+_SHARPEN_KERNEL = np.array([[-0.5, -0.5, -0.5],
+                            [-0.5,  5,   -0.5],
+                            [-0.5, -0.5, -0.5]], dtype=np.float32)
+_enhance_local = threading.local()
+
+
+def _get_clahe():
+    """Per-thread CLAHE (Contrast Limited Adaptive Histogram Equalization)"""
+    clahe = getattr(_enhance_local, 'clahe', None)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        _enhance_local.clahe = clahe
+    return clahe
+
+
+def _enhance_pixels(image: np.ndarray) -> np.ndarray:
+    """CLAHE on the LAB lightness channel, bilateral filter, sharpening"""
+    # Convert to LAB for better enhancement
+    lab = cv2.cvtColor(image, cv2.COLOR_RGB2LAB)
+    l, a, b = cv2.split(lab)
+    
+    l = _get_clahe().apply(l)
+    
+    # Merge back
+    lab = cv2.merge([l, a, b])
+    enhanced = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
+    
+    # Bilateral filter (reduce noise while preserving edges)
+    enhanced = cv2.bilateralFilter(enhanced, 5, 50, 50)
+    
+    # Subtle sharpening
+    return cv2.filter2D(enhanced, -1, _SHARPEN_KERNEL)
+
+
+def enhance_image_for_recognition(image: np.ndarray,
+                                  face_location: Optional[Tuple[int, int, int, int]] = None,
+                                  padding: float = 0.25) -> np.ndarray:
     """
     Enhance image quality for better face recognition
     
     Pipeline:
-    1. Resize if too large
+    1. Resize if too large (whole-frame mode only)
     2. Histogram equalization for contrast
     3. Bilateral filter for noise reduction
     4. Sharpening
     
+    With a face_location only the padded face box is enhanced (ROI mode):
+    the encoding only looks at the face, and the crop is a small fraction
+    of a 720p/1080p frame. The result keeps the input's shape, so the same
+    face_location is still valid on it.
+    
     Args:
         image: RGB image array
+        face_location: (top, right, bottom, left) to enhance only the face region
+        padding: ROI padding as a fraction of the face box size
     
     Returns:
         Enhanced RGB image array
     """
     try:
+        if face_location is not None:
+            h, w = image.shape[:2]
+            top, right, bottom, left = face_location
+            pad_y = int((bottom - top) * padding)
+            pad_x = int((right - left) * padding)
+            y1, y2 = max(top - pad_y, 0), min(bottom + pad_y, h)
+            x1, x2 = max(left - pad_x, 0), min(right + pad_x, w)
+            
+            enhanced = image.copy()
+            enhanced[y1:y2, x1:x2] = _enhance_pixels(image[y1:y2, x1:x2])
+            return enhanced
+        
         # 1. Resize if too large (max 1920 width)
         h, w = image.shape[:2]
         if w > 1920:
@@ -439,28 +840,7 @@ def enhance_image_for_recognition(image: np.ndarray) -> np.ndarray:
             new_h = int(h * scale)
             image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA)
         
-        # 2. Convert to LAB for better enhancement
-        lab = cv2.cvtColor(image, cv2.COLOR_RGB2LAB)
-        l, a, b = cv2.split(lab)
-        
-        # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        l = clahe.apply(l)
-        
-        # Merge back
-        lab = cv2.merge([l, a, b])
-        enhanced = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
-        
-        # 3. Bilateral filter (reduce noise while preserving edges)
-        enhanced = cv2.bilateralFilter(enhanced, 5, 50, 50)
-        
-        # 4. Subtle sharpening
-        kernel = np.array([[-0.5, -0.5, -0.5],
-                          [-0.5,  5,   -0.5],
-                          [-0.5, -0.5, -0.5]])
-        enhanced = cv2.filter2D(enhanced, -1, kernel)
-        
-        return enhanced
+        return _enhance_pixels(image)
     
     except Exception as e:
         print(f"Error enhancing image: {e}")
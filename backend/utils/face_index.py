@@ -0,0 +1,182 @@
+"""
+In-memory Face Embedding Index for 1:N (kiosk) identification
+
+Keeps every active employee's face encodings resident as a single NumPy
+matrix so a shared terminal can identify whoever stands in front of it
+with one vectorized distance pass and no database round-trip per frame.
+"""
+
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class FaceEmbeddingIndex:
+    """
+    Resident matrix of face encodings with top-k nearest neighbour search
+    
+    Readers never take the lock: every write builds a new immutable snapshot
+    and swaps it in atomically, so a search always sees a consistent view.
+    """
+    
+    def __init__(self, dimension: int = 128, dtype=np.float32):
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._snapshot = self._build_snapshot(
+            np.empty((0, dimension), dtype=self.dtype),
+            np.empty(0, dtype=object),
+            {}
+        )
+    
+    def _build_snapshot(self, matrix: np.ndarray, owners: np.ndarray, names: Dict[str, str]) -> Dict:
+        """Build an immutable snapshot from an encoding matrix and its row owners"""
+        _, counts = np.unique(owners.astype(str), return_counts=True)
+        
+        return {
+            'matrix': matrix,
+            # Squared norms are cached so a query only needs one mat-vec product
+            'sq_norms': np.einsum('ij,ij->i', matrix, matrix),
+            'owners': owners,
+            'names': names,
+            'max_per_employee': int(counts.max()) if counts.size else 0,
+            'employee_count': int(counts.size),
+        }
+    
+    def _as_matrix(self, encodings: List[np.ndarray]) -> np.ndarray:
+        """Stack encodings into an (n, dimension) matrix of the index dtype"""
+        if not len(encodings):
+            return np.empty((0, self.dimension), dtype=self.dtype)
+        return np.vstack([np.asarray(e, dtype=self.dtype).reshape(1, -1) for e in encodings])
+    
+    def rebuild(self, records: Iterable[Tuple[str, str, np.ndarray]]):
+        """
+        Replace the whole index
+        
+        Args:
+            records: Iterable of (employee_id, name, encoding)
+        """
+        owners = []
+        encodings = []
+        names = {}
+        for employee_id, name, encoding in records:
+            owners.append(employee_id)
+            encodings.append(encoding)
+            names[employee_id] = name
+        
+        snapshot = self._build_snapshot(
+            self._as_matrix(encodings), np.array(owners, dtype=object), names
+        )
+        with self._lock:
+            self._snapshot = snapshot
+    
+    def set_employee(self, employee_id: str, name: str, encodings: List[np.ndarray]):
+        """
+        Incrementally replace one employee's encodings (e.g. after /api/register)
+        
+        Args:
+            employee_id: Employee ID
+            name: Employee display name
+            encodings: New face encodings for the employee
+        """
+        new_rows = self._as_matrix(encodings)
+        with self._lock:
+            current = self._snapshot
+            keep = current['owners'] != employee_id
+            matrix = np.concatenate([current['matrix'][keep], new_rows])
+            owners = np.concatenate([
+                current['owners'][keep],
+                np.array([employee_id] * len(new_rows), dtype=object)
+            ])
+            names = dict(current['names'])
+            names[employee_id] = name
+            self._snapshot = self._build_snapshot(matrix, owners, names)
+    
+    def remove_employee(self, employee_id: str):
+        """Drop an employee from the index (e.g. deactivated account)"""
+        with self._lock:
+            current = self._snapshot
+            keep = current['owners'] != employee_id
+            names = dict(current['names'])
+            names.pop(employee_id, None)
+            self._snapshot = self._build_snapshot(
+                current['matrix'][keep], current['owners'][keep], names
+            )
+    
+    def search(self, encoding: np.ndarray, k: int = 3,
+               tolerance: Optional[float] = None) -> List[Dict]:
+        """
+        Find the k closest employees to a face encoding
+        
+        Distances are Euclidean, the same metric as face_recognition.face_distance,
+        computed as ||a||^2 - 2ab + ||b||^2 in one matrix-vector pass.
+        
+        Args:
+            encoding: Query face encoding
+            k: Number of distinct employees to return
+            tolerance: Match threshold used for the 'is_match' flag
+        
+        Returns:
+            List of {'employee_id', 'name', 'distance', 'is_match'} sorted by distance
+        """
+        snapshot = self._snapshot
+        matrix = snapshot['matrix']
+        total = matrix.shape[0]
+        
+        if total == 0 or k <= 0:
+            return []
+        
+        query = np.asarray(encoding, dtype=self.dtype).reshape(-1)
+        sq_distances = snapshot['sq_norms'] - 2.0 * (matrix @ query) + float(query @ query)
+        np.maximum(sq_distances, 0, out=sq_distances)
+        
+        # Enough rows to guarantee k distinct employees even if the best rows
+        # all belong to the same person
+        candidate_count = min(total, k * snapshot['max_per_employee'])
+        if candidate_count < total:
+            candidates = np.argpartition(sq_distances, candidate_count - 1)[:candidate_count]
+        else:
+            candidates = np.arange(total)
+        candidates = candidates[np.argsort(sq_distances[candidates])]
+        
+        results = []
+        seen = set()
+        owners = snapshot['owners']
+        for row in candidates:
+            employee_id = owners[row]
+            if employee_id in seen:
+                continue
+            seen.add(employee_id)
+            
+            distance = float(np.sqrt(sq_distances[row]))
+            results.append({
+                'employee_id': employee_id,
+                'name': snapshot['names'].get(employee_id),
+                'distance': round(distance, 4),
+                'is_match': tolerance is not None and distance <= tolerance
+            })
+            if len(results) >= k:
+                break
+        
+        return results
+    
+    def stats(self) -> Dict:
+        """Index size statistics"""
+        snapshot = self._snapshot
+        return {
+            'encodings': int(snapshot['matrix'].shape[0]),
+            'employees': snapshot['employee_count'],
+            'dimension': self.dimension,
+            'memory_bytes': int(snapshot['matrix'].nbytes + snapshot['sq_norms'].nbytes)
+        }
+
+
+# Singleton instance
+_face_index = None
+
+def get_face_index() -> FaceEmbeddingIndex:
+    """Get or create singleton face embedding index"""
+    global _face_index
+    if _face_index is None:
+        _face_index = FaceEmbeddingIndex()
+    return _face_index
@@ -0,0 +1,249 @@
+"""
+Face Processing Pipeline
+
+The CPU-bound pixel work behind /api/face/analyze, /api/register,
+/api/recognize and /api/kiosk/identify: detection, quality scoring, mask
+heuristics and encoding. Functions here take an RGB frame plus plain
+keyword options and return picklable dicts, so they can run inline or in a
+FaceWorkerPool process (see utils/face_worker_pool.py).
+"""
+
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from .face_detection import FaceFrame, analyze_face_quality, detect_faces, face_recognition, prescreen_frame
+from .timing import StageTimer
+
+
+def process_face(image: np.ndarray, detection: Dict, check_mask: bool = True,
+                 mask_strategy: str = 'legacy', encode: bool = False,
+                 require_acceptable: bool = False,
+                 search_window: Optional[Tuple[int, int, int, int]] = None,
+                 prescreen: Optional[Dict] = None, timings: bool = False) -> Dict:
+    """
+    Detect a single face, score its quality and optionally encode it
+    
+    Args:
+        image: RGB image array
+        detection: Keyword arguments for detect_faces (width, model, prefilter...)
+        check_mask: Run mask detection as part of the quality check
+        mask_strategy: detect_mask() strategy ('legacy', 'opencv', 'combined')
+        encode: Extract the face encoding when no mask is detected
+        require_acceptable: Only encode if the quality check passed
+        search_window: Only detect inside this (top, right, bottom, left)
+                       region (see FaceTracker); boxes are returned in
+                       full-frame coordinates
+        prescreen: Keyword arguments for prescreen_frame (thresholds), or
+                   None to skip the thumbnail gate
+        timings: Time each stage (prescreen, detection, quality, mask,
+                 encoding), see utils/timing.py
+    
+    Returns:
+        {
+            'face_count': int,
+            'prescreen': prescreen_frame() rejection or None,
+            'face_location': (top, right, bottom, left) or None,
+            'quality': analyze_face_quality() result or None,
+            'encoding': 1-D encoding array or None,
+            'timings': {stage: milliseconds} or None
+        }
+    """
+    timer = StageTimer(enabled=timings)
+    result = {
+        'face_count': 0,
+        'prescreen': None,
+        'face_location': None,
+        'quality': None,
+        'encoding': None,
+        'timings': timer.stages if timings else None
+    }
+    
+    # Hopeless frames (too dark, overexposed, blurred) never reach detection
+    if prescreen is not None:
+        with timer.span('prescreen'):
+            result['prescreen'] = prescreen_frame(image, **prescreen)
+        if result['prescreen'] is not None:
+            return result
+    
+    with timer.span('detection'):
+        if search_window is None:
+            face_locations = detect_faces(image, **detection)
+        else:
+            top, right, bottom, left = search_window
+            face_locations = [
+                (t + top, r + left, b + top, l + left)
+                for (t, r, b, l) in detect_faces(image[top:bottom, left:right], **detection)
+            ]
+    
+    result['face_count'] = len(face_locations)
+    
+    if len(face_locations) != 1:
+        return result
+    
+    face_location = face_locations[0]
+    
+    # One FaceFrame shares colour conversions between quality and mask checks
+    frame = FaceFrame(image, face_location)
+    quality_result = analyze_face_quality(
+        image, face_location,
+        check_mask=check_mask,
+        frame=frame,
+        mask_strategy=mask_strategy,
+        timer=timer
+    )
+    
+    result['face_location'] = face_location
+    result['quality'] = quality_result
+    
+    if encode and not quality_result.get('mask_detected', False) and \
+            (quality_result['is_acceptable'] or not require_acceptable):
+        with timer.span('encoding'):
+            face_encodings = face_recognition.face_encodings(image, face_locations)
+        if len(face_encodings) > 0:
+            result['encoding'] = np.asarray(face_encodings[0])
+    
+    return result
+
+
+def encode_face(image: np.ndarray, face_location: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
+    """
+    Extract the encoding of an already located face
+    
+    Args:
+        image: RGB image array
+        face_location: (top, right, bottom, left)
+    
+    Returns:
+        1-D encoding array or None
+    """
+    face_encodings = face_recognition.face_encodings(image, [face_location])
+    return np.asarray(face_encodings[0]) if len(face_encodings) > 0 else None
+
+
+def best_frame_index(faces: List[Dict]) -> Optional[int]:
+    """
+    Pick the best frame of a burst from process_face() results
+    
+    Frames with exactly one face are ranked by: acceptable quality, no mask,
+    overall quality score, then sharpness (blur score).
+    
+    Args:
+        faces: process_face() results, None for frames that failed to decode
+    
+    Returns:
+        Index of the best frame, or None if no frame has a single face
+    """
+    best_index, best_key = None, None
+    
+    for index, face in enumerate(faces):
+        if not face or face['quality'] is None:
+            continue
+        
+        quality_result = face['quality']
+        key = (
+            quality_result['is_acceptable'],
+            not quality_result.get('mask_detected', False),
+            quality_result['quality_score'],
+            quality_result.get('blur_score', 0)
+        )
+        if best_key is None or key > best_key:
+            best_index, best_key = index, key
+    
+    return best_index
+
+
+def check_registration_photo(photo_index: int, face: Dict) -> Dict:
+    """
+    Validate one processed registration photo (process_face() result)
+    Shared by /api/register and the offline enrollment CLI (enroll.py)
+    Returns: per-photo result dict, 'status' is 'success' or 'error'
+    """
+    if face['face_count'] == 0:
+        return {
+            'photo_index': photo_index,
+            'status': 'error',
+            'message': f'Wajah tidak terdeteksi pada foto ke-{photo_index}'
+        }
+    
+    if face['face_count'] > 1:
+        return {
+            'photo_index': photo_index,
+            'status': 'error',
+            'message': f'Lebih dari 1 wajah terdeteksi pada foto ke-{photo_index}'
+        }
+    
+    quality_result = face['quality']
+    result = {
+        'photo_index': photo_index,
+        'status': 'error',
+        'quality_score': int(quality_result['quality_score']),
+        'is_acceptable': quality_result['is_acceptable'],
+        'mask_detected': quality_result.get('mask_detected', False),
+        'mask_confidence': quality_result.get('mask_confidence', 0.0)
+    }
+    
+    if not quality_result['is_acceptable']:
+        result['message'] = f'Foto ke-{photo_index}: {quality_result["recommendation"]}'
+    elif result['mask_detected']:
+        result['message'] = f'⚠️ Masker terdeteksi pada foto ke-{photo_index}! Harap lepas masker untuk registrasi wajah.'
+    elif face['encoding'] is None:
+        result['message'] = f'Gagal mengekstrak fitur wajah dari foto ke-{photo_index}'
+    else:
+        result['status'] = 'success'
+        result['message'] = f'Foto ke-{photo_index}: {quality_result["recommendation"]}'
+    
+    return result
+
+
+class QualityTierStats:
+    """
+    Counts which tier of the quality pipeline stopped each frame
+    
+    Tiers, cheapest first: the thumbnail gate (brightness, blur), detection
+    (no face, multiple faces), the full quality check (mask, low quality).
+    Frames that pass every tier count as accepted.
+    """
+    
+    TIERS = ('prescreen_brightness', 'prescreen_blur', 'no_face', 'multiple_faces',
+             'mask', 'low_quality')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames = 0
+        self._accepted = 0
+        self._rejected = dict.fromkeys(self.TIERS, 0)
+    
+    @staticmethod
+    def classify(face: Dict) -> Optional[str]:
+        """Tier that rejected a process_face() result, None if accepted"""
+        if face['prescreen'] is not None:
+            return f"prescreen_{face['prescreen']['tier']}"
+        if face['face_count'] == 0:
+            return 'no_face'
+        if face['face_count'] > 1:
+            return 'multiple_faces'
+        if face['quality'].get('mask_detected', False):
+            return 'mask'
+        if not face['quality']['is_acceptable']:
+            return 'low_quality'
+        return None
+    
+    def record(self, face: Dict):
+        tier = self.classify(face)
+        with self._lock:
+            self._frames += 1
+            if tier is None:
+                self._accepted += 1
+            else:
+                self._rejected[tier] += 1
+    
+    def stats(self) -> Dict:
+        """Per-tier rejection counters for /api/metrics"""
+        with self._lock:
+            return {
+                'frames': self._frames,
+                'accepted': self._accepted,
+                'rejected': dict(self._rejected),
+                'rejected_before_detection': self._rejected['prescreen_brightness'] + self._rejected['prescreen_blur']
+            }
@@ -0,0 +1,116 @@
+"""
+Frame-to-Frame Face Tracking
+
+Keeps the face box of a camera stream between frames so the next detection
+only scans a small search window around it, and tracks how long a good face
+has stayed in place so recognition can be triggered once it is stable.
+"""
+
+from typing import Optional, Tuple
+
+Box = Tuple[int, int, int, int]  # (top, right, bottom, left)
+
+
+def box_iou(a: Box, b: Box) -> float:
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    
+    intersection = max(bottom - top, 0) * max(right - left, 0)
+    if intersection == 0:
+        return 0.0
+    
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return intersection / float(area_a + area_b - intersection)
+
+
+class FaceTracker:
+    """
+    Single-face tracker for one camera session
+    
+    Usage:
+        window = tracker.search_window(image.shape)   # None = full frame
+        ... detect inside window ...
+        tracker.update(face_location, is_good, full_frame=window is None)
+        if tracker.is_stable: ...
+    """
+    
+    def __init__(self, window_margin: float = 0.5, stable_frames: int = 3,
+                 min_iou: float = 0.5, redetect_interval: int = 10):
+        """
+        Args:
+            window_margin: Search window padding, as a fraction of the box size
+            stable_frames: Consecutive good, overlapping frames for stability
+            min_iou: Minimum overlap with the previous box to count as still
+            redetect_interval: Scan the full frame every N frames anyway, so
+                               a second person entering the picture is noticed
+        """
+        self.window_margin = window_margin
+        self.stable_frames = stable_frames
+        self.min_iou = min_iou
+        self.redetect_interval = redetect_interval
+        self.reset()
+    
+    def reset(self):
+        """Forget the tracked face"""
+        self.box: Optional[Box] = None
+        self.stable_count = 0
+        self.frames_since_full_scan = 0
+    
+    @property
+    def is_tracking(self) -> bool:
+        return self.box is not None
+    
+    @property
+    def is_stable(self) -> bool:
+        return self.stable_count >= self.stable_frames
+    
+    def search_window(self, image_shape: Tuple[int, ...]) -> Optional[Box]:
+        """
+        Region to scan in the next frame
+        
+        Returns:
+            Padded (top, right, bottom, left) window around the tracked face,
+            or None when the full frame must be scanned
+        """
+        if self.box is None or self.frames_since_full_scan >= self.redetect_interval:
+            return None
+        
+        h, w = image_shape[:2]
+        top, right, bottom, left = self.box
+        pad = int(max(right - left, bottom - top) * self.window_margin)
+        
+        return (
+            max(top - pad, 0),
+            min(right + pad, w),
+            min(bottom + pad, h),
+            max(left - pad, 0)
+        )
+    
+    def update(self, face_location: Optional[Box], is_good: bool, full_frame: bool) -> bool:
+        """
+        Feed the detection result of the latest frame
+        
+        Args:
+            face_location: The single detected face, or None if zero/several
+            is_good: Quality acceptable and no mask
+            full_frame: Whether the frame was scanned completely
+        
+        Returns:
+            True if the face is now stable
+        """
+        if face_location is None:
+            self.reset()
+            return False
+        
+        still = self.box is not None and box_iou(self.box, face_location) >= self.min_iou
+        
+        if is_good:
+            self.stable_count = self.stable_count + 1 if still else 1
+        else:
+            self.stable_count = 0
+        
+        self.box = tuple(face_location)
+        self.frames_since_full_scan = 0 if full_frame else self.frames_since_full_scan + 1
+        return self.is_stable
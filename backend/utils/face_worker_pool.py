@@ -0,0 +1,304 @@
+"""
+Face Worker Pool
+
+Bounded process pool for CPU-bound face work, so a slow registration or
+detection does not hold the GIL of the Flask worker serving other requests.
+
+- Workers are forked once at startup and pre-warmed (cv2, numpy,
+  face_recognition imported, Haar cascade loaded) before the first request.
+- Frames travel through multiprocessing.shared_memory instead of being
+  pickled; only the small result dict comes back through the pipe.
+- The number of in-flight tasks is bounded: submissions beyond
+  `max_pending` are rejected immediately (FacePoolBusy) rather than queued.
+  Batches reserve every slot up front, or none, and can be made to leave
+  headroom for single frames.
+- Each task has a timeout (FacePoolTimeout). A timed-out task keeps its
+  slot until the worker actually finishes it, so the bound still holds.
+- With workers=0 tasks run inline in the calling thread (tests, debugging,
+  single-core hosts) with the same interface and metrics.
+"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class FacePoolBusy(Exception):
+    """Raised when the pool already has `max_pending` tasks in flight"""
+
+
+class FacePoolTimeout(Exception):
+    """Raised when a task does not finish within the task timeout"""
+
+
+def _warm_up():
+    """Worker initializer: import heavy modules and load models once"""
+    import cv2
+    from .face_detection import detect_faces
+    from .mask_detection_cv import get_mask_detector_cv
+    
+    # One OpenCV thread per worker process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+    get_mask_detector_cv()
+    detect_faces(np.zeros((64, 64, 3), dtype=np.uint8))
+
+
+def _ping():
+    return True
+
+
+def _run_shared(fn: Callable, shm_name: str, shape, dtype: str, kwargs: Dict):
+    """Run `fn` on a frame read from shared memory (executes in the worker)"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        start = time.perf_counter()
+        result = fn(image, **kwargs)
+        elapsed = time.perf_counter() - start
+        del image
+        return result, elapsed
+    finally:
+        shm.close()
+
+
+class FaceWorkerPool:
+    """
+    Bounded process pool for face pipeline tasks
+    
+    Usage:
+        pool = FaceWorkerPool(workers=4, max_pending=16, task_timeout=10)
+        result = pool.run(process_face, image, detection={...}, encode=True)
+    """
+    
+    def __init__(self, workers: int = 2, max_pending: int = 16, task_timeout: float = 10.0):
+        """
+        Args:
+            workers: Number of worker processes (0 = run tasks inline)
+            max_pending: Maximum tasks in flight (queued + running)
+            task_timeout: Seconds to wait for a task result
+        """
+        self.workers = max(int(workers), 0)
+        self.max_pending = max(int(max_pending), 1)
+        self.task_timeout = task_timeout
+        
+        self._lock = threading.Lock()
+        self._executor = None
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._restarts = 0
+        self._exec_seconds = 0.0
+        self._latency_seconds = 0.0
+        
+        if self.workers:
+            self._start()
+    
+    @property
+    def mode(self) -> str:
+        return 'process' if self.workers else 'inline'
+    
+    def _start(self):
+        """Create the executor and fork every worker now, before request threads exist"""
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        
+        # Workers must share the parent's resource tracker; otherwise each one
+        # starts its own and reports every attached frame buffer as leaked
+        resource_tracker.ensure_running()
+        
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_warm_up
+        )
+        for future in [self._executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+        print(f"✅ Face worker pool started: {self.workers} processes")
+    
+    def _restart(self):
+        """Replace a broken executor (a worker died, e.g. a native crash)"""
+        print("⚠️ Face worker pool broken, restarting workers")
+        self._restarts += 1
+        try:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        except Exception:
+            pass
+        self._start()
+    
+    def _reserve(self, count: int = 1, headroom: int = 0):
+        with self._lock:
+            if self._in_flight + count > self.max_pending - headroom:
+                self._rejected += count
+                raise FacePoolBusy(f"Face worker pool is full ({self._in_flight} tasks in flight)")
+            self._in_flight += count
+            self._submitted += count
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+    
+    def _unreserve(self, count: int):
+        """Give back slots reserved for tasks that were never dispatched"""
+        with self._lock:
+            self._in_flight -= count
+            self._submitted -= count
+    
+    def _release(self, ok: bool, exec_seconds: float, latency_seconds: float):
+        with self._lock:
+            self._in_flight -= 1
+            if ok:
+                self._completed += 1
+                self._exec_seconds += exec_seconds
+                self._latency_seconds += latency_seconds
+            else:
+                self._failed += 1
+    
+    def submit(self, fn: Callable, image: np.ndarray, **kwargs) -> Future:
+        """
+        Submit `fn(image, **kwargs)` to the pool
+        
+        `fn` must be a module-level function (picklable). The frame is copied
+        once into shared memory; the returned Future resolves to fn's result.
+        
+        Raises:
+            FacePoolBusy: If `max_pending` tasks are already in flight
+        """
+        self._reserve()
+        return self._dispatch(fn, image, kwargs)
+    
+    def submit_batch(self, fn: Callable, images: Sequence[np.ndarray], headroom: int = 0, **kwargs) -> List[Future]:
+        """
+        Submit `fn(image, **kwargs)` for several frames, all or none
+        
+        Slots for the whole batch are reserved before the first frame is
+        dispatched, so a full pool rejects the batch without leaving part of
+        it running.
+        
+        Args:
+            fn: Module-level function, as for submit()
+            images: Frames to process
+            headroom: Slots the batch must leave free for single submissions
+        
+        Raises:
+            FacePoolBusy: If the batch does not fit
+        """
+        self._reserve(len(images), headroom)
+        futures = []
+        try:
+            for image in images:
+                futures.append(self._dispatch(fn, image, kwargs))
+        except Exception:
+            # The failed dispatch released its own slot; dispatched tasks
+            # release theirs when they finish
+            self._unreserve(len(images) - len(futures) - 1)
+            raise
+        return futures
+    
+    def _dispatch(self, fn: Callable, image: np.ndarray, kwargs: Dict) -> Future:
+        """Run or enqueue a task whose slot is already reserved"""
+        submitted_at = time.perf_counter()
+        
+        if not self.workers:
+            future = Future()
+            try:
+                future.set_result(fn(image, **kwargs))
+                elapsed = time.perf_counter() - submitted_at
+                self._release(True, elapsed, elapsed)
+            except Exception as e:
+                future.set_exception(e)
+                self._release(False, 0.0, 0.0)
+            return future
+        
+        image = np.ascontiguousarray(image)
+        shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+        np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+        
+        args = (fn, shm.name, image.shape, image.dtype.str, kwargs)
+        executor = self._executor
+        try:
+            try:
+                inner = executor.submit(_run_shared, *args)
+            except BrokenProcessPool:
+                with self._lock:
+                    # Another request thread may have restarted it already
+                    if self._executor is executor:
+                        self._restart()
+                inner = self._executor.submit(_run_shared, *args)
+        except Exception:
+            shm.close()
+            shm.unlink()
+            self._release(False, 0.0, 0.0)
+            raise
+        
+        future = Future()
+        
+        def _done(done_future):
+            # Runs when the worker finishes, even if the caller already timed out
+            shm.close()
+            shm.unlink()
+            try:
+                result, exec_seconds = done_future.result()
+            except Exception as e:
+                self._release(False, 0.0, 0.0)
+                if not future.done():
+                    future.set_exception(e)
+                return
+            self._release(True, exec_seconds, time.perf_counter() - submitted_at)
+            if not future.done():
+                future.set_result(result)
+        
+        inner.add_done_callback(_done)
+        return future
+    
+    def result(self, future: Future, timeout: Optional[float] = None):
+        """
+        Wait for a submitted task
+        
+        Raises:
+            FacePoolTimeout: If the task does not finish in time
+        """
+        try:
+            return future.result(timeout=self.task_timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            raise FacePoolTimeout(f"Face task did not finish within {self.task_timeout}s")
+    
+    def run(self, fn: Callable, image: np.ndarray, **kwargs):
+        """Submit a task and wait for its result (see submit/result)"""
+        return self.result(self.submit(fn, image, **kwargs))
+    
+    def stats(self) -> Dict:
+        """Queue depth and task counters for /api/metrics"""
+        with self._lock:
+            completed = self._completed
+            return {
+                'mode': self.mode,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'task_timeout_seconds': self.task_timeout,
+                'queue_depth': self._in_flight,
+                'peak_queue_depth': self._peak_in_flight,
+                'submitted': self._submitted,
+                'completed': completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'timed_out': self._timed_out,
+                'restarts': self._restarts,
+                'avg_exec_ms': round(self._exec_seconds / completed * 1000, 2) if completed else 0.0,
+                'avg_latency_ms': round(self._latency_seconds / completed * 1000, 2) if completed else 0.0
+            }
+    
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
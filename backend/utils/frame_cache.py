@@ -0,0 +1,135 @@
+"""
+Frame Result Cache
+
+Kiosks and flaky clients resend byte-identical frames (retries, a frozen
+camera). This cache maps a recent frame to its face pipeline result so a
+repeat skips decode, detection, quality checks and encoding.
+
+- Content key: BLAKE2b digest of the uploaded image bytes, checked before
+  the frame is even decoded.
+- Perceptual key (optional): 64-bit difference hash (dHash) of a grayscale
+  thumbnail, checked after decoding, so re-encoded but visually identical
+  frames also hit. Only for results without a face encoding (analyze): a
+  whole-frame hash says nothing about whose face is in it, so identity-
+  bearing results stay on the content key.
+
+Keys are namespaced by endpoint and pipeline options, so a result computed
+without mask checking is never served to a caller that wants it. Entries
+expire after a short TTL; only pixel work is cached, never attendance.
+"""
+
+import hashlib
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .caching import LRUCache
+
+
+def content_digest(data: bytes) -> bytes:
+    """Fast 128-bit digest of raw image bytes"""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def dhash(image: np.ndarray, hash_size: int = 8) -> int:
+    """
+    Difference hash of an RGB image
+    
+    Compares neighbouring pixels of a (hash_size + 1) x hash_size grayscale
+    thumbnail; small changes in compression, noise or brightness leave the
+    hash unchanged.
+    
+    Returns:
+        hash_size * hash_size bit integer
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+    thumb = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (thumb[:, 1:] > thumb[:, :-1]).flatten()
+    return int(np.packbits(bits).tobytes().hex(), 16)
+
+
+class FrameCache:
+    """
+    TTL + LRU cache of face pipeline results keyed by frame content
+    
+    Usage:
+        key = cache.content_key(data, namespace)
+        result = cache.get(key)
+        if result is None:
+            image = decode(data)
+            p_key = cache.perceptual_key(image, namespace)   # None if disabled
+            result = cache.get(p_key) or compute(image)
+            cache.put(result, key, p_key)
+    """
+    
+    def __init__(self, max_entries: int = 256, max_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[float] = 10.0, perceptual: bool = False):
+        """
+        Args:
+            max_entries: Maximum cached results
+            max_bytes: Approximate memory cap in bytes
+            ttl_seconds: Result lifetime in seconds
+            perceptual: Also match frames by perceptual hash
+        """
+        self.perceptual = perceptual
+        self._cache = LRUCache(
+            'frame_results',
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            ttl_seconds=ttl_seconds
+        )
+        self._lock = threading.Lock()
+        self._lookups = 0
+        self._content_hits = 0
+        self._perceptual_hits = 0
+    
+    def content_key(self, data: bytes, namespace: Tuple) -> Tuple:
+        return ('content', namespace, content_digest(data))
+    
+    def perceptual_key(self, image: np.ndarray, namespace: Tuple) -> Optional[Tuple]:
+        if not self.perceptual:
+            return None
+        return ('perceptual', namespace, dhash(image))
+    
+    def get(self, key: Optional[Hashable]) -> Any:
+        """Cached result for a key, or None"""
+        if key is None:
+            return None
+        
+        result = self._cache.get(key)
+        with self._lock:
+            if key[0] == 'content':
+                self._lookups += 1
+                if result is not None:
+                    self._content_hits += 1
+            elif result is not None:
+                self._perceptual_hits += 1
+        return result
+    
+    def put(self, result: Any, *keys: Optional[Hashable]):
+        """Store a result under every given (non-None) key"""
+        for key in keys:
+            if key is not None:
+                self._cache.put(key, result)
+    
+    def clear(self):
+        self._cache.clear()
+    
+    def stats(self) -> Dict:
+        """Frame-level hit rate plus the underlying LRU counters"""
+        stats = self._cache.stats()
+        with self._lock:
+            hits = self._content_hits + self._perceptual_hits
+            stats.update({
+                'ttl_seconds': self._cache.ttl_seconds,
+                'perceptual': self.perceptual,
+                'frames': self._lookups,
+                'content_hits': self._content_hits,
+                'perceptual_hits': self._perceptual_hits,
+                'hits': hits,
+                'misses': self._lookups - hits,
+                'hit_rate': round(hits / self._lookups, 4) if self._lookups else 0.0
+            })
+        return stats
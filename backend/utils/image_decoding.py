@@ -0,0 +1,106 @@
+"""
+Image Decoding Utilities
+
+Decode uploaded camera frames into RGB arrays with as few copies as possible.
+Raw bytes (multipart/form-data or image/jpeg bodies) go straight into
+cv2.imdecode through a zero-copy NumPy view; base64 data URLs from the
+legacy JSON API are decoded to bytes first and then take the same path.
+Oversized JPEGs can be decoded at reduced scale by libjpeg itself.
+"""
+
+import base64
+import binascii
+import io
+from typing import Optional, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+ImageBytes = Union[bytes, bytearray, memoryview]
+
+
+def strip_data_url(base64_string: str) -> str:
+    """Remove a 'data:image/...;base64,' prefix if present"""
+    if 'base64,' in base64_string:
+        return base64_string.split('base64,', 1)[1]
+    return base64_string
+
+
+def base64_to_bytes(base64_string: str) -> bytes:
+    """
+    Decode a base64 string or data URL to raw image bytes
+    
+    Raises:
+        ValueError: If the string is not valid base64
+    """
+    try:
+        return base64.b64decode(strip_data_url(base64_string))
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 image data: {e}")
+
+
+JPEG_SOI = b'\xff\xd8'
+
+# libjpeg can decode straight to 1/2, 1/4 or 1/8 scale (DCT scaling),
+# which skips most of the IDCT work for oversized frames
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def jpeg_decode_flag(data: ImageBytes, max_width: Optional[int]) -> int:
+    """
+    Pick the cv2.imdecode flag for a frame
+    
+    Large JPEGs are decoded at the largest reduction that still leaves the
+    image at least `max_width` pixels wide; everything else decodes at full size.
+    """
+    if not max_width or bytes(data[:2]) != JPEG_SOI:
+        return cv2.IMREAD_COLOR
+    
+    try:
+        # PIL only parses the header here, no pixel data is decoded
+        width = Image.open(io.BytesIO(data)).width
+    except Exception:
+        return cv2.IMREAD_COLOR
+    
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if width // factor >= max_width:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_image_bytes(data: ImageBytes, max_width: Optional[int] = None) -> np.ndarray:
+    """
+    Decode encoded image bytes (JPEG, PNG, WebP, ...) to an RGB array
+    
+    Args:
+        data: Encoded image bytes
+        max_width: If set, JPEGs at least twice this wide are decoded at
+                   reduced scale (never below max_width)
+    
+    Returns:
+        RGB image array (H, W, 3) uint8
+    
+    Raises:
+        ValueError: If the bytes are not a decodable image
+    """
+    if not data:
+        raise ValueError("Empty image data")
+    
+    # np.frombuffer wraps the bytes without copying them
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    bgr = cv2.imdecode(buffer, jpeg_decode_flag(data, max_width))
+    
+    if bgr is None:
+        # Formats OpenCV cannot read (e.g. GIF) fall back to PIL
+        try:
+            img = Image.open(io.BytesIO(data))
+            return np.asarray(img.convert('RGB'))
+        except Exception as e:
+            raise ValueError(f"Unsupported or corrupt image: {e}")
+    
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
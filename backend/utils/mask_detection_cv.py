@@ -5,8 +5,14 @@ Modular design to support TensorFlow Lite in the future
 
 import cv2
 import numpy as np
-from typing import Dict, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 import os
+import threading
+
+# Skin colour range in YCrCb (Y: any, Cr: 133-173, Cb: 77-127)
+SKIN_YCRCB_LOWER = np.array([0, 133, 77], dtype=np.uint8)
+SKIN_YCRCB_UPPER = np.array([255, 173, 127], dtype=np.uint8)
+
 
 class MaskDetectorCV:
     """
@@ -14,10 +20,25 @@ class MaskDetectorCV:
     Fast, lightweight, and works offline
     """
     
+    # Lower-face checks, cheapest first:
+    # (method, FaceFrame attribute it consumes, confidence that decides alone)
+    # Texture reuses the face Laplacian of the blur score, skin is one
+    # inRange, colour needs an HSV conversion, edges a blur plus Canny
+    MASK_CHECKS = (
+        ('_texture_analysis', 'lower_laplacian_var', 70),
+        ('_skin_color_detection', 'lower_ycrcb', 70),
+        ('_advanced_color_analysis', 'lower_hsv_stats', 75),
+        ('_improved_edge_analysis', 'lower_gray', 65),
+    )
+    
     def __init__(self):
         """Initialize mask detector with OpenCV models"""
         self.face_cascade = None
+        self.cascade_path = None
         self.mask_net = None
+        # CascadeClassifier.detectMultiScale is not safe to call concurrently
+        # on one instance, so detection threads each load their own copy
+        self._local = threading.local()
         self.model_loaded = False
         
         # Try to load OpenCV Haar Cascade for face detection
@@ -31,6 +52,7 @@ class MaskDetectorCV:
             
             if os.path.exists(cascade_path):
                 self.face_cascade = cv2.CascadeClassifier(cascade_path)
+                self.cascade_path = cascade_path
                 print(f"✅ Loaded Haar Cascade from: {cascade_path}")
                 self.model_loaded = True
             else:
@@ -41,10 +63,55 @@ class MaskDetectorCV:
             print(f"❌ Error loading face cascade: {e}")
             self.model_loaded = False
     
+    def _get_face_cascade(self):
+        """Per-thread Haar Cascade (see __init__)"""
+        cascade = getattr(self._local, 'face_cascade', None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self.cascade_path)
+            self._local.face_cascade = cascade
+        return cascade
+    
+    def detect_faces_cascade(
+        self,
+        image: np.ndarray,
+        min_face_ratio: float = 0.1,
+        min_neighbors: int = 5
+    ) -> Optional[List[Tuple[int, int, int, int]]]:
+        """
+        Cheap first-stage face detection with the Haar cascade
+        
+        Used to reject frames with zero or several faces before the HOG
+        detector and encoder run, and to seed a tight ROI for HOG.
+        
+        Args:
+            image: RGB image array (typically the downscaled detection copy)
+            min_face_ratio: Ignore faces narrower than this fraction of the frame
+            min_neighbors: Cascade minNeighbors (higher = fewer false positives)
+        
+        Returns:
+            List of (top, right, bottom, left) boxes, or None if the cascade
+            is not loaded (caller should fall back to full detection)
+        """
+        if self.face_cascade is None:
+            return None
+        
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        gray = cv2.equalizeHist(gray)
+        min_size = max(int(image.shape[1] * min_face_ratio), 24)
+        
+        boxes = self._get_face_cascade().detectMultiScale(
+            gray,
+            scaleFactor=1.1,
+            minNeighbors=min_neighbors,
+            minSize=(min_size, min_size)
+        )
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in boxes]
+    
     def detect_mask_advanced(
         self, 
         image: np.ndarray, 
-        face_location: Tuple[int, int, int, int]
+        face_location: Tuple[int, int, int, int],
+        frame=None
     ) -> Dict:
         """
         Advanced mask detection using multiple algorithms
@@ -52,6 +119,8 @@ class MaskDetectorCV:
         Args:
             image: RGB image array
             face_location: (top, right, bottom, left) face coordinates
+            frame: Shared FaceFrame from utils.face_detection (reuses its
+                   lower-face conversions instead of recomputing them)
         
         Returns:
             {
@@ -62,12 +131,13 @@ class MaskDetectorCV:
             }
         """
         try:
-            top, right, bottom, left = face_location
-            face_height = bottom - top
+            if frame is None:
+                # Imported here: face_detection depends on this module
+                from .face_detection import FaceFrame
+                frame = FaceFrame(image, face_location)
             
             # Extract lower face region (where mask would be)
-            lower_face_top = top + int(face_height * 0.4)
-            lower_face = image[lower_face_top:bottom, left:right]
+            lower_face = frame.lower_face
             
             if lower_face.size == 0:
                 return {
@@ -77,36 +147,24 @@ class MaskDetectorCV:
                     'method': 'none'
                 }
             
-            # Method 1: Advanced color analysis (HSV-based)
-            mask_by_color = self._advanced_color_analysis(lower_face)
-            if mask_by_color['mask_detected'] and mask_by_color['confidence'] > 75:
-                return mask_by_color
-            
-            # Method 2: Texture analysis (LBP-like)
-            mask_by_texture = self._texture_analysis(lower_face)
-            if mask_by_texture['mask_detected'] and mask_by_texture['confidence'] > 70:
-                return mask_by_texture
-            
-            # Method 3: Edge density with improved threshold
-            mask_by_edges = self._improved_edge_analysis(lower_face)
-            if mask_by_edges['mask_detected'] and mask_by_edges['confidence'] > 65:
-                return mask_by_edges
-            
-            # Method 4: Skin color detection (inverse - no skin = mask)
-            mask_by_skin = self._skin_color_detection(lower_face)
-            if mask_by_skin['mask_detected'] and mask_by_skin['confidence'] > 70:
-                return mask_by_skin
+            # Run the checks cheapest first; a confident positive decides the
+            # verdict on its own, so the costlier checks are skipped
+            results = []
+            for check, frame_attribute, decisive_confidence in self.MASK_CHECKS:
+                result = getattr(self, check)(lower_face, getattr(frame, frame_attribute))
+                if result['mask_detected'] and result['confidence'] > decisive_confidence:
+                    return result
+                results.append(result)
             
             # Combined decision: If multiple methods agree
-            methods = [mask_by_color, mask_by_texture, mask_by_edges, mask_by_skin]
-            mask_votes = sum(1 for m in methods if m['mask_detected'])
+            mask_confidences = [m['confidence'] for m in results if m['mask_detected']]
+            mask_votes = len(mask_confidences)
             
             if mask_votes >= 2:
                 # At least 2 methods detected mask
-                avg_confidence = np.mean([m['confidence'] for m in methods if m['mask_detected']])
                 return {
                     'mask_detected': True,
-                    'confidence': round(float(avg_confidence), 2),
+                    'confidence': round(sum(mask_confidences) / mask_votes, 2),
                     'reason': f'⚠️ MASKER TERDETEKSI oleh {mask_votes} metode analisis',
                     'method': 'combined'
                 }
@@ -128,7 +186,8 @@ class MaskDetectorCV:
                 'method': 'error'
             }
     
-    def _advanced_color_analysis(self, lower_face: np.ndarray) -> Dict:
+    def _advanced_color_analysis(self, lower_face: np.ndarray,
+                                 hsv_stats: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Dict:
         """
         Advanced color uniformity analysis using HSV and color range
         Masks typically have:
@@ -136,13 +195,14 @@ class MaskDetectorCV:
         - Specific color ranges (blue, white, black surgical masks)
         """
         try:
-            # Convert to HSV
-            hsv = cv2.cvtColor(lower_face, cv2.COLOR_RGB2HSV)
+            if hsv_stats is None:
+                # Convert to HSV
+                hsv = cv2.cvtColor(lower_face, cv2.COLOR_RGB2HSV)
+                mean, std = cv2.meanStdDev(hsv)
+                hsv_stats = (mean.reshape(-1), std.reshape(-1))
             
             # Calculate statistics
-            h_mean, h_std = np.mean(hsv[:, :, 0]), np.std(hsv[:, :, 0])
-            s_mean, s_std = np.mean(hsv[:, :, 1]), np.std(hsv[:, :, 1])
-            v_mean, v_std = np.mean(hsv[:, :, 2]), np.std(hsv[:, :, 2])
+            (h_mean, s_mean, v_mean), (h_std, s_std, v_std) = hsv_stats
             
             # Mask characteristics:
             # 1. Low saturation variance (uniform color)
@@ -188,19 +248,21 @@ class MaskDetectorCV:
             print(f"Error in color analysis: {e}")
             return {'mask_detected': False, 'confidence': 0.0, 'reason': '', 'method': 'error'}
     
-    def _texture_analysis(self, lower_face: np.ndarray) -> Dict:
+    def _texture_analysis(self, lower_face: np.ndarray,
+                          texture_variance: Optional[float] = None) -> Dict:
         """
         Texture analysis - skin has natural texture, masks are smooth
         """
         try:
-            gray = cv2.cvtColor(lower_face, cv2.COLOR_RGB2GRAY)
-            
-            # Calculate Local Binary Pattern (simplified)
-            # Masks have less texture variation than skin
-            
-            # Use Laplacian variance as texture metric
-            laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-            texture_variance = laplacian.var()
+            if texture_variance is None:
+                gray = cv2.cvtColor(lower_face, cv2.COLOR_RGB2GRAY)
+                
+                # Calculate Local Binary Pattern (simplified)
+                # Masks have less texture variation than skin
+                
+                # Use Laplacian variance as texture metric
+                laplacian = cv2.Laplacian(gray, cv2.CV_64F)
+                texture_variance = laplacian.var()
             
             # Low texture variance = smooth surface = likely mask
             if texture_variance < 50:
@@ -222,19 +284,21 @@ class MaskDetectorCV:
             print(f"Error in texture analysis: {e}")
             return {'mask_detected': False, 'confidence': 0.0, 'reason': '', 'method': 'error'}
     
-    def _improved_edge_analysis(self, lower_face: np.ndarray) -> Dict:
+    def _improved_edge_analysis(self, lower_face: np.ndarray,
+                                gray: Optional[np.ndarray] = None) -> Dict:
         """
         Improved edge detection - masks have defined edges
         """
         try:
-            gray = cv2.cvtColor(lower_face, cv2.COLOR_RGB2GRAY)
+            if gray is None:
+                gray = cv2.cvtColor(lower_face, cv2.COLOR_RGB2GRAY)
             
             # Apply Gaussian blur to reduce noise
             blurred = cv2.GaussianBlur(gray, (5, 5), 0)
             
             # Canny edge detection
             edges = cv2.Canny(blurred, 30, 100)
-            edge_density = np.sum(edges > 0) / edges.size
+            edge_density = cv2.countNonZero(edges) / edges.size
             
             # Masks have more defined edges (especially around mouth area)
             if edge_density > 0.12:
@@ -256,22 +320,19 @@ class MaskDetectorCV:
             print(f"Error in edge analysis: {e}")
             return {'mask_detected': False, 'confidence': 0.0, 'reason': '', 'method': 'error'}
     
-    def _skin_color_detection(self, lower_face: np.ndarray) -> Dict:
+    def _skin_color_detection(self, lower_face: np.ndarray,
+                              ycrcb: Optional[np.ndarray] = None) -> Dict:
         """
         Detect skin color - if no skin detected in lower face, likely masked
         """
         try:
-            # Convert to YCrCb (better for skin detection)
-            ycrcb = cv2.cvtColor(lower_face, cv2.COLOR_RGB2YCrCb)
-            
-            # Skin color range in YCrCb
-            # Y: 0-255, Cr: 133-173, Cb: 77-127 (typical skin range)
-            lower_skin = np.array([0, 133, 77], dtype=np.uint8)
-            upper_skin = np.array([255, 173, 127], dtype=np.uint8)
+            if ycrcb is None:
+                # Convert to YCrCb (better for skin detection)
+                ycrcb = cv2.cvtColor(lower_face, cv2.COLOR_RGB2YCrCb)
             
-            # Create skin mask
-            skin_mask = cv2.inRange(ycrcb, lower_skin, upper_skin)
-            skin_ratio = np.sum(skin_mask > 0) / skin_mask.size
+            # Create skin mask (typical skin range, see SKIN_YCRCB_LOWER/UPPER)
+            skin_mask = cv2.inRange(ycrcb, SKIN_YCRCB_LOWER, SKIN_YCRCB_UPPER)
+            skin_ratio = cv2.countNonZero(skin_mask) / skin_mask.size
             
             # If very little skin detected in lower face → likely masked
             if skin_ratio < 0.15:
@@ -307,7 +368,8 @@ def get_mask_detector_cv() -> MaskDetectorCV:
 
 def detect_mask_opencv(
     image: np.ndarray, 
-    face_location: Tuple[int, int, int, int]
+    face_location: Tuple[int, int, int, int],
+    frame=None
 ) -> Dict:
     """
     Main function to detect mask using OpenCV
@@ -315,6 +377,7 @@ def detect_mask_opencv(
     Args:
         image: RGB image array
         face_location: (top, right, bottom, left) face coordinates
+        frame: Shared FaceFrame (optional, see analyze_face_quality)
     
     Returns:
         {
@@ -325,4 +388,4 @@ def detect_mask_opencv(
         }
     """
     detector = get_mask_detector_cv()
-    return detector.detect_mask_advanced(image, face_location)
+    return detector.detect_mask_advanced(image, face_location, frame=frame)
@@ -0,0 +1,69 @@
+"""
+Registration Photo Archive
+
+Keeps the encoded bytes of every accepted registration photo so face
+encodings can be recomputed after a detector, model or storage format change
+(see reencode.py) instead of asking every employee to re-register.
+
+Photos are content-addressed: the file name is the SHA-256 of the bytes,
+fanned out over two directory levels (ab/cd/abcd...). Storing the same photo
+twice is a no-op, and writes go through a temporary file plus an atomic
+rename, so a reader never sees a partial photo.
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Union
+
+
+class PhotoArchive:
+    """
+    Content-addressed photo store
+    
+    Usage:
+        archive = PhotoArchive(config.UPLOAD_FOLDERS['faces'])
+        sha256 = archive.store(jpeg_bytes)
+        jpeg_bytes = archive.read(sha256)
+    """
+    
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+    
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+    
+    def store(self, data: bytes) -> str:
+        """
+        Archive photo bytes
+        
+        Returns:
+            SHA-256 hex digest, the photo's key
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        target = self.path(sha256)
+        if target.exists():
+            return sha256
+        
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return sha256
+    
+    def read(self, sha256: str) -> bytes:
+        """
+        Raises:
+            FileNotFoundError: If the photo is not archived
+        """
+        return self.path(sha256).read_bytes()
+    
+    def __contains__(self, sha256: str) -> bool:
+        return self.path(sha256).exists()
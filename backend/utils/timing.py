@@ -0,0 +1,172 @@
+"""
+Per-Stage Request Timing
+
+Span timer for the face endpoints. Each stage (decode, detection, quality,
+mask, encoding, DB lookup, attendance insert) runs inside
+``with timer.span('stage')``; the collected durations become the
+Server-Timing response header and feed a StageHistogram for /api/metrics.
+
+Stage timings are disjoint: a stage measured in a worker process is merged
+back with merge(), which subtracts it from the span that waited for it.
+
+A disabled timer hands out one shared no-op span, so instrumented code only
+pays for a method call and an empty with-block.
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+
+class _NullSpan:
+    """Span of a disabled timer: does nothing"""
+    
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('timer', 'name', 'start')
+    
+    def __init__(self, timer: 'StageTimer', name: str):
+        self.timer = timer
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class StageTimer:
+    """
+    Collects stage durations (milliseconds) for one request or one frame
+    
+    Usage:
+        timer = StageTimer(enabled=True)
+        with timer.span('decode'):
+            image = decode(data)
+        timer.server_timing()   # 'decode;dur=3.21'
+    
+    A stage entered several times (one per photo, say) accumulates.
+    """
+    
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.stages: Dict[str, float] = {}
+    
+    def span(self, name: str):
+        """Context manager timing one stage"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+    
+    def add(self, name: str, duration_ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+    
+    def merge(self, stages: Optional[Dict[str, float]], within: Optional[str] = None):
+        """
+        Add stages measured elsewhere, e.g. the timings of a process_face()
+        result computed in a worker process
+        
+        Args:
+            stages: {stage name: milliseconds}, None is ignored
+            within: Span of this timer that contained those stages; its
+                    duration is reduced by theirs so only the overhead
+                    (queueing, pickling) remains
+        """
+        if not self.enabled or not stages:
+            return
+        
+        for name, duration_ms in stages.items():
+            self.add(name, duration_ms)
+        
+        if within in self.stages:
+            self.stages[within] = max(self.stages[within] - sum(stages.values()), 0.0)
+    
+    def server_timing(self) -> str:
+        """Server-Timing header value"""
+        return ', '.join(f'{name};dur={duration_ms:.2f}' for name, duration_ms in self.stages.items())
+    
+    def as_dict(self) -> Dict[str, float]:
+        """Stage durations rounded for a JSON response"""
+        return {name: round(duration_ms, 2) for name, duration_ms in self.stages.items()}
+
+
+# Shared disabled timer for code running outside a timed request
+NULL_TIMER = StageTimer(enabled=False)
+
+
+class StageHistogram:
+    """
+    Cumulative latency histogram per (endpoint, stage)
+    
+    Buckets are Prometheus-style upper bounds in milliseconds; p50/p95 are
+    estimated as the upper bound of the bucket holding that quantile.
+    """
+    
+    BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+    
+    def __init__(self, buckets_ms: Tuple[float, ...] = BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], Dict] = {}
+    
+    def observe(self, endpoint: str, stages: Dict[str, float]):
+        """Record one request's stage durations"""
+        with self._lock:
+            for stage, duration_ms in stages.items():
+                series = self._series.get((endpoint, stage))
+                if series is None:
+                    series = self._series[(endpoint, stage)] = {
+                        'counts': [0] * (len(self.buckets_ms) + 1),
+                        'sum_ms': 0.0
+                    }
+                series['counts'][bisect.bisect_left(self.buckets_ms, duration_ms)] += 1
+                series['sum_ms'] += duration_ms
+    
+    def _quantile(self, counts, total, q):
+        rank = q * total
+        cumulative = 0
+        for bound, count in zip(self.buckets_ms, counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return None  # beyond the last bucket
+    
+    def stats(self) -> Dict:
+        """{endpoint: {stage: count, sum, mean, p50/p95 and cumulative buckets}}"""
+        with self._lock:
+            series = {key: (list(s['counts']), s['sum_ms']) for key, s in self._series.items()}
+        
+        stats = {}
+        for (endpoint, stage), (counts, sum_ms) in sorted(series.items()):
+            total = sum(counts)
+            # [upper bound ms, cumulative count] pairs, in bucket order
+            cumulative, buckets = 0, []
+            for bound, count in zip(self.buckets_ms, counts):
+                cumulative += count
+                buckets.append([bound, cumulative])
+            buckets.append(['+Inf', total])
+            
+            stats.setdefault(endpoint, {})[stage] = {
+                'count': total,
+                'sum_ms': round(sum_ms, 2),
+                'mean_ms': round(sum_ms / total, 2) if total else 0.0,
+                'p50_ms': self._quantile(counts, total, 0.5),
+                'p95_ms': self._quantile(counts, total, 0.95),
+                'buckets': buckets
+            }
+        return stats